@@ -73,10 +73,12 @@ class CoreMain(object):
             # Configure patching always runs first, except if it's AUTO_ASSESSMENT
             if not execution_config.exec_auto_assess_only:
                 configure_patching_successful = configure_patching_processor.start_configure_patching()
+                telemetry_writer.flush(wait=False)  # operation boundary: have the background writer persist queued telemetry events
 
             # Assessment happens for an Auto Assessment request or for Non Auto Assessment operations, if the operation requested is not Configure Patching
             if execution_config.exec_auto_assess_only or patch_operation_requested != Constants.CONFIGURE_PATCHING.lower():
                 patch_assessment_successful = patch_assessor.start_assessment()
+                telemetry_writer.flush(wait=False)
 
             # Patching + additional assessment occurs if the operation is 'Installation' and not Auto Assessment. Need to check both since operation_requested from prev run is preserved in Auto Assessment
             if not execution_config.exec_auto_assess_only and patch_operation_requested == Constants.INSTALLATION.lower():
@@ -84,6 +86,7 @@ class CoreMain(object):
                 status_handler.set_current_operation(Constants.INSTALLATION)
                 patch_installer = container.get('patch_installer')
                 patch_installation_successful = patch_installer.start_installation()
+                telemetry_writer.flush(wait=False)
                 patch_assessment_successful = False
                 patch_assessment_successful = patch_assessor.start_assessment()
 
@@ -122,6 +125,10 @@ class CoreMain(object):
             composite_logger.log_debug("Completed exception handling.\n")
 
         finally:
+            # persist any status updates still pending in the status file write-behind
+            if status_handler is not None:
+                status_handler.flush_status_file()
+
             # clean up temp folder of files created by Core after execution completes
             if self.is_temp_folder_available(bootstrapper.env_layer, execution_config):
                 composite_logger.log_debug("Deleting all files of certain format from temp folder [FileFormat={0}][TempFolderLocation={1}]"
@@ -132,6 +139,7 @@ class CoreMain(object):
                 lifecycle_manager.update_core_sequence(completed=True)
 
             telemetry_writer.write_event("Completed Linux Patch core operation.", Constants.TelemetryEventLevel.Informational)
+            telemetry_writer.close()
 
             stdout_file_mirror.stop()
             file_logger.close(message_at_close="\n<End of output>")
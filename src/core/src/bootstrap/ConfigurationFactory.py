@@ -140,7 +140,8 @@ class ConfigurationFactory(object):
                 'component': FileLogger,
                 'component_args': ['env_layer'],
                 'component_kwargs': {
-                    'log_file': log_file_path
+                    'log_file': log_file_path,
+                    'buffered': True
                 }
             },
             'composite_logger': {
@@ -162,7 +163,7 @@ class ConfigurationFactory(object):
         }
 
         if config_env is Constants.DEV or config_env is Constants.TEST:
-            pass  # modify config as desired
+            configuration['file_logger']['component_kwargs']['buffered'] = False     # write-through, so the log file is observable right after each write
 
         return configuration
 
@@ -248,6 +249,7 @@ class ConfigurationFactory(object):
         configuration = self.new_prod_configuration(package_manager_name, package_manager_component)
         configuration['config_env'] = Constants.DEV
         # perform desired modifications to configuration
+        configuration['status_handler']['component_kwargs']['status_file_write_interval_in_secs'] = 0     # write-through, so status is observable right after each update
         return configuration
 
     def new_test_configuration(self, package_manager_name, package_manager_component):
@@ -78,7 +78,34 @@ class Constants(object):
         MAXIMUM_ASSESSMENT_INTERVAL = 'maximumAssessmentInterval'
 
     TEMP_FOLDER_DIR_NAME = "tmp"
-    TEMP_FOLDER_CLEANUP_ARTIFACT_LIST = ["*.list"]
+    TEMP_FOLDER_CLEANUP_ARTIFACT_LIST = ["*.list", "*.spool"]   # *.spool: command output spool files (OUTPUT_SPOOL_FILE_EXTENSION)
+
+    # command output spooling: outputs larger than this are written to a spool file in the temp folder, and only a head/tail excerpt is logged and reported
+    OUTPUT_SPOOL_THRESHOLD_IN_CHARS = 32768
+    OUTPUT_SPOOL_EXCERPT_HEAD_IN_CHARS = 4096
+    OUTPUT_SPOOL_EXCERPT_TAIL_IN_CHARS = 4096
+    OUTPUT_SPOOL_FILE_EXTENSION = "spool"
+    OUTPUT_SPOOL_MAX_FILE_COUNT = 20    # the oldest spool files beyond this are removed
+
+    # streaming command output: lines beyond this much output are drained and dropped
+    STREAMING_COMMAND_MAX_OUTPUT_SIZE_IN_CHARS = 67108864
+
+    # command deadlines: package manager commands are bounded by the maintenance window time left (less the reboot buffer)
+    COMMAND_TIMED_OUT_RETURN_CODE = -124    # not a valid process return code, or a negated signal number
+    COMMAND_TERMINATION_GRACE_PERIOD_IN_SECS = 30   # time allowed between terminating and killing a command's process group
+    COMMAND_DEADLINE_MIN_TIMEOUT_IN_SECS = 60   # commands are always allowed this long, however little time is left
+
+    # repo refresh record: refreshes (by any run) this recent, against unchanged sources, are not repeated unless forced (as they are before installation)
+    REPO_REFRESH_RECORD_FILE = "RepoRefreshRecord.json"
+    REPO_REFRESH_TTL_IN_SECS = 3600
+
+    # package journal: the package manager's transaction journal is read incrementally, from the offset persisted for the operation
+    PACKAGE_JOURNAL_OFFSET_FILE = "PackageJournalOffset.json"
+
+    class PackageJournalActions(EnumBackport):
+        INSTALLED = 'Installed'
+        UPGRADED = 'Upgraded'
+        REMOVED = 'Removed'
 
     # File to save default settings for auto OS updates
     IMAGE_DEFAULT_PATCH_CONFIGURATION_BACKUP_PATH = "ImageDefaultPatchConfiguration.bak"
@@ -161,6 +188,18 @@ class Constants(object):
     # wait time after status updates
     WAIT_TIME_AFTER_HEALTHSTORE_STATUS_UPDATE_IN_SECS = 20
 
+    # status file write-behind: in-progress status updates are coalesced into at most one status file write per interval (0 writes through on every update)
+    STATUS_FILE_WRITE_INTERVAL_IN_SECS = 5
+
+    # buffered file logger: log output is written to the log file in the background, once the buffer reaches this size or the oldest buffered output is this old
+    FILE_LOGGER_BUFFER_MAX_SIZE_IN_CHARS = 65536
+    FILE_LOGGER_BUFFER_MAX_AGE_IN_SECS = 2
+    FILE_LOGGER_BUFFER_CAPACITY_IN_CHARS = 4194304  # beyond this, the logging thread writes the buffer out itself instead of waiting on the background writer
+
+    # log levels taken by sinks outside of dev and test environments: debug and verbose output no sink takes is dropped without being evaluated
+    LOG_FILE_DEBUG_ENABLED = True       # debug and verbose output to the log file
+    TELEMETRY_DEBUG_ENABLED = False     # debug output to telemetry
+
     # Status file states
     STATUS_TRANSITIONING = "Transitioning"
     STATUS_ERROR = "Error"
@@ -244,10 +283,33 @@ class Constants(object):
         PLATFORM = "Platform"
 
     # Maintenance Window
-    PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES = 5
+    PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES = 5     # for packages without install duration history
+
+    # Install duration history: measured install durations (kept in the config folder) predict how long installs take, with a safety margin
+    INSTALL_DURATION_HISTORY_FILE = "InstallDurationHistory.jsonl"
+    INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT = 2000
+    INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT_PER_PACKAGE = 5
+    PACKAGE_INSTALL_DURATION_SAFETY_FACTOR = 1.5
+    PACKAGE_INSTALL_EXPECTED_MIN_TIME_IN_MINUTES = 1
+
+    # Install scheduling: expected time to install a package (excluding its dependencies) - longer for kernels and large runtimes, matched by name prefix
+    PACKAGE_INSTALL_DEFAULT_EXPECTED_TIME_IN_SECS = 30
+    PACKAGE_INSTALL_LONG_EXPECTED_TIME_IN_SECS = 180
+    PACKAGE_INSTALL_LONG_RUNNING_NAME_PREFIXES = ["kernel", "linux-image", "linux-headers", "linux-modules", "linux-firmware", "linux-generic", "linux-azure", "linux-cloud-tools",
+                                              "java-", "openjdk-", "dotnet-", "aspnetcore-", "libreoffice", "texlive", "firefox", "thunderbird", "chromium"]
+
+    # Batched installation: independent packages are installed in transactions of up to this many packages (1 installs every package in its own transaction)
+    PACKAGE_INSTALL_BATCH_MAX_SIZE = 10
+
+    # Download prefetch: packages to be installed are downloaded in the background ahead of their installation, this many packages per download command.
+    # Downloads hold the package manager's transaction lock, so each command is kept short enough for an install not to wait long on it.
+    PACKAGE_PREFETCH_ENABLED = True
+    PACKAGE_PREFETCH_BATCH_SIZE = 1
+    PACKAGE_PREFETCH_COMMAND_MAX_TIME_IN_SECS = 60
 
     # Package Manager Setting
     PACKAGE_MGR_SETTING_REPEAT_PATCH_OPERATION = "RepeatUpdateRun"
+    MAX_BATCHED_PACKAGE_NAMES_LENGTH_IN_CHARS = 32768   # keeps batched package manager commands well under the single argument limit of 'sh -c' (128 KiB)
 
     # Settings for Error Objects logged in status file
     STATUS_ERROR_MSG_SIZE_LIMIT_IN_CHARACTERS = 128
@@ -262,6 +324,7 @@ class Constants(object):
         OPERATION_FAILED = "OPERATION_FAILED"
         PACKAGE_MANAGER_FAILURE = "PACKAGE_MANAGER_FAILURE"
         NEWER_OPERATION_SUPERSEDED = "NEWER_OPERATION_SUPERSEDED"
+        COMMAND_DEADLINE_EXCEEDED = "COMMAND_DEADLINE_EXCEEDED"
 
     ERROR_ADDED_TO_STATUS = "Error_added_to_status"
 
@@ -277,6 +340,10 @@ class Constants(object):
     TELEMETRY_EVENT_COUNTER_MSG_SIZE_LIMIT_IN_CHARS = 15  # buffer for telemetry event counter text added at the end of every message sent to telemetry
     TELEMETRY_MAX_EVENT_COUNT_THROTTLE = 60
     TELEMETRY_MAX_TIME_IN_SECONDS_FOR_EVENT_COUNT_THROTTLE = 60
+    TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS = 1048576  # queued events are written to a new event file in one batch once they reach this size
+    TELEMETRY_EVENT_QUEUE_MAX_AGE_IN_SECS = 10  # or once the oldest queued event is this old
+    TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS = 16777216  # beyond this, the oldest events of the least important level are dropped
+    TELEMETRY_FLUSH_TIMEOUT_IN_SECS = TELEMETRY_MAX_TIME_IN_SECONDS_FOR_EVENT_COUNT_THROTTLE + 30  # longest wait for queued events to be written on flush - writes may be held up by event file throttling for up to a whole throttle window
 
     # Telemetry Event Level
     class TelemetryEventLevel(EnumBackport):
@@ -294,6 +361,16 @@ class Constants(object):
         EXEC = "Core.Exec"                           # mainline execution triggered from handler
         AUTO_ASSESSMENT = "Core.AutoAssessment"      # auto-assessment triggered from scheduler
 
+    # Telemetry aggregation: within each window, repetitive verbose and informational events beyond these budgets are counted into summaries
+    TELEMETRY_AGGREGATION_WINDOW_IN_SECS = 60
+    TELEMETRY_AGGREGATION_PASS_THROUGH_COUNT_PER_TEMPLATE = 5
+    TELEMETRY_AGGREGATION_BUDGET_PER_LEVEL = {
+        TelemetryEventLevel.Verbose: 200,
+        TelemetryEventLevel.Informational: 400
+    }
+    TELEMETRY_AGGREGATION_MAX_SUMMARIES_PER_WINDOW = 20
+    TELEMETRY_AGGREGATION_TEMPLATE_MAX_LENGTH_IN_CHARS = 256
+
     TELEMETRY_NOT_COMPATIBLE_ERROR_MSG = "Unsupported older Azure Linux Agent version. To resolve: http://aka.ms/UpdateLinuxAgent"
     TELEMETRY_COMPATIBLE_MSG = "Minimum Azure Linux Agent version prerequisite met"
 
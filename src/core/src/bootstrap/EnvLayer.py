@@ -23,9 +23,11 @@ import os
 import re
 import platform
 import shutil
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 from core.src.bootstrap.Constants import Constants
 from core.src.external_dependencies import distro
@@ -147,86 +149,84 @@ class EnvLayer(object):
             if raise_if_not_success:
                 raise
 
-    def run_command_output(self, cmd, no_output=False, chk_err=False):
+    def run_command_output(self, cmd, no_output=False, chk_err=False, timeout_in_secs=None, is_kill_allowed=True):
         operation = "RUN_CMD_OUT"
         if not self.__emulator_enabled:
             start = time.time()
-            code, output = self.__run_command_output_raw(cmd, no_output, chk_err)
+            code, output = self.__run_command_output_raw(cmd, no_output, chk_err, timeout_in_secs, is_kill_allowed)
             self.__write_record(operation, code, output, delay=(time.time()-start))
             return code, output
         else:
             return self.__read_record(operation)
 
-    def __run_command_output_raw(self, cmd, no_output, chk_err=True):
+    def run_command_output_streaming(self, cmd, line_handlers=None, max_output_size_in_chars=Constants.STREAMING_COMMAND_MAX_OUTPUT_SIZE_IN_CHARS, timeout_in_secs=None, is_kill_allowed=True):
         """
-        Wrapper for subprocess.check_output. Execute 'cmd'.
+        Executes 'cmd' and returns a CommandOutputStream that yields its decoded output lines (STDOUT and STDERR) as the command produces them.
+        Each line is also passed to the line handlers. The return code is available on the stream once its output is exhausted.
+        """
+        operation = "RUN_CMD_OUT"
+        if not self.__emulator_enabled:
+            start = time.time()
+            process = self.__start_process(cmd, subprocess.PIPE, is_process_group_required=True)
+            process_deadline = self.ProcessDeadline(process, timeout_in_secs, is_kill_allowed=is_kill_allowed) if timeout_in_secs is not None else None
+            lines = (self.__convert_process_output_to_ascii(raw_line).rstrip('\r\n') for raw_line in iter(process.stdout.readline, b''))
+
+            def wait():
+                code = process.wait()
+                return process_deadline.complete(code) if process_deadline is not None else code
+
+            def complete(code, output):
+                self.__write_record(operation, code, output, delay=(time.time()-start))
+
+            def close():
+                """ Releases the command once its stream is done with - if its output was abandoned (e.g. a line handler raised), it's killed along with its children """
+                process.stdout.close()
+                if process.poll() is None:
+                    self.ProcessDeadline.signal_process_group(process, signal.SIGKILL)
+                code = process.wait()
+                if process_deadline is not None:
+                    process_deadline.complete(code)
+
+            return self.CommandOutputStream(lines, wait, line_handlers, max_output_size_in_chars, completion_delegate=complete if self.__recorder_enabled else None, close_delegate=close)
+        else:
+            code, output = self.__read_record(operation)
+            return self.CommandOutputStream.from_output(code, output, line_handlers, max_output_size_in_chars)
+
+    def __run_command_output_raw(self, cmd, no_output, chk_err=True, timeout_in_secs=None, is_kill_allowed=True):
+        """
+        Wrapper for subprocess.Popen. Execute 'cmd'.
         Returns return code and STDOUT, trapping expected exceptions.
         Reports exceptions to Error if chk_err parameter is True
+        If a timeout is given, the command's process group is terminated once it elapses (and killed after a grace period, if allowed), and the return code is COMMAND_TIMED_OUT_RETURN_CODE.
         """
-
-        def check_output(*popenargs, **kwargs):
-            """
-            Backport from subprocess module from python 2.7
-            """
-            if 'stdout' in kwargs:
-                raise ValueError('stdout argument not allowed, it will be overridden.')
-
-            no_output = False
-            if type(popenargs[0]) is bool:
-                no_output = popenargs[0]
-                popenargs = popenargs[1:]
-
-            if no_output is True:
-                out_file = None
-            else:
-                out_file = subprocess.PIPE
-
-            process = subprocess.Popen(stdout=out_file, *popenargs, **kwargs)
-            output, unused_err = process.communicate()
-            retcode = process.poll()
-
-            if retcode:
-                cmd = kwargs.get("args")
-                if cmd is None:
-                    cmd = popenargs[0]
-                raise subprocess.CalledProcessError(retcode, cmd, output=output)
-            return output
-
-        # noinspection PyShadowingNames,PyShadowingNames
-        class CalledProcessError(Exception):
-            """Exception classes used by this module."""
-
-            def __init__(self, return_code, cmd, output=None):
-                self.return_code = return_code
-                self.cmd = cmd
-                self.output = output
-
-            def __str__(self):
-                return "Command '%s' returned non-zero exit status %d" \
-                       % (self.cmd, self.return_code)
-
-        subprocess.check_output = check_output
-        subprocess.CalledProcessError = CalledProcessError
         try:
-            output = subprocess.check_output(no_output, cmd, stderr=subprocess.STDOUT, shell=True)
-        except subprocess.CalledProcessError as e:
-            if chk_err:
-                print("Error: CalledProcessError.  Error Code is: " + str(e.returncode), file=sys.stdout)
-                print("Error: CalledProcessError.  Command string was: " + e.cmd, file=sys.stdout)
-                print("Error: CalledProcessError.  Command result was: " + self.__convert_process_output_to_ascii(e.output[:-1]), file=sys.stdout)
-            if no_output:
-                return e.return_code, None
-            else:
-                return e.return_code, self.__convert_process_output_to_ascii(e.output)
+            process = self.__start_process(cmd, None if no_output else subprocess.PIPE, is_process_group_required=timeout_in_secs is not None)
+            process_deadline = self.ProcessDeadline(process, timeout_in_secs, is_kill_allowed=is_kill_allowed) if timeout_in_secs is not None else None
+            output, unused_err = process.communicate()
+            code = process.poll()
+            if process_deadline is not None:
+                code = process_deadline.complete(code)
         except Exception as error:
             message = "Exception during cmd execution. [Exception={0}][Cmd={1}]".format(repr(error),str(cmd))
             print(message)
-            raise message
+            raise Exception(message)
+
+        if code != 0 and chk_err:
+            print("Error: CalledProcessError.  Error Code is: " + str(code), file=sys.stdout)
+            print("Error: CalledProcessError.  Command string was: " + cmd, file=sys.stdout)
+            print("Error: CalledProcessError.  Command result was: " + (self.__convert_process_output_to_ascii(output[:-1]) if output is not None else ""), file=sys.stdout)
 
         if no_output:
-            return 0, None
+            return code, None
         else:
-            return 0, self.__convert_process_output_to_ascii(output)
+            return code, self.__convert_process_output_to_ascii(output)
+
+    @staticmethod
+    def __start_process(cmd, stdout, is_process_group_required):
+        """ Starts 'cmd' through the shell. Commands that may need to be stopped get a process group of their own, so they can be stopped along with their children. """
+        if not is_process_group_required:
+            return subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.STDOUT, shell=True)
+        return subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.STDOUT, shell=True, preexec_fn=os.setsid)
 
     @staticmethod
     def __convert_process_output_to_ascii(output):
@@ -263,6 +263,100 @@ class EnvLayer(object):
         else:
             return sys.version_info[0]  # python 2.6 doesn't have attributes like 'major' within sys.version_info
 
+# region - Command deadlines
+    class ProcessDeadline(object):
+        """ Terminates a command's process group once its timeout elapses, and kills it if it's still running after a grace period (unless killing isn't allowed) """
+
+        def __init__(self, process, timeout_in_secs, grace_period_in_secs=None, is_kill_allowed=True):
+            self.is_exceeded = False
+            self.__process = process
+            self.__is_kill_allowed = is_kill_allowed
+            self.__grace_period_in_secs = grace_period_in_secs if grace_period_in_secs is not None else Constants.COMMAND_TERMINATION_GRACE_PERIOD_IN_SECS
+            self.__timers = []
+            self.__start_timer(timeout_in_secs, self.__terminate)
+
+        def complete(self, code):
+            """ Stops the deadline once the process has exited. Returns the return code to report for the process. """
+            for timer in self.__timers:
+                timer.cancel()
+            return Constants.COMMAND_TIMED_OUT_RETURN_CODE if self.is_exceeded else code
+
+        def __start_timer(self, interval_in_secs, function):
+            timer = threading.Timer(interval_in_secs, function)
+            timer.daemon = True
+            self.__timers.append(timer)
+            timer.start()
+
+        def __terminate(self):
+            if self.__process.poll() is not None:
+                return
+            self.is_exceeded = True
+            self.signal_process_group(self.__process, signal.SIGTERM)
+            if self.__is_kill_allowed:
+                self.__start_timer(self.__grace_period_in_secs, self.__kill)
+
+        def __kill(self):
+            if self.__process.poll() is None:
+                self.signal_process_group(self.__process, signal.SIGKILL)
+
+        @staticmethod
+        def signal_process_group(process, signal_number):
+            """ Signals a process started with a process group of its own, and its children """
+            try:
+                os.killpg(process.pid, signal_number)
+            except OSError:
+                pass    # already exited
+# endregion - Command deadlines
+
+# region - Command output streaming
+    class CommandOutputStream(object):
+        """ Single-use iterable over the decoded output lines of a command, as it runs """
+
+        def __init__(self, lines, wait_delegate, line_handlers=None, max_output_size_in_chars=Constants.STREAMING_COMMAND_MAX_OUTPUT_SIZE_IN_CHARS, completion_delegate=None, close_delegate=None):
+            self.return_code = None
+            self.output_size = 0
+            self.is_truncated = False
+            self.__lines = lines
+            self.__wait_delegate = wait_delegate
+            self.__line_handlers = list(line_handlers) if line_handlers is not None else []
+            self.__max_output_size_in_chars = max_output_size_in_chars
+            self.__completion_delegate = completion_delegate
+            self.__close_delegate = close_delegate
+            self.__recorded_lines = [] if completion_delegate is not None else None    # only retained for the recorder
+
+        @staticmethod
+        def from_output(code, output, line_handlers=None, max_output_size_in_chars=Constants.STREAMING_COMMAND_MAX_OUTPUT_SIZE_IN_CHARS):
+            """ Stream over the output of a command that has already completed - used for emulated commands """
+            return EnvLayer.CommandOutputStream(iter(output.splitlines() if output is not None else []), lambda: code, line_handlers, max_output_size_in_chars)
+
+        def __iter__(self):
+            try:
+                for line in self.__lines:
+                    self.output_size += len(line) + 1
+                    if self.output_size > self.__max_output_size_in_chars:
+                        self.is_truncated = True
+                        continue    # lines beyond the cap are drained and dropped, so the command isn't blocked on a full pipe
+
+                    for line_handler in self.__line_handlers:
+                        line_handler(line)
+                    if self.__recorded_lines is not None:
+                        self.__recorded_lines.append(line)
+                    yield line
+
+                self.return_code = self.__wait_delegate()
+                if self.__completion_delegate is not None:
+                    self.__completion_delegate(self.return_code, "\n".join(self.__recorded_lines))
+            finally:
+                if self.__close_delegate is not None:
+                    self.__close_delegate()     # also on exceptions, and when iteration is abandoned
+
+        def consume(self):
+            """ Runs the command to completion, passing each line to the line handlers only. Returns the return code. """
+            for line in self:
+                pass
+            return self.return_code
+# endregion - Command output streaming
+
 # region - Platform emulation and extensions
     class Platform(object):
         def __init__(self, recorder_enabled=True, emulator_enabled=False, write_record_delegate=None, read_record_delegate=None):
@@ -0,0 +1,98 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Persisted history of package install durations, shared across runs"""
+import json
+import os
+from core.src.bootstrap.Constants import Constants
+
+
+class InstallDurationHistory(object):
+    """Install durations measured per package and package size, appended one entry per line to a file that's compacted once it grows past its entry limit"""
+
+    def __init__(self, env_layer, composite_logger, history_file_path):
+        self.env_layer = env_layer
+        self.composite_logger = composite_logger
+        self.history_file_path = history_file_path
+        self.__entries = None   # loaded on first use, oldest first
+
+    def record(self, package_name, package_size, install_duration_in_secs):
+        """ Records the duration of a completed package install. Best-effort - without history, estimates fall back to defaults. """
+        entries = self.__get_entries()
+        entry = {'name': str(package_name),
+                 'size': str(package_size),
+                 'durationInSecs': round(float(install_duration_in_secs), 2),
+                 'timestamp': str(self.env_layer.datetime.timestamp())}     # redundant, but present for ease of debuggability
+        entries.append(entry)
+
+        try:
+            if len(entries) > Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT:
+                self.__compact(entries)
+            else:
+                self.env_layer.file_system.write_with_retry(self.history_file_path, json.dumps(entry) + "\n", mode='a+')
+        except Exception as error:
+            self.composite_logger.log_debug(" - Unable to write install duration history. [Path={0}][Error={1}]", self.history_file_path, repr(error))
+
+    def get_expected_install_duration_in_secs(self, package_name):
+        """ Returns the mean duration recorded for the package at its most recently recorded size (i.e. its latest version), or None if it has no history """
+        entries = [entry for entry in self.__get_entries() if entry['name'] == str(package_name)]
+        if len(entries) == 0:
+            return None
+
+        latest_size = entries[-1]['size']
+        durations = [entry['durationInSecs'] for entry in entries if entry['size'] == latest_size]
+        return sum(durations) / len(durations)
+
+    def __get_entries(self):
+        if self.__entries is None:
+            self.__entries = self.__read()
+        return self.__entries
+
+    def __read(self):
+        """ Returns all valid history entries, oldest first. Unreadable lines (e.g. from an interrupted append) are skipped. """
+        entries = []
+        if not os.path.isfile(self.history_file_path):
+            return entries
+
+        try:
+            with self.env_layer.file_system.open(self.history_file_path, mode="r") as file_handle:
+                lines = file_handle.readlines()
+        except Exception as error:
+            self.composite_logger.log_debug(" - Install duration history is unreadable, and will be ignored. [Path={0}][Error={1}]", self.history_file_path, repr(error))
+            return entries
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                entries.append({'name': str(entry['name']), 'size': str(entry['size']), 'durationInSecs': float(entry['durationInSecs']), 'timestamp': str(entry['timestamp'])})
+            except Exception:
+                continue
+        return entries
+
+    def __compact(self, entries):
+        """ Rewrites the history with only the most recent entries for each package and size, and at most half the entry limit overall """
+        retained_entries = []
+        retained_counts = {}
+        for entry in reversed(entries):
+            key = (entry['name'], entry['size'])
+            if retained_counts.get(key, 0) < Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT_PER_PACKAGE:
+                retained_counts[key] = retained_counts.get(key, 0) + 1
+                retained_entries.append(entry)
+        retained_entries = list(reversed(retained_entries[:Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT // 2]))
+
+        self.env_layer.file_system.write_with_retry_using_temp_file(self.history_file_path, "".join(json.dumps(entry) + "\n" for entry in retained_entries), mode='w')
+        self.composite_logger.log_debug(" - Compacted install duration history. [EntryCount={0}][RetainedCount={1}]", str(len(entries)), str(len(retained_entries)))
+        entries[:] = retained_entries
@@ -16,8 +16,10 @@
 
 """Maintenance window management"""
 import datetime
+import os
 from datetime import timedelta
 from core.src.bootstrap.Constants import Constants
+from core.src.core_logic.InstallDurationHistory import InstallDurationHistory
 
 
 class MaintenanceWindow(object):
@@ -30,6 +32,7 @@ class MaintenanceWindow(object):
         self.composite_logger = composite_logger
         self.env_layer = env_layer
         self.status_handler = status_handler
+        self.install_duration_history = InstallDurationHistory(env_layer, composite_logger, os.path.join(execution_config.config_folder, Constants.INSTALL_DURATION_HISTORY_FILE))
 
     def get_remaining_time_in_minutes(self, current_time=None, log_to_stdout=False):
         """Calculate time remaining base on the given job start time"""
@@ -59,9 +62,9 @@ class MaintenanceWindow(object):
 
         return remaining_time_in_minutes
 
-    def is_package_install_time_available(self, remaining_time_in_minutes=None):
-        """Check if time still available for package installation"""
-        cutoff_time_in_minutes = Constants.REBOOT_BUFFER_IN_MINUTES + Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES
+    def is_package_install_time_available(self, remaining_time_in_minutes=None, packages=None):
+        """Check if time still available for package installation (of the given packages, if any)"""
+        cutoff_time_in_minutes = Constants.REBOOT_BUFFER_IN_MINUTES + self.get_expected_max_install_time_in_minutes(packages)
         if remaining_time_in_minutes is None:
             remaining_time_in_minutes = self.get_remaining_time_in_minutes()
 
@@ -72,6 +75,38 @@ class MaintenanceWindow(object):
             self.composite_logger.log_warning("Time Remaining: " + str(timedelta(seconds=int(remaining_time_in_minutes * 60))) + ", Cutoff time: " + str(timedelta(minutes=cutoff_time_in_minutes)) + " [Out of time!]")
             return False
 
+    def get_expected_max_install_time_in_minutes(self, packages=None):
+        """Time to allow for installing the packages - as predicted from their install duration history (with a safety margin) if all of them have one,
+           otherwise the same fixed maximum for every package"""
+        expected_durations_in_secs = [self.install_duration_history.get_expected_install_duration_in_secs(package) for package in packages] if packages else [None]
+        if None in expected_durations_in_secs:
+            return Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES
+        return max(sum(expected_durations_in_secs) * Constants.PACKAGE_INSTALL_DURATION_SAFETY_FACTOR / 60, Constants.PACKAGE_INSTALL_EXPECTED_MIN_TIME_IN_MINUTES)
+
+    def get_expected_install_duration_in_secs(self, packages):
+        """Predicts how long installing the packages takes, one at a time"""
+        return sum(self.get_expected_package_install_duration_in_secs(package) for package in packages)
+
+    def get_expected_transaction_install_duration_in_secs(self, package_name, dependencies):
+        """Predicts how long installing a package along with its dependencies takes - its install duration history is of such transactions already, so it's used alone"""
+        expected_duration_in_secs = self.install_duration_history.get_expected_install_duration_in_secs(package_name)
+        if expected_duration_in_secs is not None:
+            return expected_duration_in_secs
+        return self.get_expected_install_duration_in_secs([package_name] + list(dependencies))
+
+    def get_expected_package_install_duration_in_secs(self, package_name):
+        """Expected time to install a package - from its install duration history if it has one, otherwise longer for kernels and large runtimes"""
+        expected_duration_in_secs = self.install_duration_history.get_expected_install_duration_in_secs(package_name)
+        if expected_duration_in_secs is not None:
+            return expected_duration_in_secs
+        if str(package_name).startswith(tuple(Constants.PACKAGE_INSTALL_LONG_RUNNING_NAME_PREFIXES)):
+            return Constants.PACKAGE_INSTALL_LONG_EXPECTED_TIME_IN_SECS
+        return Constants.PACKAGE_INSTALL_DEFAULT_EXPECTED_TIME_IN_SECS
+
+    def record_package_install_duration(self, package_name, package_size, install_duration_in_secs):
+        """Records how long a package install took, for later predictions"""
+        self.install_duration_history.record(package_name, package_size, install_duration_in_secs)
+
     def get_percentage_maintenance_window_used(self):
         """Calculate percentage of maintenance window used"""
         try:
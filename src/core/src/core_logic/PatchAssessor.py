@@ -69,12 +69,12 @@ class PatchAssessor(object):
                 if self.lifecycle_manager is not None:
                     self.lifecycle_manager.lifecycle_status_check()     # may terminate the code abruptly, as designed
                 retry_count = retry_count + 1
-                packages, package_versions = self.package_manager.get_all_updates()
+                packages, package_versions = self.package_manager.get_classified_updates()
                 self.telemetry_writer.write_event("Full assessment: " + str(packages), Constants.TelemetryEventLevel.Verbose)
                 self.status_handler.set_package_assessment_status(packages, package_versions)
                 if self.lifecycle_manager is not None:
                     self.lifecycle_manager.lifecycle_status_check()     # may terminate the code abruptly, as designed
-                sec_packages, sec_package_versions = self.package_manager.get_security_updates()
+                sec_packages, sec_package_versions = self.package_manager.get_classified_updates(Constants.PackageClassification.SECURITY)
                 self.telemetry_writer.write_event("Security assessment: " + str(sec_packages), Constants.TelemetryEventLevel.Verbose)
                 self.status_handler.set_package_assessment_status(sec_packages, sec_package_versions, "Security")
                 self.status_handler.set_assessment_substatus_json(status=Constants.STATUS_SUCCESS)
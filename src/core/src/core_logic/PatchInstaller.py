@@ -20,6 +20,9 @@ import os
 import time
 from core.src.bootstrap.Constants import Constants
 from core.src.core_logic.Stopwatch import Stopwatch
+from core.src.package_managers.PackageJournalReader import PackageJournalReader
+from core.src.package_managers.PackagePrefetcher import PackagePrefetcher
+from core.src.package_managers.UpdateSet import UpdateSet
 
 class PatchInstaller(object):
     """" Wrapper class for a single patch installation operation """
@@ -38,8 +41,7 @@ class PatchInstaller(object):
         self.maintenance_window = maintenance_window
         self.reboot_manager = reboot_manager
 
-        self.last_still_needed_packages = None  # Used for 'Installed' status records
-        self.last_still_needed_package_versions = None
+        self.last_still_needed_updates = None  # Used for 'Installed' status records
         self.progress_template = "[Time available: {0} | A: {1}, S: {2}, F: {3} | D: {4}]\t {5}"
 
         # Constants
@@ -62,6 +64,7 @@ class PatchInstaller(object):
         maintenance_window = self.maintenance_window
         package_manager = self.package_manager
         reboot_manager = self.reboot_manager
+        package_manager.set_maintenance_window(maintenance_window)  # package manager commands are bounded by the time left from here on
 
         # Early reboot if reboot is allowed by settings and required by the machine
         reboot_pending = self.is_reboot_pending()
@@ -135,7 +138,7 @@ class PatchInstaller(object):
     def install_updates(self, maintenance_window, package_manager, simulate=False):
         """wrapper function of installing updates"""
         self.composite_logger.log("\n\nGetting available updates...")
-        package_manager.refresh_repo()
+        package_manager.refresh_repo(force=True)     # installation always works off freshly refreshed repo metadata
 
         packages, package_versions = package_manager.get_available_updates(self.package_filter)  # Initial, ignoring exclusions
         self.telemetry_writer.write_event("Initial package list: " + str(packages), Constants.TelemetryEventLevel.Verbose)
@@ -156,7 +159,7 @@ class PatchInstaller(object):
         self.status_handler.set_package_install_status(packages, package_versions, Constants.PENDING)
         self.composite_logger.log("\nList of packages to be updated: \n" + str(packages))
 
-        sec_packages, sec_package_versions = self.package_manager.get_security_updates()
+        sec_packages, sec_package_versions = self.package_manager.get_classified_updates(Constants.PackageClassification.SECURITY)
         self.telemetry_writer.write_event("Security packages out of the final package list: " + str(sec_packages), Constants.TelemetryEventLevel.Verbose)
         self.status_handler.set_package_install_status_classification(sec_packages, sec_package_versions, classification="Security")
 
@@ -174,100 +177,109 @@ class PatchInstaller(object):
         maintenance_window_exceeded = False
         all_packages, all_package_versions = package_manager.get_all_updates(True)  # cached is fine
         self.telemetry_writer.write_event("All available packages list: " + str(all_packages), Constants.TelemetryEventLevel.Verbose)
-        self.last_still_needed_packages = all_packages
-        self.last_still_needed_package_versions = all_package_versions
+        all_updates = UpdateSet.from_lists(all_packages, all_package_versions)
+        selected_updates = UpdateSet.from_lists(packages, package_versions)
+        self.last_still_needed_updates = all_updates.copy()
+        multilib_updates = self.get_multilib_updates(package_manager, selected_updates)
+        package_manager.build_dependency_graph(packages)  # reuses what exclusion evaluation already resolved
+        packages, package_versions = self.get_install_schedule(maintenance_window, package_manager, packages, package_versions, sec_packages)
+
+        # (ESM packages, and packages with unresolved dependencies that may surface errors, are left to the sequence below)
+        install_units = [(package, version) + self.get_package_and_dependencies(package_manager, package, version, all_updates, selected_updates, multilib_updates)
+                         for package, version in zip(packages, package_versions) if version != Constants.UA_ESM_REQUIRED and package_manager.is_in_dependency_graph(package)]
+
+        # installs are attributed from the package manager's transaction journal where there is one, instead of checking each dependency and periodically rediscovering all updates
+        package_journal_reader = self.get_package_journal_reader(package_manager) if not simulate else None
+
+        # packages are downloaded in the background between install transactions, ahead of their installation, so installs mostly only unpack and configure them
+        package_prefetcher = None
+        if Constants.PACKAGE_PREFETCH_ENABLED and not simulate:
+            package_prefetcher = PackagePrefetcher(self.composite_logger, package_manager, maintenance_window)
+            package_prefetcher.start(install_units)
 
-        for package, version in zip(packages, package_versions):
-            # Extension state check
-            if self.lifecycle_manager is not None:
-                self.lifecycle_manager.lifecycle_status_check()     # may terminate the code abruptly, as designed
-
-            # maintenance window check
-            remaining_time = maintenance_window.get_remaining_time_in_minutes()
-            if maintenance_window.is_package_install_time_available(remaining_time) is False:
-                error_msg = "Stopped patch installation as it is past the maintenance window cutoff time."
-                self.composite_logger.log_error("\n" + error_msg)
-                self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.DEFAULT_ERROR)
-                maintenance_window_exceeded = True
-                self.status_handler.set_maintenance_window_exceeded(True)
-                break
-
-            # point in time status
-            progress_status = self.progress_template.format(str(datetime.timedelta(minutes=remaining_time)), str(attempted_parent_update_count), str(successful_parent_update_count), str(failed_parent_update_count), str(installed_update_count - successful_parent_update_count),
-                                                            "Processing package: " + str(package) + " (" + str(version) + ")")
-            if version == Constants.UA_ESM_REQUIRED:
-                progress_status += "[Skipping - requires Ubuntu Advantage for Infrastructure with Extended Security Maintenance]"
-                self.composite_logger.log(progress_status)
-                self.status_handler.set_package_install_status(package_manager.get_product_name(package), str(version), Constants.NOT_SELECTED)     # may be changed to Failed in the future
-                continue
-            self.composite_logger.log(progress_status)
-
-            # include all dependencies (with specified versions) explicitly
-            package_and_dependencies = [package]
-            package_and_dependency_versions = [version]
-            dependencies = package_manager.get_dependent_list(package)
-            for dependency in dependencies:
-                if dependency not in all_packages:
+        try:
+            # independent packages are installed in batches first - those verified to be installed there are only accounted for in sequence below
+            batch_installed_packages = set()
+            if Constants.PACKAGE_INSTALL_BATCH_MAX_SIZE > 1:
+                batch_installed_packages = self.install_updates_in_batches(maintenance_window, package_manager, install_units, simulate)
+
+            for package, version in zip(packages, package_versions):
+                # Extension state check
+                if self.lifecycle_manager is not None:
+                    self.lifecycle_manager.lifecycle_status_check()     # may terminate the code abruptly, as designed
+
+                # maintenance window check (not needed for packages already installed in a batch)
+                remaining_time = maintenance_window.get_remaining_time_in_minutes()
+                if package not in batch_installed_packages and maintenance_window.is_package_install_time_available(remaining_time, [package]) is False:
+                    error_msg = "Stopped patch installation as it is past the maintenance window cutoff time."
+                    self.composite_logger.log_error("\n" + error_msg)
+                    self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.DEFAULT_ERROR)
+                    maintenance_window_exceeded = True
+                    self.status_handler.set_maintenance_window_exceeded(True)
+                    break
+
+                # point in time status
+                progress_status = self.progress_template.format(str(datetime.timedelta(minutes=remaining_time)), str(attempted_parent_update_count), str(successful_parent_update_count), str(failed_parent_update_count), str(installed_update_count - successful_parent_update_count),
+                                                                "Processing package: " + str(package) + " (" + str(version) + ")")
+                if version == Constants.UA_ESM_REQUIRED:
+                    progress_status += "[Skipping - requires Ubuntu Advantage for Infrastructure with Extended Security Maintenance]"
+                    self.composite_logger.log(progress_status)
+                    self.status_handler.set_package_install_status(package_manager.get_product_name(package), str(version), Constants.NOT_SELECTED)     # may be changed to Failed in the future
                     continue
-                package_and_dependencies.append(dependency)
-                package_and_dependency_versions.append(package_versions[packages.index(dependency)] if dependency in packages else Constants.DEFAULT_UNSPECIFIED_VALUE)
-
-            # multilib resolution for yum
-            if package_manager.get_package_manager_setting(Constants.PKG_MGR_SETTING_IDENTITY) == Constants.YUM:
-                package_name_without_arch = package_manager.get_product_name_without_arch(package)
-                for possible_arch_dependency, possible_arch_dependency_version in zip(packages, package_versions):
-                    if package_manager.get_product_name_without_arch(possible_arch_dependency) == package_name_without_arch and possible_arch_dependency not in package_and_dependencies:
-                        package_and_dependencies.append(possible_arch_dependency)
-                        package_and_dependency_versions.append(possible_arch_dependency_version)
-
-            # remove duplicates
-            package_and_dependencies, package_and_dependency_versions = package_manager.dedupe_update_packages(package_and_dependencies, package_and_dependency_versions)
-
-            # parent package install (+ dependencies) and parent package result management
-            install_result = Constants.FAILED
-            for i in range(0, Constants.MAX_INSTALLATION_RETRY_COUNT):
-                install_result = package_manager.install_update_and_dependencies(package_and_dependencies, package_and_dependency_versions, simulate)
-                if install_result != Constants.INSTALLED:
-                    if i < Constants.MAX_INSTALLATION_RETRY_COUNT - 1:
-                        time.sleep(i + 1)
-                        self.composite_logger.log_warning("Retrying installation of package. [Package={0}]".format(package_manager.get_product_name(package_and_dependencies[0])))
-
-            # Update reboot pending status in status_handler
-            self.status_handler.set_reboot_pending(self.is_reboot_pending())
+                self.composite_logger.log(progress_status)
 
-            if install_result == Constants.FAILED:
-                self.status_handler.set_package_install_status(package_manager.get_product_name(str(package_and_dependencies[0])), str(package_and_dependency_versions[0]), Constants.FAILED)
-                failed_parent_update_count += 1
-                patch_installation_successful = False
-            elif install_result == Constants.INSTALLED:
-                self.status_handler.set_package_install_status(package_manager.get_product_name(str(package_and_dependencies[0])), str(package_and_dependency_versions[0]), Constants.INSTALLED)
-                successful_parent_update_count += 1
-                if package in self.last_still_needed_packages:
-                    index = self.last_still_needed_packages.index(package)
-                    self.last_still_needed_packages.pop(index)
-                    self.last_still_needed_package_versions.pop(index)
-                    installed_update_count += 1
-            attempted_parent_update_count += 1
-
-            # dependency package result management
-            for dependency, dependency_version in zip(package_and_dependencies, package_and_dependency_versions):
-                if dependency not in self.last_still_needed_packages or dependency == package:
-                    continue
+                # include all dependencies (with specified versions) explicitly
+                package_and_dependencies, package_and_dependency_versions = self.get_package_and_dependencies(package_manager, package, version, all_updates, selected_updates, multilib_updates)
 
-                if package_manager.is_package_version_installed(dependency, dependency_version):
-                    self.composite_logger.log_debug(" - Marking dependency as succeeded: " + str(dependency) + "(" + str(dependency_version) + ")")
-                    self.status_handler.set_package_install_status(package_manager.get_product_name(str(dependency)), str(dependency_version), Constants.INSTALLED)
-                    index = self.last_still_needed_packages.index(dependency)
-                    self.last_still_needed_packages.pop(index)
-                    self.last_still_needed_package_versions.pop(index)
-                    installed_update_count += 1
+                # parent package install (+ dependencies) and parent package result management
+                if package in batch_installed_packages:
+                    install_result = Constants.INSTALLED    # verified after its batch, which also updated the reboot pending status
                 else:
-                    # status is not logged by design here, in case you were wondering if that's a bug
-                    message = " - [Info] Dependency appears to have failed to install (note: it *may* be retried): " + str(dependency) + "(" + str(dependency_version) + ")"
-                    self.composite_logger.log_debug(message)
+                    install_result = Constants.FAILED
+                    for i in range(0, Constants.MAX_INSTALLATION_RETRY_COUNT):
+                        install_result = package_manager.install_update_and_dependencies(package_and_dependencies, package_and_dependency_versions, simulate)
+                        if install_result != Constants.INSTALLED:
+                            if i < Constants.MAX_INSTALLATION_RETRY_COUNT - 1:
+                                time.sleep(i + 1)
+                                self.composite_logger.log_warning("Retrying installation of package. [Package={0}]".format(package_manager.get_product_name(package_and_dependencies[0])))
+
+                    # Update reboot pending status in status_handler
+                    self.status_handler.set_reboot_pending(self.is_reboot_pending())
+
+                if install_result == Constants.FAILED:
+                    self.status_handler.set_package_install_status(package_manager.get_product_name(str(package_and_dependencies[0])), str(package_and_dependency_versions[0]), Constants.FAILED)
+                    failed_parent_update_count += 1
+                    patch_installation_successful = False
+                elif install_result == Constants.INSTALLED:
+                    self.status_handler.set_package_install_status(package_manager.get_product_name(str(package_and_dependencies[0])), str(package_and_dependency_versions[0]), Constants.INSTALLED)
+                    successful_parent_update_count += 1
+                    if self.last_still_needed_updates.remove(package) is not None:
+                        installed_update_count += 1
+                attempted_parent_update_count += 1
+
+                # dependency package result management
+                if package_journal_reader is not None:
+                    installed_update_count += self.attribute_package_journal_entries(package_manager, package_journal_reader)
+                    continue
 
-            # dependency package result management fallback (not reliable enough to be used as primary, and will be removed; remember to retain last_still_needed refresh when you do that)
-            installed_update_count += self.perform_status_reconciliation_conditionally(package_manager, condition=(attempted_parent_update_count % Constants.PACKAGE_STATUS_REFRESH_RATE_IN_SECONDS == 0))  # reconcile status after every 10 attempted installs
+                for dependency, dependency_version in zip(package_and_dependencies, package_and_dependency_versions):
+                    if dependency not in self.last_still_needed_updates or dependency == package:
+                        continue
+
+                    if package_manager.is_package_version_installed(dependency, dependency_version):
+                        self.composite_logger.log_debug(" - Marking dependency as succeeded: {0}({1})", str(dependency), str(dependency_version))
+                        self.status_handler.set_package_install_status(package_manager.get_product_name(str(dependency)), str(dependency_version), Constants.INSTALLED)
+                        self.last_still_needed_updates.remove(dependency)
+                        installed_update_count += 1
+                    else:
+                        # status is not logged by design here, in case you were wondering if that's a bug
+                        self.composite_logger.log_debug(" - [Info] Dependency appears to have failed to install (note: it *may* be retried): {0}({1})", str(dependency), str(dependency_version))
+
+                # dependency package result management fallback without a journal (not reliable enough to be used as primary, and will be removed; remember to retain last_still_needed refresh when you do that)
+                installed_update_count += self.perform_status_reconciliation_conditionally(package_manager, condition=(attempted_parent_update_count % Constants.PACKAGE_STATUS_REFRESH_RATE_IN_SECONDS == 0))  # reconcile status after every 10 attempted installs
+        finally:
+            if package_prefetcher is not None:
+                package_prefetcher.stop()   # also on errors, so no download outlives the install loop
 
         progress_status = self.progress_template.format(str(datetime.timedelta(minutes=maintenance_window.get_remaining_time_in_minutes())), str(attempted_parent_update_count), str(successful_parent_update_count), str(failed_parent_update_count), str(installed_update_count - successful_parent_update_count),
                                                         "Completed processing packages!")
@@ -285,6 +297,166 @@ class PatchInstaller(object):
 
         return installed_update_count, patch_installation_successful, maintenance_window_exceeded
 
+    def get_install_schedule(self, maintenance_window, package_manager, packages, package_versions, security_packages):
+        """ Orders the final package list for the most installs per minute of maintenance window, and logs the schedule. Packages are grouped with the selected
+            packages they depend on (or that depend on them), and security groups come first, each class in order of expected install duration (shortest first). """
+        security_packages = set(security_packages)
+        group_roots = dict((package, package) for package in packages)
+
+        def get_group_root(package):
+            while group_roots[package] != package:
+                package = group_roots[package]
+            return package
+
+        for package in packages:
+            if not package_manager.is_in_dependency_graph(package):
+                continue    # not resolved on demand here, as that may surface errors - the package is scheduled on its own
+            for dependency in package_manager.get_dependencies_from_graph(package):
+                if dependency in group_roots and get_group_root(dependency) != get_group_root(package):
+                    group_roots[get_group_root(dependency)] = get_group_root(package)
+
+        groups = {}     # group root -> indexes into the final package list, in discovery order
+        for index, package in enumerate(packages):
+            groups.setdefault(get_group_root(package), []).append(index)
+
+        schedule = []   # (classification rank, expected duration, first index, indexes)
+        for indexes in groups.values():
+            expected_duration_in_secs = 0
+            transaction_packages = set()    # packages installed by the group's transactions so far (each package is installed with its dependencies)
+            for index in indexes:
+                if packages[index] in transaction_packages:
+                    continue
+                dependencies = package_manager.get_dependencies_from_graph(packages[index]) if package_manager.is_in_dependency_graph(packages[index]) else []
+                dependencies = [dependency for dependency in dependencies if dependency not in transaction_packages and dependency != packages[index]]
+                expected_duration_in_secs += maintenance_window.get_expected_transaction_install_duration_in_secs(packages[index], dependencies)
+                transaction_packages.update([packages[index]] + dependencies)
+            is_security_group = any(packages[index] in security_packages for index in indexes)
+            schedule.append((0 if is_security_group else 1, expected_duration_in_secs, indexes[0], indexes))
+        schedule.sort()
+
+        self.composite_logger.log("\nInstall schedule (security updates first, dependent packages together, shorter installs first):")
+        for group_number, (rank, expected_duration_in_secs, first_index, indexes) in enumerate(schedule):
+            self.composite_logger.log(" {0}. [Classification={1}][ExpectedDuration={2}][Packages={3}]".format(str(group_number + 1), "Security" if rank == 0 else "Other", str(datetime.timedelta(seconds=int(expected_duration_in_secs))),
+                                                                                                               ", ".join(str(packages[index]) + " (" + str(package_versions[index]) + ")" for index in indexes)))
+
+        expected_total_duration_in_secs = int(sum(entry[1] for entry in schedule))
+        expected_completion_time = self.env_layer.datetime.datetime_utcnow() + datetime.timedelta(seconds=expected_total_duration_in_secs)
+        self.composite_logger.log("Expected installation completion: {0} UTC [ExpectedDuration={1}]".format(expected_completion_time.strftime("%Y-%m-%d %H:%M:%S"), str(datetime.timedelta(seconds=expected_total_duration_in_secs))))
+        install_time_available_in_secs = (maintenance_window.get_remaining_time_in_minutes() - Constants.REBOOT_BUFFER_IN_MINUTES) * 60
+        if expected_total_duration_in_secs > install_time_available_in_secs:
+            self.composite_logger.log_warning("Not all patches are expected to be installed within the maintenance window. Patches are installed in schedule order. [InstallTimeAvailable={0}]".format(str(datetime.timedelta(seconds=int(max(install_time_available_in_secs, 0))))))
+
+        scheduled_indexes = [index for entry in schedule for index in entry[3]]
+        return [packages[index] for index in scheduled_indexes], [package_versions[index] for index in scheduled_indexes]
+
+    @staticmethod
+    def get_multilib_updates(package_manager, selected_updates):
+        """ Returns name without arch -> all selected arch variants, for multilib resolution (yum only) """
+        if package_manager.get_package_manager_setting(Constants.PKG_MGR_SETTING_IDENTITY) != Constants.YUM:
+            return None
+        multilib_updates = {}
+        for selected_update in selected_updates:
+            multilib_updates.setdefault(package_manager.get_product_name_without_arch(selected_update.name), []).append(selected_update)
+        return multilib_updates
+
+    @staticmethod
+    def get_package_and_dependencies(package_manager, package, version, all_updates, selected_updates, multilib_updates):
+        """ Returns the package with all its dependencies (with specified versions) and multilib variants, to be installed together """
+        package_and_dependencies = [package]
+        package_and_dependency_versions = [version]
+        dependencies = package_manager.get_dependencies_from_graph(package)
+        for dependency in dependencies:
+            if dependency not in all_updates:
+                continue
+            package_and_dependencies.append(dependency)
+            package_and_dependency_versions.append(selected_updates.get_version(dependency, Constants.DEFAULT_UNSPECIFIED_VALUE))
+
+        # multilib resolution for yum
+        if multilib_updates is not None:
+            for possible_arch_dependency in multilib_updates.get(package_manager.get_product_name_without_arch(package), []):
+                if possible_arch_dependency.name not in package_and_dependencies:
+                    package_and_dependencies.append(possible_arch_dependency.name)
+                    package_and_dependency_versions.append(possible_arch_dependency.version)
+
+        # remove duplicates
+        return package_manager.dedupe_update_packages(package_and_dependencies, package_and_dependency_versions)
+
+    def install_updates_in_batches(self, maintenance_window, package_manager, install_units, simulate=False):
+        """ Installs independent packages (each with its dependencies) in batched transactions, in install order - a package that can't share a batch is installed alone in its place.
+            A failed batch is split in half recursively to isolate what failed, down to single packages, which are left to be installed (and retried) individually.
+            Returns the parent packages verified to be installed. Install units are (package, version, package_and_dependencies, package_and_dependency_versions). """
+        self.composite_logger.log("\nInstalling independent patches in batches...")
+        installed_packages = set()
+        pending_batches = [(batch, False) for batch in reversed(self.get_independent_install_batches(install_units, Constants.PACKAGE_INSTALL_BATCH_MAX_SIZE))]   # (batch, is isolating a failure)
+
+        while len(pending_batches) > 0:
+            batch, is_isolating_failure = pending_batches.pop()
+            if is_isolating_failure and len(batch) < 2:
+                continue    # installed individually
+
+            if self.lifecycle_manager is not None:
+                self.lifecycle_manager.lifecycle_status_check()     # may terminate the code abruptly, as designed
+
+            # batches are bounded by the time that individual installs of their packages are expected to need at most (from install duration history where there is one)
+            remaining_time = maintenance_window.get_remaining_time_in_minutes()
+            max_batch_size = self.get_units_fitting_in_time(maintenance_window, batch, remaining_time - Constants.REBOOT_BUFFER_IN_MINUTES)
+            if max_batch_size < 1:
+                self.composite_logger.log_debug(" - Not enough time left in the maintenance window for batches. [RemainingTimeInMinutes={0}]", str(remaining_time))
+                break
+            if len(batch) > max_batch_size:
+                pending_batches.extend((split_batch, is_isolating_failure) for split_batch in reversed(self.split_install_batch(batch)))
+                continue
+
+            parent_packages = [unit[0] for unit in batch]
+            self.composite_logger.log("Installing batch of patches: " + str(parent_packages))
+            packages, package_versions = package_manager.dedupe_update_packages(sum([list(unit[2]) for unit in batch], []), sum([list(unit[3]) for unit in batch], []))
+            batch_installed_packages = package_manager.install_update_batch(parent_packages, [unit[1] for unit in batch], packages, package_versions, simulate)
+            installed_packages.update(batch_installed_packages)
+            self.status_handler.set_reboot_pending(self.is_reboot_pending())
+
+            failed_units = [unit for unit in batch if unit[0] not in batch_installed_packages]
+            if len(failed_units) > 1:
+                self.composite_logger.log_warning(" - Isolating patches not installed in batch. [Packages={0}]".format(str([unit[0] for unit in failed_units])))
+                pending_batches.extend((split_batch, True) for split_batch in reversed(self.split_install_batch(failed_units)))
+
+        self.composite_logger.log("Installed {0} of {1} patches in batches. Remaining patches will be installed in sequence.".format(str(len(installed_packages)), str(len(install_units))))
+        return installed_packages
+
+    @staticmethod
+    def get_units_fitting_in_time(maintenance_window, install_units, time_available_in_minutes):
+        """ Returns how many of the install units, in order, are expected to be installed (each at its expected maximum install time) within the time available """
+        unit_count = 0
+        for unit in install_units:
+            time_available_in_minutes -= maintenance_window.get_expected_max_install_time_in_minutes([unit[0]])
+            if time_available_in_minutes < 0:
+                break
+            unit_count += 1
+        return unit_count
+
+    @staticmethod
+    def get_independent_install_batches(install_units, max_batch_size):
+        """ Groups install units, in order, into batches of at most max_batch_size units that share no packages """
+        batches = []
+        batch = []
+        batch_packages = set()
+        for unit in install_units:
+            unit_packages = set(unit[2])
+            if len(batch) >= max_batch_size or not batch_packages.isdisjoint(unit_packages):
+                batches.append(batch)
+                batch = []
+                batch_packages = set()
+            batch.append(unit)
+            batch_packages.update(unit_packages)
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def split_install_batch(batch):
+        """ Splits a batch in half """
+        middle = (len(batch) + 1) // 2
+        return [batch[:middle], batch[middle:]]
+
     def is_reboot_pending(self):
         """ Checks if there is a pending reboot on the machine. """
         try:
@@ -321,6 +493,38 @@ class PatchInstaller(object):
                 wait_after_update=False)
 
     # region Installation Progress support
+    def get_package_journal_reader(self, package_manager):
+        """ Returns a reader of the package manager's transaction journal positioned for this operation, or None if there's no journal """
+        package_journal_path = package_manager.get_package_journal_path()
+        if package_journal_path is None:
+            return None
+
+        package_journal_reader = PackageJournalReader(self.env_layer, self.composite_logger, package_journal_path, package_manager.parse_package_journal_line,
+                                                      os.path.join(self.execution_config.config_folder, Constants.PACKAGE_JOURNAL_OFFSET_FILE), self.execution_config.activity_id)
+        return package_journal_reader if package_journal_reader.start() else None
+
+    def attribute_package_journal_entries(self, package_manager, package_journal_reader):
+        """Writes out success records for the still needed updates that the package manager's journal shows installed at their version since it was last read
+           (mostly dependencies that get silently installed); returns count of detected installs"""
+        installed_count = 0
+        for entry in package_journal_reader.read_new_entries():
+            if entry.action == Constants.PackageJournalActions.REMOVED:
+                self.composite_logger.log_debug(" - [Info] Package removed in transaction: {0}({1})", str(entry.name), str(entry.version))
+                continue
+
+            still_needed_update = self.last_still_needed_updates.get(entry.name)
+            if still_needed_update is None:
+                continue
+            if not entry.is_version(still_needed_update.version):
+                self.composite_logger.log_debug(" - [Info] Package installed at a version other than its update: {0}({1}) [Update={2}]", str(entry.name), str(entry.version), str(still_needed_update.version))
+                continue
+
+            self.composite_logger.log_debug(" - Marking package as succeeded from journal: {0}({1}) [{2}]", str(entry.name), str(still_needed_update.version), str(entry.action))
+            self.status_handler.set_package_install_status(package_manager.get_product_name(str(entry.name)), str(still_needed_update.version), Constants.INSTALLED)
+            self.last_still_needed_updates.remove(entry.name)
+            installed_count += 1
+        return installed_count
+
     def perform_status_reconciliation_conditionally(self, package_manager, condition=True):
         """Periodically based on the condition check, writes out success records as required; returns count of detected installs.
            This is mostly to capture the dependencies that get silently installed recorded.
@@ -332,16 +536,16 @@ class PatchInstaller(object):
         self.composite_logger.log_debug("\nStarting status reconciliation...")
         start_time = time.time()
         still_needed_packages, still_needed_package_versions = package_manager.get_all_updates(False)  # do not use cache
+        still_needed_updates = UpdateSet.from_lists(still_needed_packages, still_needed_package_versions)
         successful_packages = []
         successful_package_versions = []
-        for i in range(0, len(self.last_still_needed_packages)):
-            if self.last_still_needed_packages[i] not in still_needed_packages:
-                successful_packages.append(self.last_still_needed_packages[i])
-                successful_package_versions.append(self.last_still_needed_package_versions[i])
+        for last_still_needed_update in self.last_still_needed_updates:
+            if last_still_needed_update.name not in still_needed_updates:
+                successful_packages.append(last_still_needed_update.name)
+                successful_package_versions.append(last_still_needed_update.version)
 
         self.status_handler.set_package_install_status(successful_packages, successful_package_versions, Constants.INSTALLED)
-        self.last_still_needed_packages = still_needed_packages
-        self.last_still_needed_package_versions = still_needed_package_versions
+        self.last_still_needed_updates = still_needed_updates
         self.composite_logger.log_debug("Completed status reconciliation. Time taken: " + str(time.time() - start_time) + " seconds.")
         return len(successful_packages)
     # endregion
@@ -351,6 +555,7 @@ class PatchInstaller(object):
         """Returns the list of updates not included given any list of packages that will be included"""
         self.composite_logger.log_debug("\nEvaluating for 'not included' packages...")
         all_packages, all_package_versions = package_manager.get_all_updates(True)  # cached is fine
+        included_packages = set(included_packages)
         not_included_packages = []
         not_included_package_versions = []
         for i in range(0, len(all_packages)):
@@ -370,13 +575,14 @@ class PatchInstaller(object):
         if not self.package_filter.is_exclusion_list_present():
             return excluded_packages, excluded_package_versions
 
+        package_manager.build_dependency_graph([package for package in packages if not self.package_filter.check_for_exclusion(package)])
         for package, package_version in zip(packages, package_versions):
             if self.package_filter.check_for_exclusion(package):
                 excluded_packages.append(package)  # package is excluded, no need to check for dependency exclusion
                 excluded_package_versions.append(package_version)
                 continue
 
-            dependency_list = package_manager.get_dependent_list(package)
+            dependency_list = package_manager.get_dependencies_from_graph(package)
             if dependency_list and self.package_filter.check_for_exclusion(dependency_list):
                 self.composite_logger.log_debug(" - Exclusion list match on dependency list for package '{0}': {1}".format(str(package), str(dependency_list)))
                 excluded_packages.append(package)  # one of the package's dependencies are excluded, so exclude the package
@@ -390,13 +596,14 @@ class PatchInstaller(object):
         self.composite_logger.log_debug("\nFiltering out 'excluded' packages from included packages...")
         new_included_packages = []
         new_included_package_versions = []
+        excluded_packages = set(excluded_packages)
 
         for package, version in zip(included_packages, included_package_versions):
             if package not in excluded_packages:
                 new_included_packages.append(package)
                 new_included_package_versions.append(version)
             else:
-                self.composite_logger.log_debug(" - Package '" + str(package) + "' is being filtered out.")
+                self.composite_logger.log_debug(" - Package '{0}' is being filtered out.", str(package))
 
         self.composite_logger.log_debug(str(len(new_included_packages)) + " out of " + str(len(included_packages)) + " packages will remain included in the run.")
         return new_included_packages, new_included_package_versions
@@ -68,6 +68,10 @@ class RebootManager(object):
         self.composite_logger.log("\nThe machine is set to reboot in " + self.minutes_to_shutdown + " minutes.")
 
         self.status_handler.set_installation_reboot_status(Constants.RebootStatus.STARTED)
+        if self.composite_logger.telemetry_writer is not None:
+            self.composite_logger.telemetry_writer.flush()
+        if self.composite_logger.file_logger is not None:
+            self.composite_logger.file_logger.flush(durable=True)
         reboot_init_time = self.env_layer.datetime.datetime_utcnow()
         self.env_layer.reboot_machine(self.reboot_cmd + self.minutes_to_shutdown + ' ' + message)
 
@@ -82,9 +86,9 @@ class RebootManager(object):
                 self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.DEFAULT_ERROR)
                 raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
             else:
-                self.composite_logger.file_logger.flush()
+                self.composite_logger.file_logger.flush(durable=True)
                 self.composite_logger.log("Waiting for machine reboot. [ElapsedTimeInMinutes={0}] [MaxTimeInMinutes={1}]".format(str(elapsed_time_in_minutes), str(max_allowable_time_to_reboot_in_minutes)))
-                self.composite_logger.file_logger.flush()
+                self.composite_logger.file_logger.flush(durable=True)
                 time.sleep(60)
 
     def start_reboot_if_required_and_time_available(self, current_time_available):
@@ -36,10 +36,12 @@ class CompositeLogger(object):
         self.NEWLINE_REPLACE_CHAR = " "
 
     def log(self, message, message_type=Constants.TelemetryEventLevel.Informational):
-        """log output"""
-        message = self.__remove_substring_from_message(message, Constants.ERROR_ADDED_TO_STATUS)
+        """log output - message may be a callable returning the message, which is only evaluated if a sink accepts it"""
+        if not (self.__is_telemetry_sink_enabled(Constants.DEV) or self.current_env in (Constants.DEV, Constants.TEST) or self.file_logger is not None):
+            return
+        message = self.__remove_substring_from_message(self.__get_message(message), Constants.ERROR_ADDED_TO_STATUS)
         message = message.strip()
-        if self.telemetry_writer is not None and self.telemetry_writer.events_folder_path is not None and self.current_env != Constants.DEV:  # turned off for dev environment as it severely slows down execution
+        if self.__is_telemetry_sink_enabled(Constants.DEV):  # turned off for dev environment as it severely slows down execution
             self.telemetry_writer.write_event(message, message_type)
         if self.current_env in (Constants.DEV, Constants.TEST):
             for line in message.splitlines():  # allows the extended file logger to strip unnecessary white space
@@ -48,35 +50,40 @@ class CompositeLogger(object):
             timestamp = self.env_layer.datetime.timestamp()
             self.file_logger.write("\n" + timestamp + "> " + message.strip(), fail_silently=False)
 
-    def log_error(self, message):
-        """log errors"""
-        message = self.__remove_substring_from_message(message, Constants.ERROR_ADDED_TO_STATUS)
+    def log_error(self, message, *args):
+        """log errors - message may be a format template for args, or a callable returning the message"""
+        message = self.__remove_substring_from_message(self.__get_message(message, args), Constants.ERROR_ADDED_TO_STATUS)
         message = self.ERROR + (self.NEWLINE_REPLACE_CHAR.join(message.split(os.linesep))).strip()
         self.log(message, message_type=Constants.TelemetryEventLevel.Error)
 
-    def log_warning(self, message):
-        """log warning"""
-        message = self.__remove_substring_from_message(message, Constants.ERROR_ADDED_TO_STATUS)
+    def log_warning(self, message, *args):
+        """log warning - message may be a format template for args, or a callable returning the message"""
+        message = self.__remove_substring_from_message(self.__get_message(message, args), Constants.ERROR_ADDED_TO_STATUS)
         message = self.WARNING + (self.NEWLINE_REPLACE_CHAR.join(message.split(os.linesep))).strip()
         self.log(message, message_type=Constants.TelemetryEventLevel.Warning)
 
-    def log_debug(self, message):
-        """log debug"""
-        message = self.__remove_substring_from_message(message, Constants.ERROR_ADDED_TO_STATUS)
+    def log_debug(self, message, *args):
+        """log debug - message may be a format template for args, or a callable returning the message. Neither is evaluated if no sink accepts debug output."""
+        is_telemetry_sink_enabled = Constants.TELEMETRY_DEBUG_ENABLED and self.__is_telemetry_sink_enabled(Constants.DEV, Constants.TEST)
+        is_file_sink_enabled = Constants.LOG_FILE_DEBUG_ENABLED and self.file_logger is not None
+        if not (is_telemetry_sink_enabled or self.current_env in (Constants.DEV, Constants.TEST) or is_file_sink_enabled):
+            return
+        message = self.__remove_substring_from_message(self.__get_message(message, args), Constants.ERROR_ADDED_TO_STATUS)
         message = message.strip()
-        if self.telemetry_writer is not None and self.telemetry_writer.events_folder_path is not None and self.current_env not in (Constants.DEV, Constants.TEST):
+        if is_telemetry_sink_enabled:
             self.telemetry_writer.write_event(message, Constants.TelemetryEventLevel.Verbose)
         if self.current_env in (Constants.DEV, Constants.TEST):
             self.log(self.current_env + ": " + str(self.env_layer.datetime.datetime_utcnow()) + ": " + message, Constants.TelemetryEventLevel.Verbose)  # send to standard output if dev or test env
-        elif self.file_logger is not None:
+        elif is_file_sink_enabled:
             self.file_logger.write("\n\t" + self.DEBUG + " " + "\n\t".join(message.splitlines()).strip())
 
-    def log_verbose(self, message):
-        """log verbose"""
-        message = self.__remove_substring_from_message(message, Constants.ERROR_ADDED_TO_STATUS)
+    def log_verbose(self, message, *args):
+        """log verbose - message may be a format template for args, or a callable returning the message. Neither is evaluated if the file logger doesn't take verbose output."""
         # Only log verbose events to file, not to telemetry
-        if self.file_logger is not None:
-            self.file_logger.write("\n\t" + self.VERBOSE + " " + "\n\t".join(message.strip().splitlines()).strip())
+        if self.file_logger is None or not Constants.LOG_FILE_DEBUG_ENABLED:
+            return
+        message = self.__remove_substring_from_message(self.__get_message(message, args), Constants.ERROR_ADDED_TO_STATUS)
+        self.file_logger.write("\n\t" + self.VERBOSE + " " + "\n\t".join(message.strip().splitlines()).strip())
 
     def log_telemetry_module_error(self, message):
         """Used exclusively by telemetry writer to log any errors raised within it's operation"""
@@ -96,6 +103,17 @@ class CompositeLogger(object):
         else:
             print(self.TELEMETRY_LOG + " " + message)
 
+    def __is_telemetry_sink_enabled(self, *excluded_envs):
+        """Checks if telemetry will accept log output in the current environment"""
+        return self.telemetry_writer is not None and self.telemetry_writer.events_folder_path is not None and self.current_env not in excluded_envs
+
+    @staticmethod
+    def __get_message(message, args=()):
+        """Evaluates a deferred message: a callable is invoked, and a format template is formatted with its args"""
+        if callable(message):
+            return message()
+        return message.format(*args) if len(args) > 0 else message
+
     @staticmethod
     def __remove_substring_from_message(message, substring=Constants.ERROR_ADDED_TO_STATUS):
         """Remove substring from a string"""
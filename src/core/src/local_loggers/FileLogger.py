@@ -13,18 +13,34 @@
 # limitations under the License.
 #
 # Requires Python 2.7+
+import collections
 import os
 import sys
+import threading
+import time
+from core.src.bootstrap.Constants import Constants
 
 
 class FileLogger(object):
     """Facilitates writing selected logs to a file"""
 
-    def __init__(self, env_layer, log_file):
+    def __init__(self, env_layer, log_file, buffered=False):
         self.env_layer = env_layer
         self.log_file = log_file
         self.log_failure_log_file = log_file + ".failure"
         self.log_file_handle = None
+
+        # buffered mode - writes are queued in memory and written to the log file by a background thread, without fsync-ing outside of durability points
+        self.buffered = buffered
+        self.__buffer_condition = threading.Condition()   # guards the buffer and writer thread state below
+        self.__buffer = collections.deque()
+        self.__buffer_size = 0
+        self.__buffer_oldest_write_time = None
+        self.__is_writer_stop_requested = False
+        self.__writer_thread = None
+        self.__file_write_lock = threading.RLock()  # serializes buffer drains, so buffered output reaches the file in order
+        self.__is_draining = False
+
         try:
             self.log_file_handle = self.env_layer.file_system.open(self.log_file, "a+")
         except Exception as error:
@@ -37,6 +53,10 @@ class FileLogger(object):
         self.close()
 
     def write(self, message, fail_silently=True):
+        if self.buffered and self.log_file_handle is not None:
+            self.__buffer_write(message)
+            return
+
         try:
             if self.log_file_handle is not None:
                 self.log_file_handle.write(message)
@@ -49,21 +69,109 @@ class FileLogger(object):
 
     def write_irrecoverable_exception(self, message):
         """ A best-effort attempt to write out errors where writing to the primary log file was interrupted"""
+        if not self.__is_draining:
+            try:
+                self.flush(durable=True)    # durability point - persist everything logged before the failure
+            except Exception:
+                pass
+
         try:
             with self.env_layer.file_system.open(self.log_failure_log_file, 'a+') as fail_log:
                 timestamp = self.env_layer.datetime.timestamp()
                 fail_log.write("\n" + timestamp + "> " + message)
+                fail_log.flush()
+                os.fsync(fail_log.fileno())
         except Exception:
             pass
 
-    def flush(self):
-        if self.log_file_handle is not None:
-            self.log_file_handle.flush()
-            os.fsync(self.log_file_handle.fileno())
+    def flush(self, durable=False):
+        """ Writes out any buffered output. Only fsync-s if durable, which is reserved for durability points (reboot, exit, irrecoverable exceptions). """
+        self.__drain_buffer(durable)
 
     def close(self, message_at_close='<Log file was closed.>'):
         if self.log_file_handle is not None:
             if message_at_close is not None:
                 self.write(str(message_at_close))
-            self.log_file_handle.close()
-            self.log_file_handle = None     # Not having this can cause 'I/O exception on closed file' exceptions
+            with self.__buffer_condition:
+                self.__is_writer_stop_requested = True
+                self.__buffer_condition.notify_all()
+            try:
+                self.__drain_buffer(durable=True)   # exit is a durability point
+            except Exception:
+                pass
+            with self.__file_write_lock:
+                if self.log_file_handle is not None:
+                    self.log_file_handle.close()
+                    self.log_file_handle = None     # Not having this can cause 'I/O exception on closed file' exceptions
+
+    # region - Buffered writes
+    def __buffer_write(self, message):
+        """ Queues a write for the background writer. If the buffer is at capacity, the calling thread writes the buffer out itself, so nothing is dropped. """
+        with self.__buffer_condition:
+            if self.__buffer_oldest_write_time is None:
+                self.__buffer_oldest_write_time = time.time()
+            self.__buffer.append(message)
+            self.__buffer_size += len(message)
+            is_buffer_at_capacity = self.__buffer_size >= Constants.FILE_LOGGER_BUFFER_CAPACITY_IN_CHARS
+            if not is_buffer_at_capacity:
+                self.__start_writer_if_required()
+                if self.__buffer_size >= Constants.FILE_LOGGER_BUFFER_MAX_SIZE_IN_CHARS:
+                    self.__buffer_condition.notify_all()
+
+        if is_buffer_at_capacity:
+            self.__drain_buffer(durable=False)
+
+    def __drain_buffer(self, durable):
+        """ Writes all buffered output to the log file, in order """
+        with self.__file_write_lock:
+            with self.__buffer_condition:
+                content = "".join(self.__buffer)
+                self.__buffer.clear()
+                self.__buffer_size = 0
+                self.__buffer_oldest_write_time = None
+
+            if self.log_file_handle is None:
+                return
+
+            self.__is_draining = True
+            try:
+                if len(content) > 0:
+                    self.log_file_handle.write(content)
+                self.log_file_handle.flush()
+                if durable:
+                    os.fsync(self.log_file_handle.fileno())
+            except Exception as error:
+                self.write_irrecoverable_exception("Fatal exception trying to write buffered output to log file: " + repr(error) + ". Attempted output: " + content)
+                raise
+            finally:
+                self.__is_draining = False
+
+    def __is_drain_due(self):
+        return self.__buffer_size >= Constants.FILE_LOGGER_BUFFER_MAX_SIZE_IN_CHARS \
+            or (self.__buffer_oldest_write_time is not None and time.time() - self.__buffer_oldest_write_time >= Constants.FILE_LOGGER_BUFFER_MAX_AGE_IN_SECS)
+
+    def __start_writer_if_required(self):
+        """ Starts the background writer thread, if it isn't running. Must be called with the buffer condition held. """
+        if self.__writer_thread is not None or self.__is_writer_stop_requested:
+            return
+        self.__writer_thread = threading.Thread(target=self.__run_writer, name="FileLoggerWriter")
+        self.__writer_thread.daemon = True
+        self.__writer_thread.start()
+
+    def __run_writer(self):
+        """ Background writer - writes the buffer out once it's large enough or old enough. Falls back to synchronous writes if the log file can't be written to. """
+        while True:
+            with self.__buffer_condition:
+                while not self.__is_writer_stop_requested and not self.__is_drain_due():
+                    self.__buffer_condition.wait(Constants.FILE_LOGGER_BUFFER_MAX_AGE_IN_SECS)
+                if self.__is_writer_stop_requested:
+                    return
+
+            try:
+                self.__drain_buffer(durable=False)
+            except Exception:
+                with self.__buffer_condition:
+                    self.buffered = False   # subsequent writes surface errors to their callers, as in unbuffered mode
+                    self.__writer_thread = None
+                return
+    # endregion
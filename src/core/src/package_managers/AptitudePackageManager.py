@@ -20,6 +20,7 @@ import os
 import re
 import uuid
 
+from core.src.package_managers.PackageJournalReader import PackageJournalEntry
 from core.src.package_managers.PackageManager import PackageManager
 from core.src.bootstrap.Constants import Constants
 
@@ -34,6 +35,8 @@ class AptitudePackageManager(PackageManager):
         security_list_guid = str(uuid.uuid4())
         # Repo refresh
         self.repo_refresh = 'sudo apt-get -q update'
+        self.repo_source_paths = ['/etc/apt/sources.list', '/etc/apt/sources.list.d', '/var/lib/apt/lists']
+        self.package_journal_paths = ['/var/log/dpkg.log']
 
         # Support to get updates and their dependencies
         self.security_sources_list = os.path.join(execution_config.temp_folder, 'msft-patch-security-{0}.list'.format(security_list_guid))
@@ -45,9 +48,16 @@ class AptitudePackageManager(PackageManager):
         self.single_package_upgrade_simulation_cmd = '''DEBIAN_FRONTEND=noninteractive apt-get -y --only-upgrade true -s install '''
         self.single_package_dependency_resolution_template = 'DEBIAN_FRONTEND=noninteractive LANG=en_US.UTF8 apt-get -y --only-upgrade true -s install <PACKAGE-NAME> '
 
+        # Installed package index - name-indexed snapshot of the dpkg status file, reloaded only when the file changes
+        self.dpkg_status_file_path = '/var/lib/dpkg/status'
+        self.dpkg_status_index = None
+        self.dpkg_status_index_fingerprint = None
+        self.package_state_paths = [self.dpkg_status_file_path, '/etc/apt/sources.list', '/etc/apt/sources.list.d', '/var/lib/apt/lists']
+
         # Install update
         # --only-upgrade: upgrade only single package (only if it is installed)
         self.single_package_upgrade_cmd = '''sudo DEBIAN_FRONTEND=noninteractive apt-get -y --only-upgrade true install '''
+        self.single_package_download_cmd = '''sudo DEBIAN_FRONTEND=noninteractive apt-get -y --only-upgrade true --download-only install '''
 
         # Package manager exit code(s)
         self.apt_exitcode_ok = 0
@@ -65,22 +75,30 @@ class AptitudePackageManager(PackageManager):
         self.STR_DPKG_WAS_INTERRUPTED = "E: dpkg was interrupted, you must manually run 'sudo dpkg --configure -a' to correct the problem."
         self.ESM_MARKER = "The following packages could receive security updates with UA Infra: ESM service enabled:"
 
-    def refresh_repo(self):
+    def refresh_repo(self, force=False):
+        if not force and self.is_repo_refresh_recent():
+            self.composite_logger.log("\nLocal repo was refreshed recently, skipping refresh.")
+            return
         self.composite_logger.log("\nRefreshing local repo...")
+        self.start_new_refresh_generation()
         self.invoke_package_manager(self.repo_refresh)
+        self.record_repo_refresh()
 
     # region Get Available Updates
-    def invoke_package_manager_advanced(self, command, raise_on_exception=True):
-        """Get missing updates using the command input"""
+    def invoke_package_manager_advanced(self, command, raise_on_exception=True, line_handlers=None):
+        """Get missing updates using the command input. With line handlers, the output is parsed by them as the command runs, and only an excerpt of it is returned."""
         self.composite_logger.log_debug('\nInvoking package manager using: ' + command)
-        code, out = self.env_layer.run_command_output(command, False, False)
+        if line_handlers is None:
+            code, out = self.run_command_output(command, False, False)
+        else:
+            code, out = self.run_command_output_streaming(command, line_handlers)
 
         if code != self.apt_exitcode_ok and self.STR_DPKG_WAS_INTERRUPTED in out:
             self.composite_logger.log_error('[ERROR] YOU NEED TO TAKE ACTION TO PROCEED. The package manager on this machine is not in a healthy state, and '
                                             'Patch Management cannot proceed successfully. Before the next Patch Operation, please run the following '
                                             'command and perform any configuration steps necessary on the machine to return it to a healthy state: '
                                             'sudo dpkg --configure -a')
-            self.telemetry_writer.write_execution_error(command, code, out)
+            self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
             error_msg = 'Package manager on machine is not healthy. To fix, please run: sudo dpkg --configure -a'
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             if raise_on_exception:
@@ -88,8 +106,8 @@ class AptitudePackageManager(PackageManager):
         elif code != self.apt_exitcode_ok:
             self.composite_logger.log('[ERROR] Package manager was invoked using: ' + command)
             self.composite_logger.log_warning(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
-            self.telemetry_writer.write_execution_error(command, code, out)
+            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
+            self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
             error_msg = 'Unexpected return code (' + str(code) + ') from package manager on command: ' + command
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             if raise_on_exception:
@@ -98,18 +116,20 @@ class AptitudePackageManager(PackageManager):
         else:  # verbose diagnostic log
             self.composite_logger.log_verbose("\n\n==[SUCCESS]===============================================================")
             self.composite_logger.log_debug(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_debug(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_debug(lambda: " - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
             self.composite_logger.log_verbose("==========================================================================\n\n")
         return out, code
 
-    def invoke_apt_cache(self, command):
+    def invoke_apt_cache(self, command, memoized=False):
         """Invoke apt-cache using the command input"""
+        if memoized:
+            return self.package_query_cache.get_or_run(command, lambda: self.invoke_apt_cache(command))
         self.composite_logger.log_debug('Invoking apt-cache using: ' + command)
-        code, out = self.env_layer.run_command_output(command, False, False)
+        code, out = self.run_command_output(command, False, False)
         if code != 0:
             self.composite_logger.log('[ERROR] apt-cache was invoked using: ' + command)
             self.composite_logger.log_warning(" - Return code from apt-cache: " + str(code))
-            self.composite_logger.log_warning(" - Output from apt-cache: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_warning(" - Output from apt-cache: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
             error_msg = 'Unexpected return code (' + str(code) + ') from apt-cache on command: ' + command
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
@@ -117,7 +137,7 @@ class AptitudePackageManager(PackageManager):
         else:  # verbose diagnostic log
             self.composite_logger.log_verbose("\n\n==[SUCCESS]===============================================================")
             self.composite_logger.log_debug(" - Return code from apt-cache: " + str(code))
-            self.composite_logger.log_debug(" - Output from apt-cache: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_debug(lambda: " - Output from apt-cache: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
             self.composite_logger.log_verbose("==========================================================================\n\n")
         return out
 
@@ -130,8 +150,9 @@ class AptitudePackageManager(PackageManager):
             return self.all_updates_cached, self.all_update_versions_cached  # allows for high performance reuse in areas of the code explicitly aware of the cache
 
         cmd = self.dist_upgrade_simulation_cmd_template.replace('<SOURCES>', '')
-        out = self.invoke_package_manager(cmd)
-        self.all_updates_cached, self.all_update_versions_cached = self.extract_packages_and_versions(out)
+        parser = self.UpgradeSimulationParser(self.ESM_MARKER)
+        self.invoke_package_manager_advanced(cmd, line_handlers=[parser.parse_line])
+        self.all_updates_cached, self.all_update_versions_cached = self.get_extracted_packages_and_versions(parser)
 
         self.composite_logger.log_debug("Discovered " + str(len(self.all_updates_cached)) + " package entries.")
         return self.all_updates_cached, self.all_update_versions_cached
@@ -139,16 +160,17 @@ class AptitudePackageManager(PackageManager):
     def get_security_updates(self):
         """Get missing security updates"""
         self.composite_logger.log("\nDiscovering 'security' packages...")
-        code, out = self.env_layer.run_command_output(self.prep_security_sources_list_cmd, False, False)
+        code, out = self.run_command_output(self.prep_security_sources_list_cmd, False, False)
         if code != 0:
-            self.composite_logger.log_warning(" - SLP:: Return code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_warning(" - SLP:: Return code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
             error_msg = 'Unexpected return code (' + str(code) + ') from command: ' + self.prep_security_sources_list_cmd
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
 
         cmd = self.dist_upgrade_simulation_cmd_template.replace('<SOURCES>', '-oDir::Etc::Sourcelist=' + self.security_sources_list)
-        out = self.invoke_package_manager(cmd)
-        security_packages, security_package_versions = self.extract_packages_and_versions(out)
+        parser = self.UpgradeSimulationParser(self.ESM_MARKER)
+        self.invoke_package_manager_advanced(cmd, line_handlers=[parser.parse_line])
+        security_packages, security_package_versions = self.get_extracted_packages_and_versions(parser)
 
         self.composite_logger.log("Discovered " + str(len(security_packages)) + " 'security' package entries.")
         return security_packages, security_package_versions
@@ -156,16 +178,7 @@ class AptitudePackageManager(PackageManager):
     def get_other_updates(self):
         """Get missing other updates"""
         self.composite_logger.log("\nDiscovering 'other' packages...")
-        other_packages = []
-        other_package_versions = []
-
-        all_packages, all_package_versions = self.get_all_updates(True)
-        security_packages, security_package_versions = self.get_security_updates()
-
-        for index, package in enumerate(all_packages):
-            if package not in security_packages:
-                other_packages.append(package)
-                other_package_versions.append(all_package_versions[index])
+        other_packages, other_package_versions = self.get_classified_updates(Constants.PackageClassification.OTHER)
 
         self.composite_logger.log("Discovered " + str(len(other_packages)) + " 'other' package entries.")
         return other_packages, other_package_versions
@@ -177,42 +190,52 @@ class AptitudePackageManager(PackageManager):
         # Inst coreutils [8.25-2ubuntu2] (8.25-2ubuntu3~16.10 Ubuntu:16.10/yakkety-updates [amd64])
         # Inst python3-update-manager [1:16.10.7] (1:16.10.8 Ubuntu:16.10/yakkety-updates [all]) [update-manager-core:amd64 ]
         # Inst update-manager-core [1:16.10.7] (1:16.10.8 Ubuntu:16.10/yakkety-updates [all])
+        parser = self.UpgradeSimulationParser(self.ESM_MARKER)
+        for line in str(output).split('\n'):
+            parser.parse_line(line)
+        return self.get_extracted_packages_and_versions(parser)
 
+    def get_extracted_packages_and_versions(self, parser):
+        """ Returns the packages and versions extracted by an upgrade simulation parser that has been fed all output lines """
         self.composite_logger.log_debug("\nExtracting package and version data...")
-        packages = []
-        versions = []
-
-        search_text = r'Inst[ ](.*?)[ ].*?[(](.*?)[ ](.*?)[ ]\[(.*?)\]'
-        search = re.compile(search_text, re.M | re.S)
-        package_list = search.findall(str(output))
-
-        for package in package_list:
-            packages.append(package[0])
-            versions.append(package[1])
-
-        self.composite_logger.log_debug(" - Extracted package and version data for " + str(len(packages)) + " packages [BASIC].")
-
-        # Discovering ESM packages - Distro versions with extended security maintenance
-        lines = output.strip().split('\n')
-        esm_marker_found = False
-        esm_packages = []
-        for line_index in range(0, len(lines)-1):
-            line = lines[line_index].strip()
-
-            if not esm_marker_found:
-                if self.ESM_MARKER in line:
-                   esm_marker_found = True
-                continue
-
-            esm_packages = line.split()
-            break
-
-        for package in esm_packages:
-            packages.append(package)
-            versions.append(Constants.UA_ESM_REQUIRED)
+        packages, versions = parser.get_packages_and_versions()
+        self.composite_logger.log_debug(" - Extracted package and version data for " + str(len(packages) - len(parser.get_esm_packages())) + " packages [BASIC].")
         self.composite_logger.log_debug(" - Extracted package and version data for " + str(len(packages)) + " packages [TOTAL].")
-
         return packages, versions
+
+    class UpgradeSimulationParser(object):
+        """ Incremental parser for upgrade simulation output, fed one line at a time (as the command runs, if streamed) """
+
+        def __init__(self, esm_marker):
+            self.__search = re.compile(r'Inst[ ](.*?)[ ].*?[(](.*?)[ ](.*?)[ ]\[(.*?)\]')
+            self.__packages = []
+            self.__versions = []
+
+            # Discovering ESM packages - Distro versions with extended security maintenance
+            self.__esm_marker = esm_marker
+            self.__esm_marker_found = False
+            self.__esm_line = None                  # the line after the marker lists ESM packages...
+            self.__is_esm_line_followed = False     # ...as long as it's not the last line of the output
+
+        def parse_line(self, line):
+            for package in self.__search.findall(line):
+                self.__packages.append(package[0])
+                self.__versions.append(package[1])
+
+            line = line.strip()
+            if not self.__esm_marker_found:
+                self.__esm_marker_found = self.__esm_marker in line
+            elif self.__esm_line is None:
+                self.__esm_line = line
+            elif line != "":
+                self.__is_esm_line_followed = True
+
+        def get_esm_packages(self):
+            return self.__esm_line.split() if self.__esm_line is not None and self.__is_esm_line_followed else []
+
+        def get_packages_and_versions(self):
+            esm_packages = self.get_esm_packages()
+            return self.__packages + esm_packages, self.__versions + [Constants.UA_ESM_REQUIRED] * len(esm_packages)
     # endregion
     # endregion
 
@@ -235,7 +258,7 @@ class AptitudePackageManager(PackageManager):
         package_versions = []
 
         cmd = self.single_package_check_versions.replace('<PACKAGE-NAME>', package_name)
-        output = self.invoke_apt_cache(cmd)
+        output = self.invoke_apt_cache(cmd, memoized=True)
         lines = output.strip().split('\n')
 
         for line in lines:
@@ -244,19 +267,42 @@ class AptitudePackageManager(PackageManager):
                 self.composite_logger.log_debug(" - Applicable line: " + str(line))
                 package_versions.append(package_details[1].strip())
             else:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
 
         return package_versions
 
+    def get_all_available_versions_of_package_batch(self, package_names):
+        """ Returns a dictionary of package name -> all available versions for a batch of packages, using a single invocation """
+        versions_by_package = {}
+        cmd = self.single_package_check_versions.replace('<PACKAGE-NAME>', ' '.join(package_names))
+        output = self.invoke_apt_cache(cmd, memoized=True)
+
+        for line in output.strip().split('\n'):
+            package_details = line.split(' |')
+            if len(package_details) == 3:
+                self.composite_logger.log_debug(" - Applicable line: " + str(line))
+                versions_by_package.setdefault(package_details[0].strip(), []).append(package_details[1].strip())
+            else:
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
+
+        return versions_by_package
+
     def is_package_version_installed(self, package_name, package_version):
         """ Returns true if the specific package version is installed """
 
         self.composite_logger.log_debug("\nCHECKING PACKAGE INSTALL STATUS FOR: " + str(package_name) + " (" + str(package_version) + ")")
 
+        # INDEXED METHOD - no process invocation; the methods below are fallbacks for when the index is unavailable
+        installed_versions = self.get_installed_versions_from_dpkg_status_index(package_name)
+        if installed_versions is not None:
+            is_installed = package_version in installed_versions
+            self.composite_logger.log_debug(" - Install status verified with the dpkg status index. [Installed={0}][InstalledVersions={1}]".format(str(is_installed), str(installed_versions)))
+            return is_installed
+
         # DEFAULT METHOD
         self.composite_logger.log_debug(" - [1/2] Verifying install status with Dpkg.")
         cmd = self.single_package_find_installed_dpkg.replace('<PACKAGE-NAME>', package_name)
-        code, output = self.env_layer.run_command_output(cmd, False, False)
+        code, output = self.run_query_command_output(cmd)
         lines = output.strip().split('\n')
 
         if code == 1:  # usually not found
@@ -271,7 +317,7 @@ class AptitudePackageManager(PackageManager):
                     self.composite_logger.log_debug("    - Discovered to be not installed: " + str(line))
                     return False
                 else:
-                    self.composite_logger.log_debug("    - Inapplicable line: " + str(line))
+                    self.composite_logger.log_debug("    - Inapplicable line: {0}", line)
 
             self.telemetry_writer.write_event("[Installed check] Return code: 1. Unable to verify package not present on the system: " + str(output), Constants.TelemetryEventLevel.Verbose)
         elif code == 0:  # likely found
@@ -314,7 +360,7 @@ class AptitudePackageManager(PackageManager):
                 if composite_found_flag & 7 == 7:  # whenever this becomes true, the exact package version is installed
                     self.composite_logger.log_debug("    - Package, Version and Status matched. Package is detected as 'Installed'.")
                     return True
-                self.composite_logger.log_debug("    - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug("    - Inapplicable line: {0}", line)
             self.composite_logger.log_debug("    - Install status check did NOT find the package installed: (composite_found_flag=" + str(composite_found_flag) + ")")
             self.telemetry_writer.write_event("Install status check did NOT find the package installed: (composite_found_flag=" + str(composite_found_flag) + ")(output=" + output + ")", Constants.TelemetryEventLevel.Verbose)
         else:  # This is not expected to execute. If it does, the details will show up in telemetry. Improve this code with that information.
@@ -327,13 +373,13 @@ class AptitudePackageManager(PackageManager):
         # apt/xenial-updates,now 1.2.29 amd64 [installed]
         self.composite_logger.log_debug(" - [2/2] Verifying install status with Apt.")
         cmd = self.single_package_find_installed_apt.replace('<PACKAGE-NAME>', package_name)
-        output = self.invoke_package_manager(cmd)
+        output = self.invoke_package_manager(cmd, memoized=True)
         lines = output.strip().split('\n')
 
         for line in lines:
             package_details = line.split(' ')
             if len(package_details) < 4:
-                self.composite_logger.log_debug("    - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug("    - Inapplicable line: {0}", line)
             else:
                 self.composite_logger.log_debug("    - Applicable line: " + str(line))
                 discovered_package_name = package_details[0].split('/')[0]  # index out of bounds check is deliberately not being done
@@ -353,12 +399,63 @@ class AptitudePackageManager(PackageManager):
         self.composite_logger.log_debug("   - Package version specified was determined to NOT be installed.")
         return False
 
+    # region dpkg status index
+    def get_installed_versions_from_dpkg_status_index(self, package_name):
+        """ Returns the installed versions of a package as per the dpkg status index, or None if the index is unavailable """
+        if not self.refresh_dpkg_status_index_if_changed():
+            return None
+        return self.dpkg_status_index.get(package_name, [])
+
+    def refresh_dpkg_status_index_if_changed(self):
+        """ (Re)loads the dpkg status index only if the status file changed (mtime/size) since it was last loaded. Returns False if the index is unavailable. """
+        try:
+            file_stat = os.stat(self.dpkg_status_file_path)
+            fingerprint = (file_stat.st_mtime, file_stat.st_size)
+            if self.dpkg_status_index is not None and fingerprint == self.dpkg_status_index_fingerprint:
+                return True
+
+            self.composite_logger.log_debug(" - Loading dpkg status index. [Path={0}][Size={1}]".format(self.dpkg_status_file_path, str(file_stat.st_size)))
+            self.dpkg_status_index = self.parse_dpkg_status(self.env_layer.file_system.read_with_retry(self.dpkg_status_file_path))
+            self.dpkg_status_index_fingerprint = fingerprint
+            return True
+        except Exception as error:
+            self.composite_logger.log_debug(" - dpkg status index is unavailable. [Path={0}][Error={1}]".format(self.dpkg_status_file_path, repr(error)))
+            self.dpkg_status_index = None
+            self.dpkg_status_index_fingerprint = None
+            return False
+
+    @staticmethod
+    def parse_dpkg_status(content):
+        """ Parses dpkg status file content into a dictionary of package name (and name:arch) -> installed versions """
+        # Sample stanza (stanzas are separated by blank lines, continuation lines start with whitespace) --
+        # Package: mysql-server
+        # Status: install ok installed
+        # Architecture: all
+        # Version: 5.7.25-0ubuntu0.16.04.2
+        #  ------------------------------------------------------------------------------------------------
+        index = {}
+        for stanza in content.split('\n\n'):
+            fields = {}
+            for line in stanza.splitlines():
+                if line[:1] in (' ', '\t') or ':' not in line:
+                    continue
+                key, value = line.split(':', 1)
+                fields[key] = value.strip()
+
+            if 'Package' not in fields or 'Version' not in fields or fields.get('Status', '').split(' ')[-1] != 'installed':
+                continue
+            index.setdefault(fields['Package'], []).append(fields['Version'])
+            if 'Architecture' in fields:
+                index.setdefault(fields['Package'] + ':' + fields['Architecture'], []).append(fields['Version'])
+        return index
+    # endregion
+
     def get_dependent_list(self, package_name):
         """Returns dependent List of the package"""
         cmd = self.single_package_dependency_resolution_template.replace('<PACKAGE-NAME>', package_name)
 
         self.composite_logger.log_debug("\nRESOLVING DEPENDENCIES USING COMMAND: " + str(cmd))
-        output = self.invoke_package_manager(cmd)
+        output = self.invoke_package_manager(cmd, memoized=True)
 
         packages, package_versions = self.extract_packages_and_versions(output)
         if package_name in packages:
@@ -367,6 +464,18 @@ class AptitudePackageManager(PackageManager):
         self.composite_logger.log_debug(str(len(packages)) + " dependent updates were found for package '" + package_name + "'.")
         return packages
 
+    def parse_package_journal_line(self, line):
+        """Returns the PackageJournalEntry in a dpkg.log line. Only final package states are used, as they're only logged once dpkg is done with a package."""
+        # Sample lines from dpkg.log (for an upgrade, and a removal):
+        # 2023-06-20 10:15:52 status installed bash:amd64 5.0-6ubuntu1.2
+        # 2023-06-20 10:16:03 status not-installed libfoo1:amd64 <none>
+        parts = line.split()
+        if len(parts) != 6 or parts[2] != 'status' or parts[3] not in ('installed', 'not-installed'):
+            return None
+
+        action = Constants.PackageJournalActions.INSTALLED if parts[3] == 'installed' else Constants.PackageJournalActions.REMOVED
+        return PackageJournalEntry(action, parts[4].split(':')[0], parts[5] if parts[5] != '<none>' else None)
+
     def get_product_name(self, package_name):
         """Retrieve product name """
         return package_name
@@ -396,6 +505,13 @@ class AptitudePackageManager(PackageManager):
         except Exception as error:
             self.composite_logger.log_debug(" - Could not get package size from output: " + repr(error))
             return Constants.UNKNOWN_PACKAGE_SIZE
+
+    def get_package_size_in_batch(self, output, package_name):
+        """Retrieve the size of one of the packages from batch installation output string"""
+        # Sample line from output:
+        # Get:1 http://azure.archive.ubuntu.com/ubuntu bionic-updates/main amd64 git-man all 1:2.17.1-1ubuntu0.16 [804 kB]
+        search = re.search(r'^Get:[0-9]+ .* ' + re.escape(package_name) + r' \S+ \S+ \[(.+?)\]', str(output), re.M)
+        return search.group(1) if search is not None else Constants.UNKNOWN_PACKAGE_SIZE
     # endregion
 
     # region auto OS updates
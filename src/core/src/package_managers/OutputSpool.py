@@ -0,0 +1,96 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Spooling of large command outputs to the temp folder"""
+import glob
+import os
+import time
+from core.src.bootstrap.Constants import Constants
+
+
+class SpooledOutput(object):
+    """Reference to a command output: a bounded head/tail excerpt, and the spool file holding all of it if it was too large to log and report as is"""
+    __slots__ = ('excerpt', 'spool_file_path', 'length')
+
+    def __init__(self, excerpt, spool_file_path, length):
+        self.excerpt = excerpt
+        self.spool_file_path = spool_file_path
+        self.length = length
+
+    def is_spooled(self):
+        return self.spool_file_path is not None
+
+    def __str__(self):
+        return self.excerpt
+
+
+class OutputSpool(object):
+    """Writes command outputs over the spool threshold to files in the temp folder, keeping only the most recent spool files"""
+
+    def __init__(self, env_layer, composite_logger, spool_folder):
+        self.env_layer = env_layer
+        self.composite_logger = composite_logger
+        self.spool_folder = spool_folder
+        self.__spool_file_count = 0
+        self.__last_output = None
+        self.__last_spooled_output = None
+
+    def spool(self, output, command=None):
+        """ Returns a SpooledOutput for the output. The same output object is only spooled once, however many times it's logged or reported. """
+        output = "" if output is None else output
+        if output is self.__last_output:
+            return self.__last_spooled_output
+
+        if len(output) <= Constants.OUTPUT_SPOOL_THRESHOLD_IN_CHARS:
+            spooled_output = SpooledOutput(output, None, len(output))
+        else:
+            spool_file_path = self.__write_spool_file(output, command)
+            head = output[:Constants.OUTPUT_SPOOL_EXCERPT_HEAD_IN_CHARS]
+            tail = output[-Constants.OUTPUT_SPOOL_EXCERPT_TAIL_IN_CHARS:]
+            omitted_length = len(output) - len(head) - len(tail)
+            location = "spooled to {0}".format(spool_file_path) if spool_file_path is not None else "not spooled"
+            excerpt = "{0}\n...[Omitted={1} chars][Total={2} chars][Output {3}]...\n{4}".format(head, str(omitted_length), str(len(output)), location, tail)
+            spooled_output = SpooledOutput(excerpt, spool_file_path, len(output))
+
+        self.__last_output = output
+        self.__last_spooled_output = spooled_output
+        return spooled_output
+
+    def __write_spool_file(self, output, command):
+        """ Best-effort write of the full output to a new spool file. Returns its path, or None if it couldn't be written. """
+        if self.spool_folder is None:
+            return None
+
+        try:
+            self.__spool_file_count += 1
+            spool_file_name = "{0}-{1:06d}.{2}".format(str(int(time.time() * 1000)), self.__spool_file_count, Constants.OUTPUT_SPOOL_FILE_EXTENSION)
+            spool_file_path = os.path.join(self.spool_folder, spool_file_name)
+            content = output if command is None else "Command: {0}\n\n{1}".format(str(command), output)
+            self.env_layer.file_system.write_with_retry_using_temp_file(spool_file_path, content, mode='w')
+            self.__remove_old_spool_files()
+            return spool_file_path
+        except Exception as error:
+            self.composite_logger.log_debug("Unable to spool command output. [Folder={0}][Error={1}]", str(self.spool_folder), repr(error))
+            return None
+
+    def __remove_old_spool_files(self):
+        """ Removes the oldest spool files beyond the maximum spool file count """
+        spool_file_paths = sorted(glob.glob(os.path.join(self.spool_folder, "*." + Constants.OUTPUT_SPOOL_FILE_EXTENSION)))
+        for spool_file_path in spool_file_paths[:-Constants.OUTPUT_SPOOL_MAX_FILE_COUNT]:
+            try:
+                os.remove(spool_file_path)
+            except Exception:
+                pass
@@ -0,0 +1,137 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Incremental reading of the package manager's transaction journal"""
+import json
+import os
+from core.src.bootstrap.Constants import Constants
+
+
+class PackageJournalEntry(object):
+    """A package installed, upgraded or removed by a package manager transaction"""
+    __slots__ = ('action', 'name', 'version')
+
+    def __init__(self, action, name, version):
+        self.action = action
+        self.name = name
+        self.version = version
+
+    def is_version(self, version):
+        """ Returns true if the entry is for the version, with or without its epoch """
+        if self.version is None or version is None:
+            return False
+        return self.version == version or self.version.split(':', 1)[-1] == str(version).split(':', 1)[-1]
+
+    def __repr__(self):
+        return "{0}: {1}({2})".format(self.action, self.name, str(self.version))
+
+
+class PackageJournalReader(object):
+    """Reads the entries appended to the journal since it was last read. The byte offset reached is persisted for the operation, so a resumed operation
+       (e.g. after a reboot) continues from there - any other operation starts at the end of the journal, as only its own transactions are of interest."""
+
+    def __init__(self, env_layer, composite_logger, journal_path, line_parser, offset_file_path, activity_id):
+        self.env_layer = env_layer
+        self.composite_logger = composite_logger
+        self.journal_path = journal_path
+        self.line_parser = line_parser      # journal line -> PackageJournalEntry, or None for lines without one
+        self.offset_file_path = offset_file_path
+        self.activity_id = str(activity_id)
+        self.inode = None
+        self.offset = None
+
+    def start(self):
+        """ Positions the reader for the operation. Returns False if the journal is unavailable. """
+        journal_stat = self.__get_stat(self.journal_path)
+        if journal_stat is None:
+            return False
+
+        offset_record = self.__read_offset_record()
+        if offset_record is not None and offset_record['activityId'] == self.activity_id and offset_record['path'] == self.journal_path:
+            self.inode, self.offset = offset_record['inode'], offset_record['offset']
+            self.composite_logger.log_debug("Resuming package journal reads. [Path={0}][Offset={1}]", self.journal_path, str(self.offset))
+        else:
+            self.inode, self.offset = journal_stat.st_ino, journal_stat.st_size
+            self.__write_offset_record()
+            self.composite_logger.log_debug("Starting package journal reads. [Path={0}][Offset={1}]", self.journal_path, str(self.offset))
+        return True
+
+    def read_new_entries(self):
+        """ Returns the entries appended to the journal since the last read, including those in its rotated predecessor if it was rotated since """
+        journal_stat = self.__get_stat(self.journal_path)
+        if journal_stat is None or self.offset is None:
+            return []
+
+        entries = []
+        if journal_stat.st_ino != self.inode or journal_stat.st_size < self.offset:
+            rotated_journal_stat = self.__get_stat(self.journal_path + ".1")
+            if rotated_journal_stat is not None and rotated_journal_stat.st_ino == self.inode:
+                entries += self.__read_entries(self.journal_path + ".1", self.offset)[0]
+            self.composite_logger.log_debug(" - Package journal was rotated, reading the new journal from the start. [Path={0}]", self.journal_path)
+            self.inode, self.offset = journal_stat.st_ino, 0
+
+        if journal_stat.st_size > self.offset:
+            new_entries, self.offset = self.__read_entries(self.journal_path, self.offset)
+            entries += new_entries
+            self.__write_offset_record()
+
+        self.composite_logger.log_debug(" - Read package journal. [Path={0}][Offset={1}][Entries={2}]", self.journal_path, str(self.offset), str(entries))
+        return entries
+
+    def __read_entries(self, journal_path, offset):
+        """ Returns the entries in complete lines from the offset on, and the offset after the last complete line (a partial line is left for the next read) """
+        try:
+            with self.env_layer.file_system.open(journal_path, mode="rb") as file_handle:
+                file_handle.seek(offset)
+                content = file_handle.read()
+        except Exception as error:
+            self.composite_logger.log_debug(" - Unable to read package journal. [Path={0}][Error={1}]", journal_path, repr(error))
+            return [], offset
+
+        complete_length = content.rfind(b"\n") + 1
+        entries = []
+        for line in content[:complete_length].decode('utf-8', 'replace').splitlines():
+            entry = self.line_parser(line)
+            if entry is not None:
+                entries.append(entry)
+        return entries, offset + complete_length
+
+    def __read_offset_record(self):
+        """ Returns the persisted offset record, or None if there isn't a valid one """
+        if not os.path.isfile(self.offset_file_path):
+            return None
+        try:
+            with self.env_layer.file_system.open(self.offset_file_path, mode="r") as file_handle:
+                record = json.load(file_handle)['packageJournal']
+            return {'activityId': str(record['activityId']), 'path': str(record['path']), 'inode': int(record['inode']), 'offset': int(record['offset'])}
+        except Exception as error:
+            self.composite_logger.log_debug(" - Package journal offset record is unreadable, and will be ignored. [Path={0}][Error={1}]", self.offset_file_path, repr(error))
+            return None
+
+    def __write_offset_record(self):
+        """ Best-effort - without a record, a resumed operation starts at the end of the journal, and its earlier installs are found by status reconciliation """
+        record = {'activityId': self.activity_id, 'path': self.journal_path, 'inode': self.inode, 'offset': self.offset}
+        try:
+            self.env_layer.file_system.write_with_retry_using_temp_file(self.offset_file_path, json.dumps({"packageJournal": record}), mode='w')
+        except Exception as error:
+            self.composite_logger.log_debug(" - Unable to write package journal offset record. [Path={0}][Error={1}]", self.offset_file_path, repr(error))
+
+    @staticmethod
+    def __get_stat(path):
+        try:
+            return os.stat(path)
+        except (IOError, OSError):
+            return None
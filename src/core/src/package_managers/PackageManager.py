@@ -15,10 +15,16 @@
 # Requires Python 2.7+
 
 """The is base package manager, which defines the package management relevant operations"""
+import collections
 import json
 import os
+import threading
 from abc import ABCMeta, abstractmethod
 from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.OutputSpool import OutputSpool
+from core.src.package_managers.PackageQueryCache import PackageQueryCache
+from core.src.package_managers.RepoRefreshRecord import RepoRefreshRecord
+from core.src.package_managers.UpdateSet import UpdateSet
 import time
 
 
@@ -32,6 +38,7 @@ class PackageManager(object):
         self.status_handler = status_handler
         self.single_package_upgrade_cmd = ''
         self.single_package_upgrade_simulation_cmd = 'simulate-install'
+        self.single_package_download_cmd = ''
         self.package_manager_settings = {}
         self.force_reboot = False
 
@@ -39,6 +46,37 @@ class PackageManager(object):
         self.all_updates_cached = []
         self.all_update_versions_cached = []
 
+        # Classified update snapshot (all/security/other), computed once per repo-refresh generation and invalidated by a refresh or an actual install
+        self.classified_updates_snapshot = None
+
+        # Dependency graph (package -> dependencies), resolved once per package for the whole run and reset on repo refresh
+        self.dependency_graph = {}
+        self.dependency_resolution_errors = {}     # package -> error from resolving its dependencies (already added to status), raised again on lookup instead of re-resolving
+
+        # Read-only query results, memoized until the package database or repo lists change (package_state_paths) or the repo is refreshed or packages are installed
+        self.package_state_paths = []
+        self.package_query_cache = PackageQueryCache(composite_logger, self.get_package_state_fingerprint)
+
+        # Set once repo metadata is current for the refresh generation, so read queries can run cache-only where supported (see get_read_query_command)
+        self.repo_metadata_current = False
+
+        # Repo refreshes are recorded across runs, and recent ones against unchanged sources (repo_source_paths) are only repeated if forced
+        self.repo_source_paths = []
+        self.repo_refresh_record = RepoRefreshRecord(env_layer, composite_logger, os.path.join(execution_config.config_folder, Constants.REPO_REFRESH_RECORD_FILE))
+
+        # Installs are attributed from the package manager's transaction journal (the first of package_journal_paths present), where there is one
+        self.package_journal_paths = []
+
+        # Package manager commands are bounded by the time left in the maintenance window, once one is set
+        self.maintenance_window = None
+        self.is_install_transaction_in_progress = False     # install transactions may run to the end of the window, and are never killed
+
+        # Commands changing the package cache or the machine (installs, and background downloads ahead of them) run one at a time
+        self.transaction_lock = threading.Lock()
+
+        # Large command outputs are spooled to the temp folder, and only referenced with an excerpt in logs and telemetry
+        self.output_spool = OutputSpool(env_layer, composite_logger, execution_config.temp_folder)
+
         # auto OS updates
         self.image_default_patch_configuration_backup_path = os.path.join(execution_config.config_folder, Constants.IMAGE_DEFAULT_PATCH_CONFIGURATION_BACKUP_PATH)
 
@@ -51,19 +89,122 @@ class PackageManager(object):
     __metaclass__ = ABCMeta  # For Python 3.0+, it changes to class Abstract(metaclass=ABCMeta)
 
     @abstractmethod
-    def refresh_repo(self):
-        """Resynchronize the package index files from their sources."""
+    def refresh_repo(self, force=False):
+        """Resynchronize the package index files from their sources, unless that was done recently (by any run) and a refresh isn't forced."""
         pass
 
+    def is_repo_refresh_recent(self):
+        """ Returns true if the repo was refreshed within the repo refresh TTL, and its sources are unchanged since """
+        return self.repo_refresh_record.is_refresh_recent(self.get_repo_sources_fingerprint())
+
+    def record_repo_refresh(self):
+        """ Records a successful repo refresh, for this and later runs """
+        self.repo_refresh_record.write(self.get_repo_sources_fingerprint())
+
+    def get_repo_sources_fingerprint(self):
+        return RepoRefreshRecord.get_sources_fingerprint(PackageQueryCache.get_paths_fingerprint(self.repo_source_paths))
+
     # region Get Available Updates
     @abstractmethod
     def invoke_package_manager_advanced(self, command, raise_on_exception=True):
         pass
 
-    def invoke_package_manager(self, command):
+    def invoke_package_manager(self, command, memoized=False):
+        """ Memoized is only for read-only queries - failures raise, so only successful outputs are memoized """
+        if memoized:
+            return self.package_query_cache.get_or_run(command, lambda: self.invoke_package_manager(command))
         out, code = self.invoke_package_manager_advanced(command, raise_on_exception=True)
         return out
 
+    def run_query_command_output(self, command):
+        """ Runs a read-only package manager query, served from memory if it already ran against the current package state """
+        return self.package_query_cache.get_or_run(command, lambda: self.run_command_output(command, False, False),
+                                                   is_cacheable=lambda result: result[0] != Constants.COMMAND_TIMED_OUT_RETURN_CODE)
+
+    def get_package_state_fingerprint(self):
+        """ Returns a fingerprint of the package database and repo lists, which read-only query results are only valid for """
+        return PackageQueryCache.get_paths_fingerprint(self.package_state_paths)
+
+    def set_maintenance_window(self, maintenance_window):
+        """ Bounds package manager commands run from here on by the time left in the maintenance window, less the reboot buffer (except for installs) """
+        self.maintenance_window = maintenance_window
+
+    def get_command_timeout_in_secs(self):
+        """ Returns the time a package manager command may run for now, or None if commands aren't bounded.
+            Read-only queries and simulations have to leave the reboot buffer, while install transactions get the full remaining window. """
+        if self.maintenance_window is None:
+            return None
+        remaining_time_in_minutes = self.maintenance_window.get_remaining_time_in_minutes()
+        if not self.is_install_transaction_in_progress:
+            remaining_time_in_minutes -= Constants.REBOOT_BUFFER_IN_MINUTES
+        return max(int(remaining_time_in_minutes * 60), Constants.COMMAND_DEADLINE_MIN_TIMEOUT_IN_SECS)
+
+    def run_install_transaction(self, transaction, simulate=False):
+        """ Runs a transaction changing the machine, one at a time. Unless simulated, its commands may run to the end of the maintenance window
+            and are only ever asked to terminate, never killed, as a package manager killed mid-transaction can leave packages broken. """
+        with self.transaction_lock:
+            self.is_install_transaction_in_progress = not simulate
+            try:
+                return transaction()
+            finally:
+                self.is_install_transaction_in_progress = False
+
+    def run_command_output(self, command, no_output=False, chk_err=False, max_timeout_in_secs=None):
+        """ Runs a package manager command, bounded by the maintenance window if one is set, and by max_timeout_in_secs if that's sooner.
+            Only running past the maintenance window is reported to status - the caller handles its own shorter limit. """
+        timeout_in_secs = self.get_command_timeout_in_secs()
+        is_own_timeout = max_timeout_in_secs is not None and (timeout_in_secs is None or max_timeout_in_secs < timeout_in_secs)
+        if is_own_timeout:
+            timeout_in_secs = max_timeout_in_secs
+        if timeout_in_secs is None:
+            return self.env_layer.run_command_output(command, no_output, chk_err)
+
+        code, out = self.env_layer.run_command_output(command, no_output, chk_err, timeout_in_secs=timeout_in_secs, is_kill_allowed=not self.is_install_transaction_in_progress)
+        if not is_own_timeout:
+            self.report_command_deadline_if_exceeded(command, code, timeout_in_secs)
+        return code, out
+
+    def report_command_deadline_if_exceeded(self, command, code, timeout_in_secs):
+        """ Reports a command terminated for exceeding its deadline to status, with a distinct error code """
+        if code != Constants.COMMAND_TIMED_OUT_RETURN_CODE:
+            return
+        error_msg = "Package manager command was terminated as it ran past the maintenance window cutoff time. [Command={0}][TimeoutInSecs={1}]".format(command, str(timeout_in_secs))
+        self.composite_logger.log_error(error_msg)
+        self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.COMMAND_DEADLINE_EXCEEDED)
+
+    def run_command_output_streaming(self, command, line_handlers):
+        """ Streams the command output to the line handlers as the command runs. Returns the return code, and a bounded head/tail excerpt of the output for diagnostics. """
+        head_lines = []
+        head_size = 0
+        tail_lines = collections.deque()
+        tail_size = 0
+        omitted_line_count = 0
+
+        timeout_in_secs = self.get_command_timeout_in_secs()
+        if timeout_in_secs is None:
+            output_stream = self.env_layer.run_command_output_streaming(command, line_handlers)
+        else:
+            output_stream = self.env_layer.run_command_output_streaming(command, line_handlers, timeout_in_secs=timeout_in_secs, is_kill_allowed=not self.is_install_transaction_in_progress)
+        for line in output_stream:
+            if head_size < Constants.OUTPUT_SPOOL_EXCERPT_HEAD_IN_CHARS:
+                head_lines.append(line)
+                head_size += len(line) + 1
+                continue
+
+            tail_lines.append(line)
+            tail_size += len(line) + 1
+            while tail_size > Constants.OUTPUT_SPOOL_EXCERPT_TAIL_IN_CHARS and len(tail_lines) > 1:
+                tail_size -= len(tail_lines.popleft()) + 1
+                omitted_line_count += 1
+
+        excerpt_lines = head_lines
+        if omitted_line_count > 0 or output_stream.is_truncated:
+            excerpt_lines.append("...[OmittedLines={0}][TotalSize={1} chars][Truncated={2}]...".format(str(omitted_line_count), str(output_stream.output_size), str(output_stream.is_truncated)))
+        excerpt_lines.extend(tail_lines)
+        if timeout_in_secs is not None:
+            self.report_command_deadline_if_exceeded(command, output_stream.return_code, timeout_in_secs)
+        return output_stream.return_code, "\n".join(excerpt_lines)
+
     def get_available_updates(self, package_filter):
         """Returns List of all installed packages with available updates."""
         class_packages, class_versions = self.get_updates_for_classification(package_filter)
@@ -84,11 +225,11 @@ class PackageManager(object):
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
 
         if package_filter.is_msft_critsec_classification_only():
-            return self.get_security_updates()
+            return self.get_classified_updates(Constants.PackageClassification.SECURITY)
         elif package_filter.is_msft_other_classification_only():
             return self.get_other_updates()
         elif package_filter.is_msft_all_classification_included():
-            return self.get_all_updates()
+            return self.get_classified_updates()
         else:
             return [], []  # happens when nothing was selected, and inclusions are present
 
@@ -105,6 +246,48 @@ class PackageManager(object):
     @abstractmethod
     def get_other_updates(self):
         pass
+
+    def get_classified_updates(self, classification=None):
+        """Returns updates for the requested classification (None for all), served from a snapshot discovered once per repo-refresh generation"""
+        return self.get_classified_update_set(classification).to_lists()
+
+    def get_classified_update_set(self, classification=None):
+        """Same as get_classified_updates, but as an UpdateSet with each record's classification filled in"""
+        if self.classified_updates_snapshot is None:
+            self.composite_logger.log_debug("\nBuilding classified update snapshot...")
+            all_packages, all_package_versions = self.get_all_updates()
+            security_packages, security_package_versions = self.get_security_updates()
+            security_update_set = UpdateSet.from_lists(security_packages, security_package_versions, Constants.PackageClassification.SECURITY)
+            all_update_set = UpdateSet()
+            other_update_set = UpdateSet()
+            for package, package_version in zip(all_packages, all_package_versions):
+                if package in security_update_set:
+                    all_update_set.add(package, package_version, classification=Constants.PackageClassification.SECURITY)
+                else:
+                    all_update_set.add(package, package_version, classification=Constants.PackageClassification.OTHER)
+                    other_update_set.add(package, package_version, classification=Constants.PackageClassification.OTHER)
+            self.classified_updates_snapshot = {
+                None: all_update_set,
+                Constants.PackageClassification.SECURITY: security_update_set,
+                Constants.PackageClassification.OTHER: other_update_set
+            }
+        else:
+            self.composite_logger.log_debug(" - Returning classified update snapshot. [Classification={0}]".format(str(classification) if classification is not None else "All"))
+
+        return self.classified_updates_snapshot[classification].copy()  # callers are free to mutate what they receive
+
+    def invalidate_classified_updates_snapshot(self):
+        """Discards the classified update snapshot - must be called whenever the repo is refreshed or packages are installed"""
+        self.classified_updates_snapshot = None
+
+    def start_new_refresh_generation(self):
+        """Discards everything derived from the previous state of the package repositories - must be called on every repo refresh"""
+        self.invalidate_classified_updates_snapshot()
+        self.package_query_cache.invalidate()
+        self.dependency_graph = {}
+        self.dependency_resolution_errors = {}
+        self.repo_metadata_current = False
+
     # endregion
 
     def get_updates_for_inclusions(self, package_filter):
@@ -126,6 +309,10 @@ class PackageManager(object):
         included_package_versions = []
         not_included_packages = []
 
+        # Look up all available versions in batch for every package whose latest version doesn't satisfy the inclusion list on its own
+        packages_requiring_version_lookup = [package for index, package in enumerate(packages) if not package_filter.check_for_inclusion(package, package_versions[index]) and package_filter.check_for_inclusion(package)]
+        available_versions_by_package = self.get_all_available_versions_of_packages(packages_requiring_version_lookup) if len(packages_requiring_version_lookup) > 0 else {}
+
         # Check for inclusions
         for index, package in enumerate(packages):
             if package_filter.check_for_inclusion(package, package_versions[index]):    # check for the latest version
@@ -133,8 +320,8 @@ class PackageManager(object):
                 included_packages.append(package)
                 included_package_versions.append(package_versions[index])
 
-            elif package_filter.check_for_inclusion(package):                           # check for all available versions
-                available_versions = self.get_all_available_versions_of_package(package)
+            elif package in available_versions_by_package:                              # check for all available versions
+                available_versions = available_versions_by_package[package]
                 matched = False
                 for available_version in available_versions:
                     if not package_filter.check_for_inclusion(package, available_version):
@@ -158,17 +345,7 @@ class PackageManager(object):
     @staticmethod
     def dedupe_update_packages(packages, package_versions):
         """Remove duplicate packages and returns"""
-        deduped_packages = []
-        deduped_package_versions = []
-
-        for index, package in enumerate(packages):
-            if package in deduped_packages:
-                continue  # Already included
-
-            deduped_packages.append(package)
-            deduped_package_versions.append(package_versions[index])
-
-        return deduped_packages, deduped_package_versions
+        return UpdateSet.from_lists(packages, package_versions).to_lists()
     # endregion
 
     # region Install Update
@@ -212,9 +389,12 @@ class PackageManager(object):
         exec_cmd = str(self.get_install_command(cmd, package_and_dependencies, package_and_dependency_versions))
 
         self.composite_logger.log_debug("UPDATING PACKAGE (WITH DEPENDENCIES) USING COMMAND: " + exec_cmd)
-        out, code = self.invoke_package_manager_advanced(exec_cmd, raise_on_exception=False)
+        out, code = self.run_install_transaction(lambda: self.invoke_package_manager_advanced(exec_cmd, raise_on_exception=False), simulate)
+        if not simulate:
+            self.invalidate_classified_updates_snapshot()   # machine state has (potentially) changed
+            self.package_query_cache.invalidate()
         package_size = self.get_package_size(out)
-        self.composite_logger.log_debug("\n<PackageInstallOutput>\n" + out + "\n</PackageInstallOutput>")  # wrapping multi-line for readability
+        self.composite_logger.log_debug(lambda: "\n<PackageInstallOutput>\n" + self.output_spool.spool(out, exec_cmd).excerpt + "\n</PackageInstallOutput>")  # wrapping multi-line for readability
 
         # special case of package no longer being required (or maybe even present on the system)
         if code == 1 and self.get_package_manager_setting(Constants.PKG_MGR_SETTING_IDENTITY) == Constants.YUM:
@@ -255,12 +435,12 @@ class PackageManager(object):
                         code_path += " > Package NOT installed. (failed)"
                         self.composite_logger.log_error(" |- Package failed to install: " + package_and_dependencies[0] + " (" + package_and_dependency_versions[0] + "). " +
                                                      "\n |- Error code: " + str(code) + ". Command used: " + exec_cmd +
-                                                     "\n |- Command output: " + out + "\n")
+                                                     "\n |- Command output: " + self.output_spool.spool(out, exec_cmd).excerpt + "\n")
                     else:
                         code_path += " > Package NOT installed but return code: 0. (failed)"
                         self.composite_logger.log_error(" |- Package appears to have not been installed: " + package_and_dependencies[0] + " (" + package_and_dependency_versions[0] + "). " +
                                                      "\n |- Return code: 0. Command used: " + exec_cmd + "\n" +
-                                                     "\n |- Command output: " + out + "\n")
+                                                     "\n |- Command output: " + self.output_spool.spool(out, exec_cmd).excerpt + "\n")
             elif code != 0:
                 code_path += " > Info, package installed, non-zero return. (succeeded)"
                 self.composite_logger.log_warning(" - [Info] Desired package version was installed, but the package manager returned a non-zero return code: " + str(code) + ". Command used: " + exec_cmd + "\n")
@@ -268,8 +448,11 @@ class PackageManager(object):
                 code_path += " > Info, Package installed, zero return. (succeeded)"
 
         if not simulate:
+            if install_result == Constants.INSTALLED and self.maintenance_window is not None:
+                self.maintenance_window.record_package_install_duration(package_and_dependencies[0], package_size, time.time() - start_time)   # of the whole transaction, as the package is always installed with its dependencies
+
             if install_result == Constants.FAILED:
-                error = self.telemetry_writer.write_package_info(package_and_dependencies[0], package_and_dependency_versions[0], package_size, round(time.time() - start_time, 2), install_result, code_path, exec_cmd, str(out))
+                error = self.telemetry_writer.write_package_info(package_and_dependencies[0], package_and_dependency_versions[0], package_size, round(time.time() - start_time, 2), install_result, code_path, exec_cmd, self.output_spool.spool(out, exec_cmd).excerpt)
             else:
                 error = self.telemetry_writer.write_package_info(package_and_dependencies[0], package_and_dependency_versions[0], package_size, round(time.time() - start_time, 2), install_result, code_path, exec_cmd)
 
@@ -277,6 +460,48 @@ class PackageManager(object):
                 self.composite_logger.log_debug('\nEXCEPTION writing package telemetry: ' + repr(error))
 
         return install_result
+
+    def install_update_batch(self, parent_packages, parent_package_versions, packages, package_versions, simulate=False):
+        """Install a batch of independent packages along with their dependencies (explicitly) in a single transaction. Returns the parent packages verified to be installed.
+           The batch is best-effort - the caller isolates the parent packages not installed and installs them individually. Package manager issues are handled as for any other install."""
+        start_time = time.time()
+        cmd = self.single_package_upgrade_cmd if simulate is False else self.single_package_upgrade_simulation_cmd
+        exec_cmd = str(self.get_install_command(cmd, packages, package_versions))
+
+        self.composite_logger.log_debug("UPDATING PACKAGES (WITH DEPENDENCIES) IN BATCH USING COMMAND: " + exec_cmd)
+        out, code = self.run_install_transaction(lambda: self.invoke_package_manager_advanced(exec_cmd, raise_on_exception=False), simulate)
+        if not simulate:
+            self.invalidate_classified_updates_snapshot()   # machine state has (potentially) changed
+            self.package_query_cache.invalidate()
+        self.composite_logger.log_debug(lambda: "\n<PackageBatchInstallOutput>\n" + self.output_spool.spool(out, exec_cmd).excerpt + "\n</PackageBatchInstallOutput>")  # wrapping multi-line for readability
+
+        installed_parent_packages = [package for package, package_version in zip(parent_packages, parent_package_versions) if self.is_package_version_installed(package, package_version)]
+        code_path = "| Install > Batch of {0} > Package installed, return code: {1}. (succeeded)".format(str(len(parent_packages)), str(code))
+        self.composite_logger.log_debug(" - Batch installation result. [Code={0}][Installed={1}/{2}]".format(str(code), str(len(installed_parent_packages)), str(len(parent_packages))))
+
+        if not simulate:
+            install_duration = round((time.time() - start_time) / max(len(installed_parent_packages), 1), 2)    # the batch's duration, shared evenly, as it can't be attributed to individual packages
+            for package, package_version in zip(parent_packages, parent_package_versions):
+                if package not in installed_parent_packages:
+                    continue    # written once the package is installed individually
+                error = self.telemetry_writer.write_package_info(package, package_version, self.get_package_size_in_batch(out, package), install_duration, Constants.INSTALLED, code_path, exec_cmd)
+                if error is not None:
+                    self.composite_logger.log_debug('\nEXCEPTION writing package telemetry: ' + repr(error))
+
+        return installed_parent_packages
+
+    def download_packages(self, packages, package_versions, timeout_in_secs):
+        """Download packages (with versions) into the package cache without installing them, so their installation later only needs to unpack them.
+           Takes turns with install transactions on the transaction lock, as both need the package cache - it never runs alongside one.
+           Best-effort - returns False on failure, which isn't reported to status as the installation downloads whatever is missing anyway."""
+        exec_cmd = str(self.get_install_command(self.single_package_download_cmd, packages, package_versions))
+        self.composite_logger.log_debug("DOWNLOADING PACKAGES USING COMMAND: " + exec_cmd)
+        with self.transaction_lock:
+            code, out = self.run_command_output(exec_cmd, False, False, max_timeout_in_secs=timeout_in_secs)
+
+        if code != 0:
+            self.composite_logger.log_debug(lambda: " - Package download failed. [Code={0}][Command={1}][Output={2}]".format(str(code), exec_cmd, self.output_spool.spool(out, exec_cmd).excerpt))
+        return code == 0
     # endregion
 
     # region Package Information
@@ -286,6 +511,40 @@ class PackageManager(object):
         pass
         return []  # only here to suppress a static syntax validation problem
 
+    def get_all_available_versions_of_packages(self, package_names):
+        """ Returns a dictionary of package name -> all available versions, discovered in as few package manager invocations as possible """
+        versions_by_package = {}
+        for package_batch in self.get_package_name_batches(package_names):
+            self.composite_logger.log_debug("\nGetting all available versions of packages in batch. [PackageCount={0}]".format(str(len(package_batch))))
+            batch_versions_by_package = self.get_all_available_versions_of_package_batch(package_batch)
+            for package_name in package_batch:
+                if package_name in batch_versions_by_package:
+                    versions_by_package[package_name] = batch_versions_by_package[package_name]
+                else:   # output couldn't be attributed to the package (e.g. name normalization by the package manager), so look it up on its own
+                    versions_by_package[package_name] = self.get_all_available_versions_of_package(package_name)
+        return versions_by_package
+
+    def get_all_available_versions_of_package_batch(self, package_names):
+        """ Returns a dictionary of package name -> all available versions for one batch of packages. Package managers without a batched query look up one package at a time. """
+        return dict((package_name, self.get_all_available_versions_of_package(package_name)) for package_name in package_names)
+
+    @staticmethod
+    def get_package_name_batches(package_names, max_batch_length_in_chars=Constants.MAX_BATCHED_PACKAGE_NAMES_LENGTH_IN_CHARS):
+        """ Splits package names into batches that can be passed to a single package manager invocation """
+        batches = []
+        batch = []
+        batch_length = 0
+        for package_name in package_names:
+            if len(batch) > 0 and batch_length + len(package_name) + 1 > max_batch_length_in_chars:
+                batches.append(batch)
+                batch = []
+                batch_length = 0
+            batch.append(package_name)
+            batch_length += len(package_name) + 1
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
     @abstractmethod
     def is_package_version_installed(self, package_name, package_version):
         """ Returns true if the specific package version is installed """
@@ -296,6 +555,37 @@ class PackageManager(object):
         """Retrieve available updates. Expect an array being returned"""
         pass
 
+    def build_dependency_graph(self, packages):
+        """Resolves dependencies for the whole candidate set up front. Packages already in the graph are not resolved again."""
+        unresolved_packages = [package for package in packages if package not in self.dependency_graph and package not in self.dependency_resolution_errors]
+        if len(unresolved_packages) == 0:
+            return
+
+        self.composite_logger.log_debug("\nBuilding dependency graph... [CandidateCount={0}][UnresolvedCount={1}]".format(str(len(packages)), str(len(unresolved_packages))))
+        # resolved one package per simulation: a simulation of several packages only lists the union of what they pull in, which can't be attributed
+        # back to each package for its graph edges. Repeats are served from the package query cache, so each package is still only simulated once.
+        for package in unresolved_packages:
+            try:
+                self.dependency_graph[package] = self.get_dependent_list(package)
+            except Exception as error:
+                # the error is already in status - it's recorded so it's raised again only if the package is actually processed, without repeating the resolution
+                self.dependency_resolution_errors[package] = error
+                self.composite_logger.log_debug(" - Unable to resolve dependencies for package. [Package={0}][Error={1}]".format(str(package), repr(error)))
+        self.composite_logger.log_debug("Completed building dependency graph. [NodeCount={0}]".format(str(len(self.dependency_graph))))
+
+    def is_in_dependency_graph(self, package_name):
+        """Returns true if the dependencies of a package are already resolved"""
+        return package_name in self.dependency_graph
+
+    def get_dependencies_from_graph(self, package_name):
+        """Returns the dependencies of a package from the dependency graph, resolving them on demand if the package isn't in it yet.
+           Raises the recorded error if resolving them failed before."""
+        if package_name in self.dependency_resolution_errors:
+            raise self.dependency_resolution_errors[package_name]
+        if package_name not in self.dependency_graph:
+            self.dependency_graph[package_name] = self.get_dependent_list(package_name)
+        return list(self.dependency_graph[package_name])
+
     @abstractmethod
     def get_product_name(self, package_name):
         """Retrieve package name """
@@ -305,6 +595,22 @@ class PackageManager(object):
     def get_package_size(self, output):
         """Retrieve package size from installation output string"""
         pass
+
+    @abstractmethod
+    def get_package_size_in_batch(self, output, package_name):
+        """Retrieve the size of one of the packages from batch installation output string"""
+        pass
+
+    def get_package_journal_path(self):
+        """Returns the path of the package manager's transaction journal, or None if there isn't one"""
+        for package_journal_path in self.package_journal_paths:
+            if os.path.isfile(package_journal_path):
+                return package_journal_path
+        return None
+
+    def parse_package_journal_line(self, line):
+        """Returns the PackageJournalEntry in a line of the transaction journal, or None if there isn't one"""
+        return None
     # endregion
 
     # region Package Manager Settings
@@ -0,0 +1,82 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Background download of packages ahead of their installation"""
+import threading
+from core.src.bootstrap.Constants import Constants
+
+
+class PackagePrefetcher(object):
+    """Downloads the packages to be installed into the package cache on a background worker, in install order, until the maintenance window install cutoff.
+       Downloads and installs take turns on the package manager's transaction lock and never run at the same time: downloads only use the time between
+       install transactions (dependency resolution, status updates, etc.), and an install waits for at most one short download command.
+       A download cut short leaves whatever it didn't get to the install."""
+
+    def __init__(self, composite_logger, package_manager, maintenance_window):
+        self.composite_logger = composite_logger
+        self.package_manager = package_manager
+        self.maintenance_window = maintenance_window
+        self.prefetched_package_count = 0   # parent packages whose download (with dependencies) succeeded, for diagnostics
+        self.__stop_event = threading.Event()
+        self.__worker_thread = None
+
+    def start(self, install_units):
+        """ Starts downloading the (package, version, package_and_dependencies, package_and_dependency_versions) install units in the background """
+        if len(install_units) == 0:
+            return
+
+        self.composite_logger.log_debug("Prefetching packages in the background. [PackageCount={0}]", str(len(install_units)))
+        self.__worker_thread = threading.Thread(target=self.__run_worker, args=(list(install_units),), name="PackagePrefetcher")
+        self.__worker_thread.daemon = True
+        self.__worker_thread.start()
+
+    def stop(self):
+        """ Stops prefetching after the download in progress (if any), which is bounded, so no download outlives the install loop """
+        self.__stop_event.set()
+        if self.__worker_thread is not None:
+            self.__worker_thread.join()
+            self.__worker_thread = None
+        self.composite_logger.log_debug("Package prefetch stopped. [Prefetched={0}]", str(self.prefetched_package_count))
+
+    def get_download_time_available_in_secs(self):
+        """ Returns the time downloads may still run for - none past the point where installs stop, as they couldn't be used anymore """
+        cutoff_time_in_minutes = Constants.REBOOT_BUFFER_IN_MINUTES + Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES
+        remaining_time_in_minutes = self.maintenance_window.get_remaining_time_in_minutes()
+        return min(int((remaining_time_in_minutes - cutoff_time_in_minutes) * 60), Constants.PACKAGE_PREFETCH_COMMAND_MAX_TIME_IN_SECS)
+
+    def __run_worker(self, install_units):
+        try:
+            for index in range(0, len(install_units), Constants.PACKAGE_PREFETCH_BATCH_SIZE):
+                if self.__stop_event.is_set():
+                    return
+
+                timeout_in_secs = self.get_download_time_available_in_secs()
+                if timeout_in_secs <= 0:
+                    self.composite_logger.log_debug("Stopped package prefetch as the maintenance window install cutoff is near.")
+                    return
+
+                batch = install_units[index:index + Constants.PACKAGE_PREFETCH_BATCH_SIZE]
+                packages, package_versions = [], []
+                for unit in batch:
+                    for package, package_version in zip(unit[2], unit[3]):
+                        if package not in packages:
+                            packages.append(package)
+                            package_versions.append(package_version)
+
+                if self.package_manager.download_packages(packages, package_versions, timeout_in_secs):
+                    self.prefetched_package_count += len(batch)
+        except Exception as error:
+            self.composite_logger.log_debug("Package prefetch stopped on error. [Error={0}]", repr(error))
@@ -0,0 +1,72 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Memoization of read-only package manager queries within a package state generation"""
+import os
+
+
+class PackageQueryCache(object):
+    """Serves repeated read-only queries from memory for as long as the package state (installed packages and repo metadata) they ran against is unchanged"""
+
+    def __init__(self, composite_logger, fingerprint_delegate):
+        self.composite_logger = composite_logger
+        self.fingerprint_delegate = fingerprint_delegate    # returns a fingerprint of the package database and repo lists
+        self.hit_count = 0
+        self.miss_count = 0
+        self.__invalidation_count = 0
+        self.__generation = None
+        self.__results = {}
+
+    def get_or_run(self, command, query_delegate, is_cacheable=None):
+        """ Returns the memoized result of the command if it already ran in the current generation, otherwise runs the query and memoizes its result (if cacheable) """
+        generation = (self.__invalidation_count, self.fingerprint_delegate())
+        if generation != self.__generation:
+            if len(self.__results) > 0:
+                self.composite_logger.log_debug(" - Package state changed, discarding memoized query results. [Count={0}]", str(len(self.__results)))
+            self.__results = {}
+            self.__generation = generation
+
+        if command in self.__results:
+            self.hit_count += 1
+            self.composite_logger.log_debug(" - Query result served from memory. [Command={0}]", command)
+            return self.__results[command]
+
+        self.miss_count += 1
+        result = query_delegate()
+        if is_cacheable is None or is_cacheable(result):
+            self.__results[command] = result    # discarded on the next lookup if the query delegate itself started a new generation
+        return result
+
+    def invalidate(self):
+        """ Starts a new generation - must be called whenever the repo is refreshed or packages are installed, even if the fingerprint can't tell """
+        self.__invalidation_count += 1
+        self.__results = {}
+
+    @staticmethod
+    def get_paths_fingerprint(paths):
+        """ Returns a fingerprint (mtime and size) of the paths that exist, and of the direct children of those that are directories """
+        fingerprint = []
+        for path in paths:
+            try:
+                file_stat = os.stat(path)
+                fingerprint.append((path, file_stat.st_mtime, file_stat.st_size))
+                if os.path.isdir(path):
+                    for file_name in sorted(os.listdir(path)):
+                        file_stat = os.stat(os.path.join(path, file_name))
+                        fingerprint.append((file_name, file_stat.st_mtime, file_stat.st_size))
+            except (IOError, OSError):
+                continue    # absent or transiently unreadable paths are left out, explicit invalidation still applies
+        return tuple(fingerprint)
@@ -0,0 +1,81 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Persisted record of the last repo refresh, shared across runs"""
+import hashlib
+import json
+import os
+import time
+from core.src.bootstrap.Constants import Constants
+
+
+class RepoRefreshRecord(object):
+    """Tracks when the repo was last refreshed, and against which sources, so recent refreshes (by any run) aren't repeated"""
+
+    def __init__(self, env_layer, composite_logger, record_file_path):
+        self.env_layer = env_layer
+        self.composite_logger = composite_logger
+        self.record_file_path = record_file_path
+
+    def is_refresh_recent(self, sources_fingerprint):
+        """ Returns true if the repo was refreshed within the repo refresh TTL, and the sources are unchanged since """
+        record = self.read()
+        if record is None:
+            return False
+
+        elapsed_time_in_secs = self.__get_seconds_since_epoch() - record['lastRefreshInSecondsSinceEpoch']
+        if elapsed_time_in_secs < 0 or elapsed_time_in_secs >= Constants.REPO_REFRESH_TTL_IN_SECS:
+            self.composite_logger.log_debug(" - Last repo refresh is not recent. [ElapsedTimeInSecs={0}][TTLInSecs={1}]", str(elapsed_time_in_secs), str(Constants.REPO_REFRESH_TTL_IN_SECS))
+            return False
+        if record['sourcesFingerprint'] != sources_fingerprint:
+            self.composite_logger.log_debug(" - Repo sources changed since the last repo refresh. [LastRefresh={0}]", record['lastRefreshTimestamp'])
+            return False
+
+        self.composite_logger.log_debug(" - Last repo refresh is recent. [LastRefresh={0}][ElapsedTimeInSecs={1}]", record['lastRefreshTimestamp'], str(elapsed_time_in_secs))
+        return True
+
+    def read(self):
+        """ Returns the last repo refresh record, or None if there isn't a valid one """
+        if not os.path.isfile(self.record_file_path):
+            return None
+        try:
+            with self.env_layer.file_system.open(self.record_file_path, mode="r") as file_handle:
+                record = json.load(file_handle)['repoRefresh']
+            return {'lastRefreshInSecondsSinceEpoch': int(record['lastRefreshInSecondsSinceEpoch']),
+                    'lastRefreshTimestamp': str(record['lastRefreshTimestamp']),
+                    'sourcesFingerprint': str(record['sourcesFingerprint'])}
+        except Exception as error:
+            self.composite_logger.log_debug(" - Repo refresh record is unreadable, and will be ignored. [Path={0}][Error={1}]", self.record_file_path, repr(error))
+            return None
+
+    def write(self, sources_fingerprint):
+        """ Records a repo refresh that just completed. Best-effort - without a record, the next run just refreshes again. """
+        record = {'lastRefreshInSecondsSinceEpoch': self.__get_seconds_since_epoch(),
+                  'lastRefreshTimestamp': str(self.env_layer.datetime.timestamp()),   # redundant, but present for ease of debuggability
+                  'sourcesFingerprint': sources_fingerprint}
+        try:
+            self.env_layer.file_system.write_with_retry_using_temp_file(self.record_file_path, json.dumps({"repoRefresh": record}), mode='w')
+        except Exception as error:
+            self.composite_logger.log_debug(" - Unable to write repo refresh record. [Path={0}][Error={1}]", self.record_file_path, repr(error))
+
+    @staticmethod
+    def get_sources_fingerprint(paths_fingerprint):
+        """ Condenses a paths fingerprint of the sources and lists into a digest that can be persisted """
+        return hashlib.sha256(repr(paths_fingerprint).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def __get_seconds_since_epoch():
+        return int(time.time())
@@ -0,0 +1,94 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""In-memory index of installed packages from the rpm database, shared by the RPM-family package managers"""
+import os
+
+
+class RpmDatabaseIndex(object):
+    """Name and name.arch indexed snapshot of 'rpm -qa', regenerated only when the rpm database changes"""
+
+    def __init__(self, env_layer, composite_logger):
+        self.env_layer = env_layer
+        self.composite_logger = composite_logger
+
+        self.rpmdb_paths = ['/var/lib/rpm', '/usr/lib/sysimage/rpm']
+        self.rpm_query_installed_cmd = "rpm -qa --queryformat '%{NAME} %{ARCH} %{EPOCH} %{VERSION}-%{RELEASE}\\n'"
+        self.index = None
+        self.fingerprint = None
+
+    def get_installed_versions(self, package_name):
+        """ Returns the installed versions of a package (by name or name.arch), or None if the index is unavailable """
+        if not self.refresh_if_changed():
+            return None
+        return self.index.get(package_name, [])
+
+    def refresh_if_changed(self):
+        """ Regenerates the index only if the rpm database changed since it was last generated. Returns False if the index is unavailable. """
+        fingerprint = self.get_rpmdb_fingerprint()
+        if fingerprint is None:
+            self.index = None
+            self.fingerprint = None
+            return False
+        if self.index is not None and fingerprint == self.fingerprint:
+            return True
+
+        self.composite_logger.log_debug(" - Generating rpm database index. [Command={0}]".format(self.rpm_query_installed_cmd))
+        code, output = self.env_layer.run_command_output(self.rpm_query_installed_cmd, False, False)
+        index = self.parse_rpm_query_output(output) if code == 0 else {}
+        if len(index) == 0:     # a real rpm database is never empty
+            self.composite_logger.log_debug(" - rpm database index is unavailable. [Code={0}][Output={1}]".format(str(code), str(output)))
+            self.index = None
+            self.fingerprint = None
+            return False
+
+        self.index = index
+        self.fingerprint = fingerprint
+        return True
+
+    def get_rpmdb_fingerprint(self):
+        """ Returns a fingerprint (latest mtime and total size of the files) of the rpm database, or None if there isn't one """
+        fingerprint = None
+        for rpmdb_path in self.rpmdb_paths:
+            if not os.path.isdir(rpmdb_path):
+                continue
+            try:
+                for file_name in os.listdir(rpmdb_path):
+                    file_stat = os.stat(os.path.join(rpmdb_path, file_name))
+                    latest_mtime, total_size = fingerprint if fingerprint is not None else (0, 0)
+                    fingerprint = (max(latest_mtime, file_stat.st_mtime), total_size + file_stat.st_size)
+            except (IOError, OSError) as error:
+                self.composite_logger.log_debug(" - Unable to fingerprint rpm database. [Path={0}][Error={1}]".format(rpmdb_path, repr(error)))
+                return None
+        return fingerprint
+
+    @staticmethod
+    def parse_rpm_query_output(output):
+        """ Parses 'rpm -qa' output into a dictionary of package name (and name.arch) -> installed versions (with and without epoch) """
+        # Sample output format (name arch epoch version-release) --
+        # kernel x86_64 (none) 3.10.0-514.el7
+        # selinux-policy noarch (none) 3.13.1-102.el7_3.16
+        # NetworkManager x86_64 1 1.10.2-13.el7
+        index = {}
+        for line in output.strip().split('\n'):
+            details = line.split(' ')
+            if len(details) != 4:
+                continue
+            name, arch, epoch, version = details
+            versions = [version] if epoch in ('(none)', '0', '') else [epoch + ':' + version, version]
+            for key in (name, name + '.' + arch):
+                index.setdefault(key, []).extend(versions)
+        return index
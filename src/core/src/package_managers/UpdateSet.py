@@ -0,0 +1,99 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Indexed collection of package updates"""
+import collections
+
+
+class UpdateRecord(object):
+    """A single package update"""
+    __slots__ = ('name', 'version', 'arch', 'classification')
+
+    def __init__(self, name, version, arch=None, classification=None):
+        self.name = name
+        self.version = version
+        self.arch = arch
+        self.classification = classification
+
+    def __repr__(self):
+        return "UpdateRecord(name={0}, version={1}, arch={2}, classification={3})".format(str(self.name), str(self.version), str(self.arch), str(self.classification))
+
+
+class UpdateSet(object):
+    """Insertion-ordered set of updates keyed by package name, with O(1) lookup, removal and de-duplication.
+    The first update added for a package name wins, same as PackageManager.dedupe_update_packages has always done."""
+
+    def __init__(self, records=None):
+        self.__records = collections.OrderedDict()
+        for record in (records if records is not None else []):
+            self.add_record(record)
+
+    @staticmethod
+    def from_lists(packages, package_versions, classification=None):
+        """ List adapter - builds an update set from the parallel package and version lists used across the code base """
+        update_set = UpdateSet()
+        for package, package_version in zip(packages, package_versions):
+            update_set.add(package, package_version, classification=classification)
+        return update_set
+
+    def to_lists(self):
+        """ List adapter - returns the parallel package and version lists used across the code base """
+        return self.get_packages(), self.get_package_versions()
+
+    def add(self, name, version, arch=None, classification=None):
+        """ Adds an update if there isn't one already for the package. Returns True if it was added. """
+        if name in self.__records:
+            return False
+        self.__records[name] = UpdateRecord(name, version, arch, classification)
+        return True
+
+    def add_record(self, record):
+        """ Adds an existing update record if there isn't one already for the package. Returns True if it was added. """
+        if record.name in self.__records:
+            return False
+        self.__records[record.name] = record
+        return True
+
+    def remove(self, name):
+        """ Removes and returns the update for the package, or None if there wasn't one """
+        return self.__records.pop(name, None)
+
+    def get(self, name):
+        """ Returns the update record for the package, or None if there isn't one """
+        return self.__records.get(name, None)
+
+    def get_version(self, name, default_value=None):
+        """ Returns the update version for the package, or the default value if there isn't one """
+        record = self.__records.get(name, None)
+        return record.version if record is not None else default_value
+
+    def get_packages(self):
+        return list(self.__records.keys())
+
+    def get_package_versions(self):
+        return [record.version for record in self.__records.values()]
+
+    def copy(self):
+        return UpdateSet(UpdateRecord(record.name, record.version, record.arch, record.classification) for record in self.__records.values())
+
+    def __contains__(self, name):
+        return name in self.__records
+
+    def __len__(self):
+        return len(self.__records)
+
+    def __iter__(self):
+        return iter(list(self.__records.values()))
@@ -17,7 +17,9 @@
 """YumPackageManager for Redhat and CentOS"""
 import json
 import re
+from core.src.package_managers.PackageJournalReader import PackageJournalEntry
 from core.src.package_managers.PackageManager import PackageManager
+from core.src.package_managers.RpmDatabaseIndex import RpmDatabaseIndex
 from core.src.bootstrap.Constants import Constants
 
 
@@ -35,10 +37,24 @@ class YumPackageManager(PackageManager):
         self.yum_check_security = 'sudo yum -q --security check-update'
         self.single_package_check_versions = 'sudo yum list available <PACKAGE-NAME> --showduplicates'
         self.single_package_check_installed = 'sudo yum list installed <PACKAGE-NAME>'
+        self.rpm_database_index = RpmDatabaseIndex(env_layer, composite_logger)  # preferred over single_package_check_installed when available
+        self.package_state_paths = self.rpm_database_index.rpmdb_paths + ['/etc/yum.repos.d', '/var/cache/yum', '/var/cache/dnf']
         self.single_package_upgrade_simulation_cmd = 'LANG=en_US.UTF8 sudo yum install --assumeno '
 
+        # Transaction journal - dnf's rpm log is the current one where both are present (after an in-place upgrade)
+        self.package_journal_paths = ['/var/log/dnf.rpm.log', '/var/log/yum.log']
+        self.package_journal_line_regex = re.compile(r'\b(Installed|Install|Reinstall|Updated|Upgrade|Downgrade|Erased|Erase|Obsoleted): (\S+)\s*$')
+        self.package_journal_actions = {'Installed': Constants.PackageJournalActions.INSTALLED, 'Install': Constants.PackageJournalActions.INSTALLED, 'Reinstall': Constants.PackageJournalActions.INSTALLED,
+                                        'Updated': Constants.PackageJournalActions.UPGRADED, 'Upgrade': Constants.PackageJournalActions.UPGRADED, 'Downgrade': Constants.PackageJournalActions.UPGRADED,
+                                        'Erased': Constants.PackageJournalActions.REMOVED, 'Erase': Constants.PackageJournalActions.REMOVED, 'Obsoleted': Constants.PackageJournalActions.REMOVED}
+
+        # Cache-only read queries, once repo metadata is current for the refresh generation
+        self.yum_cache_only_option = ' -C'
+        self.yum_cache_missing_markers = ["Caching enabled but no local cache of", "Cache-only enabled but no cache for"]
+
         # Install update
         self.single_package_upgrade_cmd = 'sudo yum -y install '
+        self.single_package_download_cmd = 'sudo yum -y install --downloadonly '
         self.all_but_excluded_upgrade_cmd = 'sudo yum -y update --exclude='
 
         # Package manager exit code(s)
@@ -96,22 +112,27 @@ class YumPackageManager(PackageManager):
         
         self.yum_update_client_package = "sudo yum update -y --disablerepo='*' --enablerepo='*microsoft*'"
 
-    def refresh_repo(self):
-        pass  # Refresh the repo is no ops in YUM
+    def refresh_repo(self, force=False):
+        self.start_new_refresh_generation()  # Refresh the repo is no ops in YUM, but a new refresh generation still starts here
 
     # region Get Available Updates
     def invoke_package_manager_advanced(self, command, raise_on_exception=True):
         """Get missing updates using the command input"""
         self.composite_logger.log_debug('\nInvoking package manager using: ' + command)
-        code, out = self.env_layer.run_command_output(command, False, False)
+        code, out = self.run_command_output(command, False, False)
+
+        if self.is_cache_only_query_without_cache(command, code, out):
+            self.composite_logger.log_debug(" - Repo metadata cache is unusable, running the query normally. [Code={0}]", str(code))
+            command = command[:-len(self.yum_cache_only_option)]
+            code, out = self.run_command_output(command, False, False)
 
         code, out = self.try_mitigate_issues_if_any(command, code, out)
 
         if code not in [self.yum_exitcode_ok, self.yum_exitcode_no_applicable_packages, self.yum_exitcode_updates_available]:
             self.composite_logger.log('[ERROR] Package manager was invoked using: ' + command)
             self.composite_logger.log_warning(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
-            self.telemetry_writer.write_execution_error(command, code, out)
+            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
+            self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
             error_msg = 'Unexpected return code (' + str(code) + ') from package manager on command: ' + command
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             if raise_on_exception:
@@ -120,7 +141,7 @@ class YumPackageManager(PackageManager):
         else:  # verbose diagnostic log
             self.composite_logger.log_verbose("\n\n==[SUCCESS]===============================================================")
             self.composite_logger.log_debug(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_debug(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_debug(lambda: " - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
             self.composite_logger.log_verbose("==========================================================================\n\n")
         return out, code
 
@@ -132,7 +153,8 @@ class YumPackageManager(PackageManager):
             self.composite_logger.log_debug(" - Returning cached package data.")
             return self.all_updates_cached, self.all_update_versions_cached  # allows for high performance reuse in areas of the code explicitly aware of the cache
 
-        out = self.invoke_package_manager(self.yum_check)
+        out = self.invoke_package_manager(self.get_read_query_command(self.yum_check))
+        self.repo_metadata_current = True   # metadata was loaded (and re-validated if expired) by the query above
         self.all_updates_cached, self.all_update_versions_cached = self.extract_packages_and_versions(out)
         self.composite_logger.log_debug("Discovered " + str(len(self.all_updates_cached)) + " package entries.")
         return self.all_updates_cached, self.all_update_versions_cached
@@ -141,7 +163,7 @@ class YumPackageManager(PackageManager):
         """Get missing security updates"""
         self.composite_logger.log("\nDiscovering 'security' packages...")
         self.install_yum_security_prerequisite()
-        out = self.invoke_package_manager(self.yum_check_security)
+        out = self.invoke_package_manager(self.get_read_query_command(self.yum_check_security))
         security_packages, security_package_versions = self.extract_packages_and_versions(out)
 
         if len(security_packages) == 0 and 'CentOS' in str(self.env_layer.platform.linux_distribution()):   # deliberately non-terminal
@@ -153,11 +175,7 @@ class YumPackageManager(PackageManager):
     def get_other_updates(self):
         """Get missing other updates"""
         self.composite_logger.log("\nDiscovering 'other' packages...")
-        other_packages = []
-        other_package_versions = []
-
-        all_packages, all_package_versions = self.get_all_updates(True)
-        security_packages, security_package_versions = self.get_security_updates()
+        security_packages, security_package_versions = self.get_classified_updates(Constants.PackageClassification.SECURITY)
         if len(security_packages) == 0 and 'CentOS' in str(self.env_layer.platform.linux_distribution()):  # deliberately terminal - erring on the side of caution to avoid dissat in uninformed customers
             self.composite_logger.log_error("Please review patch management documentation for information on classification-based patching on YUM.")
             error_msg = "Classification-based patching is only supported on YUM if the computer is independently configured to receive classification information." \
@@ -165,19 +183,29 @@ class YumPackageManager(PackageManager):
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
 
-        for index, package in enumerate(all_packages):
-            if package not in security_packages:
-                other_packages.append(package)
-                other_package_versions.append(all_package_versions[index])
-
+        other_packages, other_package_versions = self.get_classified_updates(Constants.PackageClassification.OTHER)
         self.composite_logger.log("Discovered " + str(len(other_packages)) + " 'other' package entries.")
         return other_packages, other_package_versions
 
     def install_yum_security_prerequisite(self):
         """Not installed by default in versions prior to RHEL 7. This step is idempotent and fast, so we're not writing more complex code."""
         self.composite_logger.log_debug('Ensuring RHEL yum-plugin-security is present.')
-        code, out = self.env_layer.run_command_output(self.yum_check_security_prerequisite, False, False)
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output : \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(self.yum_check_security_prerequisite, False, False)
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output : \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
+    # endregion
+
+    # region Cache-only read queries
+    def get_read_query_command(self, command):
+        """ Returns the read query to run - cache-only (without re-validating expired repo metadata) once metadata is current for the refresh generation """
+        return command + self.yum_cache_only_option if self.repo_metadata_current else command
+
+    def is_cache_only_query_without_cache(self, command, code, out):
+        """ Cache-only queries fail, or report nothing, if there's no usable cache - those need to be run again normally """
+        if not command.endswith(self.yum_cache_only_option):
+            return False
+        if code not in [self.yum_exitcode_ok, self.yum_exitcode_no_applicable_packages, self.yum_exitcode_updates_available]:
+            return True
+        return any(marker in out for marker in self.yum_cache_missing_markers)
     # endregion
 
     # region Output Parser(s)
@@ -222,7 +250,7 @@ class YumPackageManager(PackageManager):
                 versions.append(line[1])
                 line_index += 1
             else:
-                self.composite_logger.log_debug(" - Inapplicable line (" + str(line_index) + "): " + lines[line_index])
+                self.composite_logger.log_debug(" - Inapplicable line ({0}): {1}", line_index, lines[line_index])
 
         return packages, versions
     # endregion
@@ -254,19 +282,35 @@ class YumPackageManager(PackageManager):
         # kernel.x86_64                                                                                    3.10.0-862.el7                                                                                         base
         # kernel.x86_64                                                                                    3.10.0-862.2.3.el7                                                                                     updates
         # kernel.x86_64                                                                                    3.10.0-862.3.2.el7                                                                                     updates
-        cmd = self.single_package_check_versions.replace('<PACKAGE-NAME>', package_name)
-        output = self.invoke_package_manager(cmd)
+        cmd = self.get_read_query_command(self.single_package_check_versions.replace('<PACKAGE-NAME>', package_name))
+        output = self.invoke_package_manager(cmd, memoized=True)
         packages, package_versions = self.extract_packages_and_versions_including_duplicates(output)
         return package_versions
 
+    def get_all_available_versions_of_package_batch(self, package_names):
+        """ Returns a dictionary of package name -> all available versions for a batch of packages, using a single invocation """
+        versions_by_package = {}
+        cmd = self.get_read_query_command(self.single_package_check_versions.replace('<PACKAGE-NAME>', ' '.join(package_names)))
+        output = self.invoke_package_manager(cmd, memoized=True)
+        packages, package_versions = self.extract_packages_and_versions_including_duplicates(output)
+        for package, package_version in zip(packages, package_versions):
+            versions_by_package.setdefault(package, []).append(package_version)
+        return versions_by_package
+
     def is_package_version_installed(self, package_name, package_version):
         """ Returns true if the specific package version is installed """
         # Loaded plugins: product-id, search-disabled-repos, subscription-manager
         # Installed Packages
         # kernel.x86_64                                                                                   3.10.0-514.el7                                                                                    @anaconda/7.3
         self.composite_logger.log_debug("\nCHECKING PACKAGE INSTALL STATUS FOR: " + str(package_name) + " (" + str(package_version) + ")")
-        cmd = self.single_package_check_installed.replace('<PACKAGE-NAME>', package_name)
-        output = self.invoke_package_manager(cmd)
+        installed_versions = self.rpm_database_index.get_installed_versions(package_name)
+        if installed_versions is not None:
+            is_installed = package_version in installed_versions
+            self.composite_logger.log_debug(" - Install status verified with the rpm database index. [Installed={0}][InstalledVersions={1}]".format(str(is_installed), str(installed_versions)))
+            return is_installed
+
+        cmd = self.get_read_query_command(self.single_package_check_installed.replace('<PACKAGE-NAME>', package_name))
+        output = self.invoke_package_manager(cmd, memoized=True)
         packages, package_versions = self.extract_packages_and_versions_including_duplicates(output)
 
         for index, package in enumerate(packages):
@@ -301,17 +345,17 @@ class YumPackageManager(PackageManager):
         self.composite_logger.log_debug("\nRESOLVING DEPENDENCIES USING COMMAND: " + str(self.single_package_upgrade_simulation_cmd + package_name))
         dependent_updates = []
 
-        output = self.invoke_package_manager(self.single_package_upgrade_simulation_cmd + package_name)
+        output = self.invoke_package_manager(self.single_package_upgrade_simulation_cmd + package_name, memoized=True)
         lines = output.strip().split('\n')
 
         for line in lines:
             if line.find(" will be updated") < 0 and line.find(" will be an update") < 0 and line.find(" will be installed") < 0:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
 
             updates_line = re.split(r'\s+', line.strip())
             if len(updates_line) != 7:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
 
             dependent_package_name = self.get_product_name(updates_line[2])
@@ -322,6 +366,33 @@ class YumPackageManager(PackageManager):
         self.composite_logger.log_debug(str(len(dependent_updates)) + " dependent updates were found for package '" + package_name + "'.")
         return dependent_updates
 
+    def parse_package_journal_line(self, line):
+        """Returns the PackageJournalEntry in a yum.log or dnf.rpm.log line, named name.arch as updates are, with the epoch (if any) in the version.
+           The outgoing versions of upgrades ('Upgraded:' in dnf.rpm.log) aren't entries."""
+        # Sample lines from /var/log/yum.log and /var/log/dnf.rpm.log:
+        # Jun 20 10:15:52 Updated: 1:openssl-libs-1.0.2k-26.el7_9.x86_64
+        # Jun 20 10:16:03 Erased: libfoo
+        # 2023-06-20T10:15:52+0000 SUBDEBUG Upgrade: bash-5.1.8-6.el9_1.x86_64
+        match = self.package_journal_line_regex.search(line)
+        if match is None:
+            return None
+        action = self.package_journal_actions[match.group(1)]
+        nevra = match.group(2)
+
+        epoch = None
+        if re.match(r'^\d+:', nevra):
+            epoch, nevra = nevra.split(':', 1)
+        name_version_release, arch = nevra.rsplit('.', 1) if '.' in nevra else (nevra, None)
+        name_version_release_parts = name_version_release.rsplit('-', 2)
+        if arch is None or len(name_version_release_parts) != 3:
+            return PackageJournalEntry(action, nevra, None)     # yum.log only names erased packages
+
+        name, version, release = name_version_release_parts
+        if ':' in version:
+            epoch, version = version.split(':', 1)
+        version = version + '-' + release if epoch in (None, '0') else epoch + ':' + version + '-' + release
+        return PackageJournalEntry(action, name + '.' + arch, version)
+
     def get_product_name(self, package_name):
         """Retrieve product name including arch where present"""
         return package_name
@@ -368,6 +439,15 @@ class YumPackageManager(PackageManager):
                     return line.replace(self.STR_TOTAL_DOWNLOAD_SIZE, "")
 
         return Constants.UNKNOWN_PACKAGE_SIZE
+
+    def get_package_size_in_batch(self, output, package_name):
+        """Retrieve the size of one of the packages from batch installation output string"""
+        # Sample line from output (package, arch, version, repository and size - long package names wrap onto the next line):
+        #  kmod-kvdo   x86_64   6.1.0.171-17.el7_5   rhui-rhel-7-server-rhui-rpms   348 k
+        product_name, arch = self.get_product_name_and_arch(package_name)
+        search_txt = r'^ ' + re.escape(product_name) + r'\s+' + (re.escape(arch[1:]) if arch is not None else r'\S+') + r'\s+\S+\s+\S+\s+([0-9.]+ [kMG])\s*$'
+        search = re.search(search_txt, str(output), re.M)
+        return search.group(1) if search is not None else Constants.UNKNOWN_PACKAGE_SIZE
     # endregion
 
     # region auto OS updates
@@ -591,8 +671,8 @@ class YumPackageManager(PackageManager):
     def is_service_set_to_enable_on_reboot(self, command):
         """ Checking if auto update is enable_on_reboot on the machine. An enable_on_reboot service will be activated (if currently inactive) on machine reboot """
         self.composite_logger.log_debug("Checking if auto update service is set to enable on reboot...")
-        code, out = self.env_layer.run_command_output(command, False, False)
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(command, False, False)
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
         if len(out.strip()) > 0 and code == 0 and 'enabled' in out:
             self.composite_logger.log_debug("Auto OS update service will enable on reboot")
             return True
@@ -788,12 +868,12 @@ class YumPackageManager(PackageManager):
 
     def disable_auto_update_on_reboot(self, command):
         self.composite_logger.log_debug("Disabling auto update on reboot using command: " + str(command))
-        code, out = self.env_layer.run_command_output(command, False, False)
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(command, False, False)
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
 
         if code != 0:
             self.composite_logger.log('[ERROR] Command invoked: ' + command)
-            self.telemetry_writer.write_execution_error(command, code, out)
+            self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
             error_msg = 'Unexpected return code (' + str(code) + ') on command: ' + command
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.OPERATION_FAILED)
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
@@ -803,8 +883,8 @@ class YumPackageManager(PackageManager):
     def is_auto_update_service_installed(self, install_check_cmd):
         """ Checks if the auto update service is enable_on_reboot on the VM """
         self.composite_logger.log_debug("Checking if auto update service is installed...")
-        code, out = self.env_layer.run_command_output(install_check_cmd, False, False)
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(install_check_cmd, False, False)
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
         if len(out.strip()) > 0 and code == 0:
             self.composite_logger.log_debug("Auto OS update service is installed on the machine")
             return True
@@ -821,13 +901,13 @@ class YumPackageManager(PackageManager):
             issue_mitigated = self.check_known_issues_and_attempt_fix(out)
             if issue_mitigated:
                 self.composite_logger.log_debug('\nPost mitigation, invoking package manager again using: ' + command)
-                code_after_fix_attempt, out_after_fix_attempt = self.env_layer.run_command_output(command, False, False)
+                code_after_fix_attempt, out_after_fix_attempt = self.run_command_output(command, False, False)
                 return self.try_mitigate_issues_if_any(command, code_after_fix_attempt, out_after_fix_attempt)
         return code, out
 
     def check_known_issues_and_attempt_fix(self, output):
         """ Checks if issue falls into known issues and attempts to mitigate """
-        self.composite_logger.log_debug("Output from package manager containing error: \n|\t" + "\n|\t".join(output.splitlines()))
+        self.composite_logger.log_debug(lambda: "Output from package manager containing error: \n|\t" + "\n|\t".join(self.output_spool.spool(output).excerpt.splitlines()))
         self.composite_logger.log_debug("\nChecking if this is a known error...")
         for error in self.known_errors_and_fixes:
             if error in output:
@@ -841,19 +921,19 @@ class YumPackageManager(PackageManager):
     def fix_ssl_certificate_issue(self):
         command = self.yum_update_client_package
         self.composite_logger.log_debug("\nUpdating client package to avoid errors from older certificates using command: [Command={0}]".format(str(command)))
-        code, out = self.env_layer.run_command_output(command, False, False)
+        code, out = self.run_command_output(command, False, False)
         if code != self.yum_exitcode_no_applicable_packages:
             self.composite_logger.log('[ERROR] Package manager was invoked using: ' + command)
             self.composite_logger.log_warning(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
-            self.telemetry_writer.write_execution_error(command, code, out)
+            self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
+            self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
             error_msg = 'Unexpected return code (' + str(code) + ') from package manager on command: ' + command
             self.status_handler.add_error_to_status(error_msg, Constants.PatchOperationErrorCodes.PACKAGE_MANAGER_FAILURE)
             raise Exception(error_msg, "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
         else:
             self.composite_logger.log_debug("\n\n==[SUCCESS]===============================================================")
             self.composite_logger.log_debug(" - Return code from package manager: " + str(code))
-            self.composite_logger.log_debug(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
+            self.composite_logger.log_debug(lambda: " - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
             self.composite_logger.log_debug("==========================================================================\n\n")
             self.composite_logger.log_debug("\nClient package update complete.")
     # endregion
@@ -863,12 +943,12 @@ class YumPackageManager(PackageManager):
         self.composite_logger.log_debug("Checking if process requires reboot")
         # Checking using yum-utils
         self.composite_logger.log_debug("Ensuring yum-utils is present.")
-        code, out = self.env_layer.run_command_output(self.yum_utils_prerequisite, False, False)  # idempotent, doesn't install if already present
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(self.yum_utils_prerequisite, False, False)  # idempotent, doesn't install if already present
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
 
         # Checking for restart for distros with -r flag such as RHEL 7+
-        code, out = self.env_layer.run_command_output(self.needs_restarting_with_flag, False, False)
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(self.needs_restarting_with_flag, False, False)
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
         if out.find("Reboot is required") < 0:
             self.composite_logger.log_debug(" - Reboot not detected to be required (L1).")
         else:
@@ -877,8 +957,8 @@ class YumPackageManager(PackageManager):
 
         # Checking for restart for distro without -r flag such as RHEL 6 and CentOS 6
         if str(self.env_layer.platform.linux_distribution()[1]).split('.')[0] == '6':
-            code, out = self.env_layer.run_command_output(self.needs_restarting, False, False)
-            self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+            code, out = self.run_command_output(self.needs_restarting, False, False)
+            self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
             if len(out.strip()) == 0 and code == 0:
                 self.composite_logger.log_debug(" - Reboot not detected to be required (L2).")
             else:
@@ -887,8 +967,8 @@ class YumPackageManager(PackageManager):
 
         # Double-checking using yum ps (where available)
         self.composite_logger.log_debug("Ensuring yum-plugin-ps is present.")
-        code, out = self.env_layer.run_command_output(self.yum_ps_prerequisite, False, False)  # idempotent, doesn't install if already present
-        self.composite_logger.log_debug(" - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(out.splitlines()))
+        code, out = self.run_command_output(self.yum_ps_prerequisite, False, False)  # idempotent, doesn't install if already present
+        self.composite_logger.log_debug(lambda: " - Code: " + str(code) + ", Output: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
 
         output = self.invoke_package_manager(self.yum_ps)
         lines = output.strip().split('\n')
@@ -900,7 +980,7 @@ class YumPackageManager(PackageManager):
         for line in lines:
             if not process_list_flag:  # keep going until the process list starts
                 if line.find("pid") < 0 and line.find("proc") < 0 and line.find("uptime") < 0:
-                    self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                    self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                     continue
                 else:
                     self.composite_logger.log_debug(" - Process list started: " + str(line))
@@ -909,7 +989,7 @@ class YumPackageManager(PackageManager):
 
             process_details = re.split(r'\s+', line.strip())
             if len(process_details) < 7:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
             else:
                 self.composite_logger.log_debug(" - Applicable line: " + str(line))
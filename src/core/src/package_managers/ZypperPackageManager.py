@@ -19,7 +19,9 @@ import json
 import os
 import re
 import time
+from core.src.package_managers.PackageJournalReader import PackageJournalEntry
 from core.src.package_managers.PackageManager import PackageManager
+from core.src.package_managers.RpmDatabaseIndex import RpmDatabaseIndex
 from core.src.bootstrap.Constants import Constants
 
 
@@ -41,16 +43,25 @@ class ZypperPackageManager(PackageManager):
         self.repo_clean = 'sudo zypper clean -a'
         self.repo_refresh = 'sudo zypper refresh'
         self.repo_refresh_services = 'sudo zypper refresh --services'
+        self.repo_source_paths = ['/etc/zypp/repos.d', '/etc/zypp/services.d', '/var/cache/zypp/raw']
+        self.package_journal_paths = ['/var/log/zypp/history']
 
         # Support to get updates and their dependencies
         self.zypper_check = 'sudo LANG=en_US.UTF8 zypper list-updates'
         self.zypper_check_security = 'sudo LANG=en_US.UTF8 zypper list-patches --category security'
         self.single_package_check_versions = 'LANG=en_US.UTF8 zypper search -s <PACKAGE-NAME>'
+        self.rpm_database_index = RpmDatabaseIndex(env_layer, composite_logger)  # preferred over single_package_check_versions for installed version checks when available
+        self.package_state_paths = self.rpm_database_index.rpmdb_paths + ['/etc/zypp/repos.d', '/var/cache/zypp/solv']
         self.single_package_upgrade_simulation_cmd = 'sudo LANG=en_US.UTF8 zypper --non-interactive update --dry-run '
         self.zypper_install_security_patches_simulate = 'sudo LANG=en_US.UTF8 zypper --non-interactive patch --category security --dry-run'
 
+        # Cache-only read queries, once repo metadata is current for the refresh generation
+        self.zypper_no_refresh_option = '--no-refresh '
+        self.zypper_cache_missing_markers = ["because of the above error", "have not been refreshed because of an error"]
+
         # Install update
         self.single_package_upgrade_cmd = 'sudo zypper --non-interactive update '
+        self.single_package_download_cmd = 'sudo zypper --non-interactive update --download-only '
         self.zypper_install_security_patches = 'sudo zypper --non-interactive patch --category security'
 
         # Package manager exit code(s)
@@ -87,11 +98,18 @@ class ZypperPackageManager(PackageManager):
         # # commands for YaST2 online update configuration
         # self.__init_constants_for_yast2_online_update_configuration()
 
-    def refresh_repo(self):
+    def refresh_repo(self, force=False):
+        if not force and self.is_repo_refresh_recent():
+            self.composite_logger.log("Local repo was refreshed recently, skipping refresh.")
+            self.repo_metadata_current = True
+            return
         self.composite_logger.log("Refreshing local repo...")
+        self.start_new_refresh_generation()
         # self.invoke_package_manager(self.repo_clean)  # purges local metadata for rebuild - addresses a possible customer environment error
         try:
             self.invoke_package_manager(self.repo_refresh)
+            self.record_repo_refresh()
+            self.repo_metadata_current = True
         except Exception as error:
             # Reboot if not already done
             if self.status_handler.get_installation_reboot_status() == Constants.RebootStatus.COMPLETED:
@@ -123,9 +141,16 @@ class ZypperPackageManager(PackageManager):
 
         for i in range(1, self.package_manager_max_retries + 1):
             self.set_lock_timeout_and_backup_original()
-            code, out = self.env_layer.run_command_output(command, False, False)
+            code, out = self.run_command_output(command, False, False)
             self.restore_original_lock_timeout()
 
+            if self.is_cache_only_query_without_cache(command, code, out):
+                self.composite_logger.log_debug(" - Repo metadata cache is unusable, running the query normally. [Code={0}]", str(code))
+                command = command.replace(self.zypper_no_refresh_option, '', 1)
+                self.set_lock_timeout_and_backup_original()
+                code, out = self.run_command_output(command, False, False)
+                self.restore_original_lock_timeout()
+
             if code not in self.zypper_success_exit_codes:  # more known return codes should be added as appropriate
                 # Refresh repo services if no repos are defined
                 if code == self.zypper_exitcode_no_repos and command != self.repo_refresh_services and not repo_refresh_services_attempted:
@@ -201,15 +226,15 @@ class ZypperPackageManager(PackageManager):
         """Logs verbose error messages if there is an error on invoke_package_manager"""
         self.composite_logger.log('[ERROR] Package manager was invoked using: ' + command)
         self.composite_logger.log_warning(" - Return code from package manager: " + str(code))
-        self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
+        self.composite_logger.log_warning(" - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out, command).excerpt.splitlines()))
         self.log_process_tree_if_exists(out)
-        self.telemetry_writer.write_execution_error(command, code, out)
+        self.telemetry_writer.write_execution_error(command, code, self.output_spool.spool(out, command).excerpt)
 
     def log_success_on_invoke(self, code, out):
         """Logs verbose success messages on invoke_package_manager"""
         self.composite_logger.log_verbose("\n\n==[SUCCESS]===============================================================")
         self.composite_logger.log_debug(" - Return code from package manager: " + str(code))
-        self.composite_logger.log_debug(" - Output from package manager: \n|\t" + "\n|\t".join(out.splitlines()))
+        self.composite_logger.log_debug(lambda: " - Output from package manager: \n|\t" + "\n|\t".join(self.output_spool.spool(out).excerpt.splitlines()))
         self.composite_logger.log_verbose("==========================================================================\n\n")
 
     def log_process_tree_if_exists(self, out):
@@ -268,7 +293,7 @@ class ZypperPackageManager(PackageManager):
         # Gives a process tree so the calling process name(s) can be identified
         # TODO: consider revisiting in the future to reduce the result to this pid only instead of entire tree
         get_process_tree_cmd = self.zypper_get_process_tree_cmd.format(str(pid))
-        code, out = self.env_layer.run_command_output(get_process_tree_cmd, False, False)
+        code, out = self.run_command_output(get_process_tree_cmd, False, False)
 
         # Failed to get process tree
         if code != 0 or len(out) == 0:
@@ -289,7 +314,7 @@ class ZypperPackageManager(PackageManager):
             self.composite_logger.log_debug(" - Returning cached package data.")
             return self.all_updates_cached, self.all_update_versions_cached  # allows for high performance reuse in areas of the code explicitly aware of the cache
 
-        out = self.invoke_package_manager(self.zypper_check)
+        out = self.invoke_package_manager(self.get_read_query_command(self.zypper_check))
         self.all_updates_cached, self.all_update_versions_cached = self.extract_packages_and_versions(out)
         self.composite_logger.log_debug("Discovered " + str(len(self.all_updates_cached)) + " package entries.")
         return self.all_updates_cached, self.all_update_versions_cached
@@ -301,7 +326,7 @@ class ZypperPackageManager(PackageManager):
         security_package_versions = []
 
         # Get all security packages
-        out = self.invoke_package_manager(self.zypper_install_security_patches_simulate)
+        out = self.invoke_package_manager(self.get_read_query_command(self.zypper_install_security_patches_simulate))
         packages_from_patch_data = self.extract_packages_from_patch_data(out)
 
         # Correlate and enrich with versions from all package data
@@ -323,7 +348,7 @@ class ZypperPackageManager(PackageManager):
         other_package_versions = []
 
         # Get all security packages
-        out = self.invoke_package_manager(self.zypper_install_security_patches_simulate)
+        out = self.invoke_package_manager(self.get_read_query_command(self.zypper_install_security_patches_simulate))
         packages_from_patch_data = self.extract_packages_from_patch_data(out)
 
         # SPECIAL CONDITION IF ZYPPER UPDATE IS DETECTED - UNAVOIDABLE SECURITY UPDATE(S) WILL BE INSTALLED AND THE RUN REPEATED FOR 'OTHER".
@@ -346,6 +371,22 @@ class ZypperPackageManager(PackageManager):
         return other_packages, other_package_versions
     # endregion
 
+    # region Cache-only read queries
+    def get_read_query_command(self, command):
+        """ Returns the read query to run - without auto-refreshing repo metadata once it's current for the refresh generation """
+        if not self.repo_metadata_current:
+            return command
+        return command.replace('zypper ', 'zypper ' + self.zypper_no_refresh_option, 1)
+
+    def is_cache_only_query_without_cache(self, command, code, out):
+        """ No-refresh queries fail, or skip repos, if there's no usable cache - those need to be run again normally """
+        if self.zypper_no_refresh_option not in command:
+            return False
+        if code not in self.zypper_success_exit_codes:
+            return True
+        return any(marker in out for marker in self.zypper_cache_missing_markers)
+    # endregion
+
     # region Output Parser(s)
     def extract_packages_and_versions(self, output):
         """Returns packages and versions from given output"""
@@ -425,6 +466,12 @@ class ZypperPackageManager(PackageManager):
     def is_package_version_installed(self, package_name, package_version):
         """ Returns true if the specific package version is installed """
         self.composite_logger.log_debug("\nCHECKING PACKAGE INSTALL STATUS FOR: " + str(package_name) + "(" + str(package_version) + ")")
+        installed_versions = self.rpm_database_index.get_installed_versions(package_name)
+        if installed_versions is not None:
+            is_installed = package_version in installed_versions
+            self.composite_logger.log_debug(" - Install status verified with the rpm database index. [Installed={0}][InstalledVersions={1}]".format(str(is_installed), str(installed_versions)))
+            return is_installed
+
         installed_package_versions = self.get_all_available_versions_of_package_ex(package_name, include_installed=True, include_available=False)
         for version in installed_package_versions:
             if version == package_version:
@@ -437,23 +484,35 @@ class ZypperPackageManager(PackageManager):
 
     def get_all_available_versions_of_package_ex(self, package_name, include_installed=False, include_available=True):
         """ Returns a list of all the available versions of a package """
+        self.composite_logger.log_debug("\nGetting all available versions of package '" + package_name + "' [Installed=" + str(include_installed) + ", Available=" + str(include_available) + "]...")
+        cmd = self.get_read_query_command(self.single_package_check_versions.replace('<PACKAGE-NAME>', package_name))
+        output = self.invoke_package_manager(cmd, memoized=True)
+        return self.extract_versions_by_package(output, [package_name], include_installed, include_available).get(package_name, [])
+
+    def get_all_available_versions_of_package_batch(self, package_names):
+        """ Returns a dictionary of package name -> all available versions (not already installed) for a batch of packages, using a single invocation """
+        cmd = self.get_read_query_command(self.single_package_check_versions.replace('<PACKAGE-NAME>', ' '.join(package_names)))
+        output = self.invoke_package_manager(cmd, memoized=True)
+        versions_by_package = self.extract_versions_by_package(output, package_names, include_installed=False, include_available=True)
+        for package_name in package_names:
+            versions_by_package.setdefault(package_name, [])    # zypper search lists every match, so a package absent from the output has no versions
+        return versions_by_package
+
+    def extract_versions_by_package(self, output, package_names, include_installed=False, include_available=True):
+        """ Returns a dictionary of package name -> versions from zypper search output, for the package names requested """
         # Sample output format
         # S | Name                    | Type       | Version      | Arch   | Repository
         # --+-------------------------+------------+--------------+--------+-------------------
         # v | bash                    | package    | 4.3-83.5.2   | x86_64 | SLES12-SP2-Updates
 
-        package_versions = []
-
-        self.composite_logger.log_debug("\nGetting all available versions of package '" + package_name + "' [Installed=" + str(include_installed) + ", Available=" + str(include_available) + "]...")
-        cmd = self.single_package_check_versions.replace('<PACKAGE-NAME>', package_name)
-        output = self.invoke_package_manager(cmd)
+        versions_by_package = {}
         lines = output.strip().split('\n')
 
         packages_list_flag = False
         for line in lines:
             if not packages_list_flag:  # keep going until the packages list starts
                 if not all(word in line for word in ["S", "Name", "Type", "Version", "Arch", "Repository"]):
-                    self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                    self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                     continue
                 else:
                     self.composite_logger.log_debug(" - Package list started: " + str(line))
@@ -462,7 +521,7 @@ class ZypperPackageManager(PackageManager):
 
             package_details = line.split(' |')
             if len(package_details) != 6:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
             else:
                 self.composite_logger.log_debug(" - Applicable line: " + str(line))
@@ -471,7 +530,7 @@ class ZypperPackageManager(PackageManager):
                 details_type = str(package_details[2].strip())
                 details_version = str(package_details[3].strip())
 
-                if details_name != package_name:
+                if details_name not in package_names:
                     self.composite_logger.log_debug("    - Excluding as package name doesn't match exactly: " + details_name)
                     continue
                 if details_type == "srcpackage":
@@ -484,9 +543,9 @@ class ZypperPackageManager(PackageManager):
                     self.composite_logger.log_debug("    - Excluding as package version is available: " + details_version)
                     continue
 
-                package_versions.append(details_version)
+                versions_by_package.setdefault(details_name, []).append(details_version)
 
-        return package_versions
+        return versions_by_package
 
     def get_dependent_list(self, package_name):
         # Sample output for the cmd
@@ -514,12 +573,12 @@ class ZypperPackageManager(PackageManager):
         self.composite_logger.log_debug("\nRESOLVING DEPENDENCIES USING COMMAND:: " + str(self.single_package_upgrade_simulation_cmd + package_name))
         dependent_updates = []
 
-        output = self.invoke_package_manager(self.single_package_upgrade_simulation_cmd + package_name)
+        output = self.invoke_package_manager(self.single_package_upgrade_simulation_cmd + package_name, memoized=True)
         lines = output.strip().split('\n')
 
         for line in lines:
             if line.find(" going to be ") < 0:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
 
             updates_line = lines[lines.index(line) + 1]
@@ -532,6 +591,20 @@ class ZypperPackageManager(PackageManager):
         self.composite_logger.log_debug(str(len(dependent_updates)) + " dependent updates were found for package '" + package_name + "'.")
         return dependent_updates
 
+    def parse_package_journal_line(self, line):
+        """Returns the PackageJournalEntry in a zypp history line. Upgrades are logged as installs of the new version."""
+        # Sample lines from /var/log/zypp/history (for an upgrade, and a removal):
+        # 2023-06-20 10:15:52|install|bash|4.4-150400.27.3.2|x86_64||repo-sle-update|9d6a4a1c...|
+        # 2023-06-20 10:16:03|remove |libfoo1|1.0-1.1|x86_64|root@host|
+        if line.startswith('#'):
+            return None
+        parts = line.split('|')
+        if len(parts) < 5 or parts[1].strip() not in ('install', 'remove'):
+            return None
+
+        action = Constants.PackageJournalActions.INSTALLED if parts[1].strip() == 'install' else Constants.PackageJournalActions.REMOVED
+        return PackageJournalEntry(action, parts[2].strip(), parts[3].strip())
+
     def get_product_name(self, package_name):
         """Retrieve product name """
         return package_name
@@ -552,6 +625,13 @@ class ZypperPackageManager(PackageManager):
         except Exception as error:
             self.composite_logger.log_debug(" - Could not get package size from output: " + repr(error))
             return Constants.UNKNOWN_PACKAGE_SIZE
+
+    def get_package_size_in_batch(self, output, package_name):
+        """Retrieve the size of one of the packages from batch installation output string"""
+        # Sample output line:
+        # Retrieving package samba-libs-4.15.4+git.331.61fc89677dd-3.60.1.x86_64                       (3/3), 441.7 KiB (544.9 KiB unpacked)
+        search = re.search(r'Retrieving package ' + re.escape(package_name) + r'-[0-9]\S*\s+\([0-9]+/[0-9]+\),\s*(.+?)\s*\(', str(output))
+        return search.group(1) if search is not None else Constants.UNKNOWN_PACKAGE_SIZE
     # endregion
 
     # region auto OS updates
@@ -765,7 +845,7 @@ class ZypperPackageManager(PackageManager):
         for line in lines:
             if not process_list_flag:  # keep going until the process list starts
                 if not all(word in line for word in ["PID", "PPID", "UID", "User", "Command", "Service"]):
-                    self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                    self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                     continue
                 else:
                     self.composite_logger.log_debug(" - Process list started: " + str(line))
@@ -774,7 +854,7 @@ class ZypperPackageManager(PackageManager):
 
             process_details = line.split(' |')
             if len(process_details) < 6:
-                self.composite_logger.log_debug(" - Inapplicable line: " + str(line))
+                self.composite_logger.log_debug(" - Inapplicable line: {0}", line)
                 continue
             else:
                 self.composite_logger.log_debug(" - Applicable line: " + str(line))
@@ -43,6 +43,12 @@ class LifecycleManager(object):
 
     def lifecycle_status_check(self):
         pass
+
+    def exit_execution(self):
+        """ Terminates this instance, after persisting queued telemetry events and closing the log file """
+        self.telemetry_writer.close()
+        self.composite_logger.file_logger.close()
+        self.env_layer.exit(0)
     # endregion
 
     # region - State management
@@ -54,8 +54,7 @@ class LifecycleManagerAzure(LifecycleManager):
                         self.composite_logger.log_warning("Auto-assessment NOT STARTED as newer sequence number detected. [Attempted={0}][DetectedExt={1}][DetectedCore={2}]".format(str(self.execution_config.sequence_number), str(extension_sequence['number']), str(core_sequence['number'])))
                     elif int(self.execution_config.sequence_number) > int(extension_sequence['number']) or int(self.execution_config.sequence_number) > int(core_sequence['number']):
                         self.composite_logger.log_error("Auto-assessment NOT STARTED as an extension state anomaly was detected. [Attempted={0}][DetectedExt={1}][DetectedCore={2}]".format(str(self.execution_config.sequence_number), str(extension_sequence['number']), str(core_sequence['number'])))
-                    self.composite_logger.file_logger.close()
-                    self.env_layer.exit(0)
+                    self.exit_execution()
 
                 # DEFINITELY SAFE TO START. Correct sequence number marked as completed
                 if core_sequence['completed'].lower() == 'true':
@@ -73,8 +72,7 @@ class LifecycleManagerAzure(LifecycleManager):
                     # DEFINITELY _NOT_ SAFE TO START. Possible reasons: full core operation is in progress (okay), some previous auto-assessment is still running (bad scheduling, adhoc run, or process stalled)
                     if elapsed_time_in_minutes > Constants.MAX_AUTO_ASSESSMENT_WAIT_FOR_MAIN_CORE_EXEC_IN_MINUTES:    # will wait up to the max allowed
                         self.composite_logger.log_warning("Auto-assessment is NOT safe to start yet.TIMED-OUT waiting to Core to complete. EXITING. [LastHeartbeat={0}][Operation={1}]".format(str(core_sequence['lastHeartbeat']), str(core_sequence['action'])))
-                        self.composite_logger.file_logger.close()
-                        self.env_layer.exit(0)
+                        self.exit_execution()
                     else:
                         self.composite_logger.file_logger.flush()
                         self.composite_logger.log_warning("Auto-assessment is NOT safe to start yet. Waiting to retry (up to set timeout). [LastHeartbeat={0}][Operation={1}][ElapsedTimeInMinutes={2}][TotalWaitRequiredInMinutes={3}]".format(str(core_sequence['lastHeartbeat']), str(core_sequence['action']), str(elapsed_time_in_minutes), str(Constants.REBOOT_BUFFER_IN_MINUTES)))
@@ -107,8 +105,7 @@ class LifecycleManagerAzure(LifecycleManager):
                 if core_sequence['completed'] is True:
                     # Block attempts to execute what last completed (fully) again
                     self.composite_logger.log_warning("LifecycleManager recorded false enable for completed sequence {0}.".format(str(extension_sequence['number'])))
-                    self.composite_logger.file_logger.close()
-                    self.env_layer.exit(0)
+                    self.exit_execution()
                 else:
                     # Incomplete current execution
                     self.composite_logger.log_debug("Restarting execution for incomplete sequence number: {0}.".format(str(self.execution_config.sequence_number)))
@@ -131,8 +128,7 @@ class LifecycleManagerAzure(LifecycleManager):
             self.composite_logger.log_error("Extension goal state has changed. Terminating current sequence: {0}".format(self.execution_config.sequence_number))
             self.status_handler.report_sequence_number_changed_termination()        # fail everything in a sequence number change
             self.update_core_sequence(completed=True)       # forced-to-complete scenario | extension wrapper will be watching for this event
-            self.composite_logger.file_logger.close()
-            self.env_layer.exit(0)
+            self.exit_execution()
         self.composite_logger.log_debug("Completed lifecycle status check.")   
 
     # End region State checkers      
@@ -0,0 +1,110 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Indexed store of the patch records reported in status"""
+import bisect
+from core.src.bootstrap.Constants import Constants
+
+
+class PatchStore(object):
+    """Patch records keyed by patchId, kept in status reporting order (classification, then patch state) as they change.
+    Same ordering as a stable re-sort of the previous order with StatusHandler.sort_packages_by_classification_and_state:
+    records moving up join the end of their new group, records moving down join the front of it, and records moved
+    together keep their previous relative order. Positions are found by binary search (O(log n) comparisons), but list
+    insertion and removal are still O(n) element moves - cheap next to re-sorting the whole list on every update."""
+
+    def __init__(self, packages=None):
+        self.__records = {}         # patchId -> record
+        self.__sort_keys = {}       # patchId -> current position key in the ordering
+        self.__ordering = []        # sorted list of position keys: (classification order, patch state order, sequence, patchId)
+        self.__last_sequence = 0    # sequences handed out at the end of groups count up from here
+        self.__first_sequence = 0   # sequences handed out at the front of groups count down from here
+        for record in (packages if packages is not None else []):
+            self.upsert(record)
+
+    def upsert(self, record):
+        """ Adds a record, or replaces the record with the same patchId, and positions it """
+        patch_id = record['patchId']
+        existing_sort_key = self.__sort_keys.get(patch_id, None)
+        self.__records[patch_id] = record
+        if existing_sort_key is None:
+            self.__last_sequence += 1
+            self.__insert(patch_id, self.__get_group(record) + (self.__last_sequence, patch_id))
+        else:
+            self.__reposition([(existing_sort_key, patch_id)])
+
+    def update(self, patch_id, classification=None, patch_state=None):
+        """ Updates the classification and/or patch state of an existing record. Returns False if there's no such record. """
+        return self.update_many([(patch_id, classification, patch_state)]) == 1
+
+    def update_many(self, changes):
+        """ Applies (patchId, classification, patch state) changes to existing records together, like one re-sort after all of them.
+            None leaves that field as is, and patchIds without a record are skipped. Returns the number of records updated. """
+        moved = []
+        for patch_id, classification, patch_state in changes:
+            record = self.__records.get(patch_id, None)
+            if record is None:
+                continue
+            if classification is not None:
+                record['classifications'] = [classification]
+            if patch_state is not None:
+                record['patchInstallationState'] = patch_state
+            moved.append((self.__sort_keys[patch_id], patch_id))
+
+        self.__reposition(moved)
+        return len(moved)
+
+    def get(self, patch_id):
+        """ Returns the record for the patchId, or None if there isn't one """
+        return self.__records.get(patch_id, None)
+
+    def get_packages(self):
+        """ Returns the records in status reporting order """
+        return [self.__records[sort_key[3]] for sort_key in self.__ordering]
+
+    def __reposition(self, moved):
+        """ Moves changed records ([(previous sort key, patchId)]) to their new groups, without re-sorting """
+        moving_up, moving_down = [], []
+        for existing_sort_key, patch_id in sorted(set(moved)):   # previous relative order, each record once
+            group = self.__get_group(self.__records[patch_id])
+            if existing_sort_key[:2] == group:
+                continue
+            del self.__ordering[bisect.bisect_left(self.__ordering, existing_sort_key)]
+            (moving_down if group > existing_sort_key[:2] else moving_up).append((patch_id, group))
+
+        for patch_id, group in reversed(moving_down):    # front of the group, so hand out sequences back to front
+            self.__first_sequence -= 1
+            self.__insert(patch_id, group + (self.__first_sequence, patch_id))
+        for patch_id, group in moving_up:
+            self.__last_sequence += 1
+            self.__insert(patch_id, group + (self.__last_sequence, patch_id))
+
+    def __insert(self, patch_id, sort_key):
+        bisect.insort(self.__ordering, sort_key)
+        self.__sort_keys[patch_id] = sort_key
+
+    @staticmethod
+    def __get_group(record):
+        """ Returns the (classification order, patch state order) group of a record """
+        classification_order = min(Constants.PackageClassificationOrderInStatusReporting[classification] for classification in record['classifications'])
+        patch_state_order = Constants.PatchStateOrderInStatusReporting[record['patchInstallationState']] if 'patchInstallationState' in record else 0  # Only for installation result packages
+        return classification_order, patch_state_order
+
+    def __contains__(self, patch_id):
+        return patch_id in self.__records
+
+    def __len__(self):
+        return len(self.__records)
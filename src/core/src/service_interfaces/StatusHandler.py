@@ -18,14 +18,16 @@ import json
 import os
 import re
 import shutil
+import threading
 import time
 from core.src.bootstrap.Constants import Constants
+from core.src.service_interfaces.PatchStore import PatchStore
 
 
 class StatusHandler(object):
     """Class for managing the core code's lifecycle within the extension wrapper"""
 
-    def __init__(self, env_layer, execution_config, composite_logger, telemetry_writer, vm_cloud_type):
+    def __init__(self, env_layer, execution_config, composite_logger, telemetry_writer, vm_cloud_type, status_file_write_interval_in_secs=Constants.STATUS_FILE_WRITE_INTERVAL_IN_SECS):
         # Map supporting components for operation
         self.env_layer = env_layer
         self.execution_config = execution_config
@@ -35,13 +37,23 @@ class StatusHandler(object):
         self.__log_file_path = self.execution_config.log_file_path
         self.vm_cloud_type = vm_cloud_type
 
+        # Status file write-behind
+        self.status_file_write_interval_in_secs = status_file_write_interval_in_secs
+        self.__status_file_lock = threading.RLock()
+        self.__status_file_dirty = False
+        self.__status_file_last_write_time = None
+        self.__status_file_flush_timer = None
+        self.__substatus_json_versions = {}     # substatus name -> version, bumped only when that substatus (or its summary) changes
+        self.__substatus_json_fragments = {}    # substatus name -> (version, serialized form), re-encoded only when the version moves on
+        self.__substatus_summaries_to_serialize = {}    # substatus name -> summary json to serialize as its message at the next status file write
+
         # Status components
         self.__high_level_status_message = ""
 
         # Internal in-memory representation of Patch Installation data
         self.__installation_substatus_json = None
         self.__installation_summary_json = None
-        self.__installation_packages = []
+        self.__installation_packages = PatchStore()
         self.__installation_errors = []
         self.__installation_total_error_count = 0  # All errors during install, includes errors not in error objects due to size limit
         self.__maintenance_window_exceeded = False
@@ -50,7 +62,7 @@ class StatusHandler(object):
         # Internal in-memory representation of Patch Assessment data
         self.__assessment_substatus_json = None
         self.__assessment_summary_json = None
-        self.__assessment_packages = []
+        self.__assessment_packages = PatchStore()
         self.__assessment_errors = []
         self.__assessment_total_error_count = 0  # All errors during assess, includes errors not in error objects due to size limit
 
@@ -98,23 +110,21 @@ class StatusHandler(object):
         """ Externally available method to wipe out any assessment package records in memory. """
         self.__assessment_substatus_json = None
         self.__assessment_summary_json = None
-        self.__assessment_packages = []
+        self.__substatus_summaries_to_serialize.pop(Constants.PATCH_ASSESSMENT_SUMMARY, None)
+        self.__assessment_packages = PatchStore()
         self.__assessment_errors = []
         self.__assessment_total_error_count = 0
 
     def set_package_assessment_status(self, package_names, package_versions, classification="Other", status="Available"):
         """ Externally available method to set assessment status for one or more packages of the **SAME classification and status** """
         self.composite_logger.log_debug("Setting package assessment status in bulk. [Count={0}]".format(str(len(package_names))))
+        changes, new_records = [], []
         for package_name, package_version in zip(package_names, package_versions):
-            patch_already_saved = False
             patch_id = self.__get_patch_id(package_name, package_version)
-            for i in range(0, len(self.__assessment_packages)):
-                if patch_id == self.__assessment_packages[i]['patchId']:
-                    patch_already_saved = True
-                    self.__assessment_packages[i]['classifications'] = [classification]
-                    # self.__assessment_packages[i]['patchState'] = status
-
-            if patch_already_saved is False:
+            if patch_id in self.__assessment_packages:
+                changes.append((patch_id, classification, None))
+                # changes.append((patch_id, classification, status))
+            else:
                 record = {
                     "patchId": str(patch_id),
                     "name": str(package_name),
@@ -122,9 +132,12 @@ class StatusHandler(object):
                     "classifications": [classification]
                     # "patchState": str(status) # Allows for capturing 'Installed' packages in addition to 'Available', when commented out, if spec changes
                 }
-                self.__assessment_packages.append(record)
+                new_records.append(record)
+
+        self.__assessment_packages.update_many(changes)
+        for record in new_records:
+            self.__assessment_packages.upsert(record)
 
-        self.__assessment_packages = self.sort_packages_by_classification_and_state(self.__assessment_packages)
         self.set_assessment_substatus_json()
 
     def sort_packages_by_classification_and_state(self, packages_list):
@@ -132,6 +145,7 @@ class StatusHandler(object):
             (sorting order from highest priority to lowest):
             1. Classification: Security, Critical, Other, Unclassified
             2. Patch Installation State: Failed, Installed, Available, Pending, Excluded, NotSelected
+            Status reporting keeps its PatchStore records in this same order incrementally, instead of re-sorting on every update.
         """
         def sort_patch_state_key(x):
             # Only for installation result packages
@@ -159,18 +173,13 @@ class StatusHandler(object):
 
         package_names, package_versions = self.validate_packages_being_installed(package_names, package_versions)
 
+        changes, new_records = [], []
         for package_name, package_version in zip(package_names, package_versions):
             self.composite_logger.log_debug("Logging progress [Package: " + package_name + "; Status: " + status + "]")
-            patch_already_saved = False
             patch_id = self.__get_patch_id(package_name, package_version)
-            for i in range(0, len(self.__installation_packages)):
-                if patch_id == self.__installation_packages[i]['patchId']:
-                    patch_already_saved = True
-                    if classification is not None:
-                        self.__installation_packages[i]['classifications'] = [classification]
-                    self.__installation_packages[i]['patchInstallationState'] = status
-
-            if patch_already_saved is False:
+            if patch_id in self.__installation_packages:
+                changes.append((patch_id, classification, status))
+            else:
                 if classification is None:
                     classification = Constants.PackageClassification.OTHER
                 record = {
@@ -180,9 +189,12 @@ class StatusHandler(object):
                     "classifications": [classification],
                     "patchInstallationState": str(status)
                 }
-                self.__installation_packages.append(record)
+                new_records.append(record)
 
-        self.__installation_packages = self.sort_packages_by_classification_and_state(self.__installation_packages)
+        # applied together so records moved in bulk keep their relative order, the same as one re-sort afterwards would
+        self.__installation_packages.update_many(changes)
+        for record in new_records:
+            self.__installation_packages.upsert(record)
         self.set_installation_substatus_json()
 
     @staticmethod
@@ -205,15 +217,15 @@ class StatusHandler(object):
         self.validate_packages_being_installed(package_names, package_versions)
 
         self.composite_logger.log_debug("Setting package installation classification in bulk. [Count={0}]".format(str(len(package_names))))
+        changes = []
         for package_name, package_version in zip(package_names, package_versions):
             self.composite_logger.log_debug("Logging progress [Package: " + package_name + "; Package Version: " + package_version + "]")
             patch_id = self.__get_patch_id(package_name, package_version)
-            for i in range(0, len(self.__installation_packages)):
-                if patch_id == self.__installation_packages[i]['patchId']:
-                    self.composite_logger.log_debug("Setting classification for package: [Package={0}] [Classification={1}]".format(str(package_name), str(classification)))
-                    self.__installation_packages[i]['classifications'] = [classification]
+            if patch_id in self.__installation_packages:
+                self.composite_logger.log_debug("Setting classification for package: [Package={0}] [Classification={1}]".format(str(package_name), str(classification)))
+                changes.append((patch_id, classification, None))
+        self.__installation_packages.update_many(changes)
 
-        self.__installation_packages = self.sort_packages_by_classification_and_state(self.__installation_packages)
         self.set_installation_substatus_json()
 
     def __get_patch_id(self, package_name, package_version):
@@ -255,6 +267,10 @@ class StatusHandler(object):
         self.__installation_reboot_status = new_reboot_status
         self.set_installation_substatus_json()
 
+        # The machine is about to go down, so the reboot start can't wait for the status file write-behind
+        if new_reboot_status == Constants.RebootStatus.STARTED:
+            self.flush_status_file()
+
     def __refresh_installation_reboot_status(self):
         """ Discovers if the system needs a reboot. Never allows going back to NotNeeded (deliberate). ONLY called internally. """
         self.composite_logger.log_debug("Checking if reboot status needs to reflect machine reboot status.")
@@ -300,13 +316,16 @@ class StatusHandler(object):
         self.composite_logger.log_debug("Setting assessment substatus. [Substatus={0}]".format(str(status)))
 
         # Wrap patches into assessment summary
-        self.__assessment_summary_json = self.__new_assessment_summary_json(self.__assessment_packages, status, code)
+        self.__assessment_summary_json = self.__new_assessment_summary_json(self.__assessment_packages.get_packages(), status, code)
 
-        # Wrap assessment summary into assessment substatus
-        self.__assessment_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_ASSESSMENT_SUMMARY, status, code, json.dumps(self.__assessment_summary_json))
+        # Wrap assessment summary into assessment substatus - the summary is serialized into its message only when the status file is written
+        with self.__status_file_lock:
+            self.__assessment_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_ASSESSMENT_SUMMARY, status, code)
+            self.__substatus_summaries_to_serialize[Constants.PATCH_ASSESSMENT_SUMMARY] = self.__assessment_summary_json
+            self.__bump_substatus_json_version(Constants.PATCH_ASSESSMENT_SUMMARY)
 
         # Update status on disk
-        self.__write_status_file()
+        self.__write_status_file(force=status != Constants.STATUS_TRANSITIONING)
 
     def __new_assessment_summary_json(self, assessment_packages_json, status, code):
         """ Called by: set_assessment_substatus_json
@@ -349,13 +368,16 @@ class StatusHandler(object):
         self.composite_logger.log_debug("Setting installation substatus. [Substatus={0}]".format(str(status)))
 
         # Wrap patches into installation summary
-        self.__installation_summary_json = self.__new_installation_summary_json(self.__installation_packages)
+        self.__installation_summary_json = self.__new_installation_summary_json(self.__installation_packages.get_packages())
 
-        # Wrap deployment summary into installation substatus
-        self.__installation_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_INSTALLATION_SUMMARY, status, code, json.dumps(self.__installation_summary_json))
+        # Wrap deployment summary into installation substatus - the summary is serialized into its message only when the status file is written
+        with self.__status_file_lock:
+            self.__installation_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_INSTALLATION_SUMMARY, status, code)
+            self.__substatus_summaries_to_serialize[Constants.PATCH_INSTALLATION_SUMMARY] = self.__installation_summary_json
+            self.__bump_substatus_json_version(Constants.PATCH_INSTALLATION_SUMMARY)
 
         # Update status on disk
-        self.__write_status_file()
+        self.__write_status_file(force=status != Constants.STATUS_TRANSITIONING)
 
     def __new_installation_summary_json(self, installation_packages_json):
         """ Called by: set_installation_substatus_json
@@ -414,10 +436,12 @@ class StatusHandler(object):
         self.__metadata_for_healthstore_summary_json = self.__new_patch_metadata_for_healthstore_json(patch_version, report_to_healthstore)
 
         # Wrap healthstore summary into healthstore substatus
-        self.__metadata_for_healthstore_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_METADATA_FOR_HEALTHSTORE, status, code, json.dumps(self.__metadata_for_healthstore_summary_json))
+        with self.__status_file_lock:
+            self.__metadata_for_healthstore_substatus_json = self.__new_substatus_json_for_operation(Constants.PATCH_METADATA_FOR_HEALTHSTORE, status, code, json.dumps(self.__metadata_for_healthstore_summary_json))
+            self.__bump_substatus_json_version(Constants.PATCH_METADATA_FOR_HEALTHSTORE)
 
         # Update status on disk
-        self.__write_status_file()
+        self.__write_status_file(force=status != Constants.STATUS_TRANSITIONING or wait_after_update)
 
         # wait period required in cases where we need to ensure HealthStore reads the status from GA
         if wait_after_update:
@@ -447,10 +471,12 @@ class StatusHandler(object):
         self.__configure_patching_summary_json = self.__new_configure_patching_summary_json(automatic_os_patch_state, auto_assessment_state, status, code)
 
         # Wrap configure patching summary into configure patching substatus
-        self.__configure_patching_substatus_json = self.__new_substatus_json_for_operation(Constants.CONFIGURE_PATCHING_SUMMARY, status, code, json.dumps(self.__configure_patching_summary_json))
+        with self.__status_file_lock:
+            self.__configure_patching_substatus_json = self.__new_substatus_json_for_operation(Constants.CONFIGURE_PATCHING_SUMMARY, status, code, json.dumps(self.__configure_patching_summary_json))
+            self.__bump_substatus_json_version(Constants.CONFIGURE_PATCHING_SUMMARY)
 
         # Update status on disk
-        self.__write_status_file()
+        self.__write_status_file(force=status != Constants.STATUS_TRANSITIONING)
 
     def __new_configure_patching_summary_json(self, automatic_os_patch_state, auto_assessment_state, status, code):
         """ Called by: set_configure_patching_substatus_json
@@ -474,6 +500,10 @@ class StatusHandler(object):
             substatus_message["configurePatchStatusString"] = status
         return substatus_message
 
+    def __bump_substatus_json_version(self, substatus_name):
+        """ Marks a substatus as changed, so its cached serialized form is re-encoded at the next status file write """
+        self.__substatus_json_versions[substatus_name] = self.__substatus_json_versions.get(substatus_name, 0) + 1
+
     @staticmethod
     def __new_substatus_json_for_operation(operation_name, status="Transitioning", code=0, message=json.dumps("{}")):
         """ Generic substatus for assessment, installation, configurepatching and healthstore metadata """
@@ -525,15 +555,19 @@ class StatusHandler(object):
         :return: None
         """
 
+        # Persist pending updates first, so they're not lost or overwritten by what's on disk
+        if not initial_load:
+            self.flush_status_file()
+
         # Initializing records safely
         self.__installation_substatus_json = None
         self.__installation_summary_json = None
-        self.__installation_packages = []
+        self.__installation_packages = PatchStore()
         self.__installation_errors = []
 
         self.__assessment_substatus_json = None
         self.__assessment_summary_json = None
-        self.__assessment_packages = []
+        self.__assessment_packages = PatchStore()
         self.__assessment_errors = []
 
         self.__metadata_for_healthstore_substatus_json = None
@@ -544,6 +578,9 @@ class StatusHandler(object):
         self.__configure_patching_errors = []
         self.__configure_patching_auto_assessment_errors = []
 
+        self.__substatus_summaries_to_serialize = {}
+        self.__substatus_json_fragments = {}    # substatuses are replaced with what's on disk below
+
         self.composite_logger.log_debug("Loading status file components [InitialLoad={0}].".format(str(initial_load)))
 
         # Verify the status file exists - if not, reset status file
@@ -586,7 +623,7 @@ class StatusHandler(object):
                 else:
                     message = status_file_data['status']['substatus'][i]['formattedMessage']['message']
                     self.__installation_summary_json = json.loads(message)
-                    self.__installation_packages = self.__installation_summary_json['patches']
+                    self.__installation_packages = PatchStore(self.__installation_summary_json['patches'])
                     self.__maintenance_window_exceeded = bool(self.__installation_summary_json['maintenanceWindowExceeded'])
                     self.__installation_reboot_status = self.__installation_summary_json['rebootStatus']
                     errors = self.__installation_summary_json['errors']
@@ -596,7 +633,7 @@ class StatusHandler(object):
             if name == Constants.PATCH_ASSESSMENT_SUMMARY:     # if it exists, it must be to spec, or an exception will get thrown
                 message = status_file_data['status']['substatus'][i]['formattedMessage']['message']
                 self.__assessment_summary_json = json.loads(message)
-                self.__assessment_packages = self.__assessment_summary_json['patches']
+                self.__assessment_packages = PatchStore(self.__assessment_summary_json['patches'])
                 errors = self.__assessment_summary_json['errors']
                 if errors is not None and errors['details'] is not None:
                     self.__assessment_errors = errors['details']
@@ -618,9 +655,42 @@ class StatusHandler(object):
                         self.__configure_patching_errors = errors['details']
                         self.__configure_patching_top_level_error_count = self.__get_total_error_count_from_prev_status(errors['message'])
 
-    def __write_status_file(self):
+    def __write_status_file(self, force=False):
+        """ Requests a status file write after an in-memory data update in a specialized method (write-behind).
+            The write happens right away if forced, or if the last write was at least status_file_write_interval_in_secs ago.
+            Otherwise, it is deferred to a flush at the end of the interval, coalescing any other updates in between. """
+        with self.__status_file_lock:
+            self.__status_file_dirty = True
+            seconds_since_last_write = time.time() - self.__status_file_last_write_time if self.__status_file_last_write_time is not None else None
+            if force or self.status_file_write_interval_in_secs <= 0 or seconds_since_last_write is None or not (0 <= seconds_since_last_write < self.status_file_write_interval_in_secs):
+                self.flush_status_file()
+            elif self.__status_file_flush_timer is None:
+                self.__status_file_flush_timer = threading.Timer(self.status_file_write_interval_in_secs - seconds_since_last_write, self.__flush_status_file_in_background)
+                self.__status_file_flush_timer.daemon = True
+                self.__status_file_flush_timer.start()
+
+    def flush_status_file(self):
+        """ Synchronously persists any status updates pending in the write-behind. Externally available for process exit. """
+        with self.__status_file_lock:
+            if self.__status_file_flush_timer is not None:
+                self.__status_file_flush_timer.cancel()
+                self.__status_file_flush_timer = None
+            if not self.__status_file_dirty:
+                return
+
+            self.__compose_and_write_status_file()
+            self.__status_file_dirty = False
+            self.__status_file_last_write_time = time.time()
+
+    def __flush_status_file_in_background(self):
+        """ Write-behind flush at the end of an interval. Failures are left for the next write, which retries with the latest data. """
+        try:
+            self.flush_status_file()
+        except Exception as error:
+            self.composite_logger.log_error("Unable to write status file in the background. [Error={0}]".format(repr(error)))
+
+    def __compose_and_write_status_file(self):
         """ Composes and writes the status file from **already up-to-date** in-memory data.
-            This is usually the final call to compose and persist after an in-memory data update in a specialized method.
 
             Pseudo-composition (including steps prior):
             [__new_basic_status_json()]
@@ -653,24 +723,43 @@ class StatusHandler(object):
                             errors
                         errors
 
+            Assessment and installation summaries are serialized into their substatus messages here, once per write instead of once per update.
+            Substatuses are serialized from a per-substatus cache, and only the ones changed since the last write are re-encoded.
+
         :return: None
         """
         status_file_payload = self.__new_basic_status_json()
         status_file_payload['status']['formattedMessage']['message'] = str(self.__high_level_status_message)
 
-        if self.__assessment_substatus_json is not None:
-            status_file_payload['status']['substatus'].append(self.__assessment_substatus_json)
-        if self.__installation_substatus_json is not None:
-            status_file_payload['status']['substatus'].append(self.__installation_substatus_json)
-        if self.__metadata_for_healthstore_substatus_json is not None:
-            status_file_payload['status']['substatus'].append(self.__metadata_for_healthstore_substatus_json)
-        if self.__configure_patching_substatus_json is not None:
-            status_file_payload['status']['substatus'].append(self.__configure_patching_substatus_json)
+        substatus_fragments = []
+        for substatus_json in [self.__assessment_substatus_json, self.__installation_substatus_json, self.__metadata_for_healthstore_substatus_json, self.__configure_patching_substatus_json]:
+            if substatus_json is not None:
+                summary_json = self.__substatus_summaries_to_serialize.pop(substatus_json['name'], None)
+                if summary_json is not None:
+                    substatus_json['formattedMessage']['message'] = str(json.dumps(summary_json))
+                substatus_fragments.append(self.__get_substatus_json_fragment(substatus_json))
         if os.path.isdir(self.status_file_path):
             self.composite_logger.log_error("Core state file path returned a directory. Attempting to reset.")
             shutil.rmtree(self.status_file_path)
 
-        self.env_layer.file_system.write_with_retry_using_temp_file(self.status_file_path, '[{0}]'.format(json.dumps(status_file_payload)), mode='w+')
+        self.env_layer.file_system.write_with_retry_using_temp_file(self.status_file_path, '[{0}]'.format(self.__assemble_status_file_json(status_file_payload, substatus_fragments)), mode='w+')
+
+    def __get_substatus_json_fragment(self, substatus_json):
+        """ Returns the serialized form of a substatus, encoding it only if its version changed since it was last encoded """
+        version = self.__substatus_json_versions.get(substatus_json['name'], 0)
+        cached_version, fragment = self.__substatus_json_fragments.get(substatus_json['name'], (None, None))
+        if cached_version != version:
+            fragment = json.dumps(substatus_json)
+            self.__substatus_json_fragments[substatus_json['name']] = (version, fragment)
+        return fragment
+
+    @staticmethod
+    def __assemble_status_file_json(status_file_payload, substatus_fragments):
+        """ Serializes the basic status json with already serialized substatuses spliced in as its substatus array """
+        status_json = dict((key, value) for key, value in status_file_payload['status'].items() if key != 'substatus')
+        status_fragment = '{0}, "substatus": [{1}]}}'.format(json.dumps(status_json)[:-1], ', '.join(substatus_fragments))
+        root_json = dict((key, value) for key, value in status_file_payload.items() if key != 'status')
+        return '{0}, "status": {1}}}'.format(json.dumps(root_json)[:-1], status_fragment)
     # endregion
 
     # region - Error objects
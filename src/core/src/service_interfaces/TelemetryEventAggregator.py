@@ -0,0 +1,82 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+"""Aggregation of repetitive, high-frequency telemetry events into counted summaries"""
+import collections
+import re
+import time
+from core.src.bootstrap.Constants import Constants
+
+
+class TelemetryEventAggregator(object):
+    """Admits verbose and informational events within a per-template and per-level budget for each time window, and counts the rest into summaries.
+    Errors, warnings and structured (non-string) payloads always pass through untouched."""
+
+    def __init__(self):
+        self.aggregated_event_levels = [Constants.TelemetryEventLevel.Verbose, Constants.TelemetryEventLevel.Informational]
+        self.text_types = (str, type(u""))     # unicode messages are text too (Python 2)
+        self.__window_start_time = time.time()
+        self.__admitted_counts_by_template = {}
+        self.__admitted_counts_by_level = {}
+        self.__aggregated_events = collections.OrderedDict()    # (event level, template) -> [count, task name, last message]
+
+    def try_admit(self, message, event_level, task_name):
+        """ Returns True if the event should be written as is, or False if it was counted into a summary instead """
+        if event_level not in self.aggregated_event_levels or not isinstance(message, self.text_types):
+            return True
+
+        template = self.get_event_template(message)
+        admitted_count_for_template = self.__admitted_counts_by_template.get((event_level, template), 0)
+        admitted_count_for_level = self.__admitted_counts_by_level.get(event_level, 0)
+        if admitted_count_for_template < Constants.TELEMETRY_AGGREGATION_PASS_THROUGH_COUNT_PER_TEMPLATE \
+                and admitted_count_for_level < Constants.TELEMETRY_AGGREGATION_BUDGET_PER_LEVEL.get(event_level, admitted_count_for_level + 1):
+            self.__admitted_counts_by_template[(event_level, template)] = admitted_count_for_template + 1
+            self.__admitted_counts_by_level[event_level] = admitted_count_for_level + 1
+            return True
+
+        aggregated_event = self.__aggregated_events.setdefault((event_level, template), [0, task_name, message])
+        aggregated_event[0] += 1
+        aggregated_event[1] = task_name
+        aggregated_event[2] = message
+        return False
+
+    def pop_summaries(self, force=False):
+        """ Returns the summary events (message, event level, task name) for the current window, and starts a new window, once the window is over or if forced """
+        if not force and time.time() - self.__window_start_time < Constants.TELEMETRY_AGGREGATION_WINDOW_IN_SECS:
+            return []
+
+        summaries = []
+        aggregated_events = list(self.__aggregated_events.items())
+        for (event_level, template), (count, task_name, last_message) in aggregated_events[:Constants.TELEMETRY_AGGREGATION_MAX_SUMMARIES_PER_WINDOW]:
+            summaries.append(("Repeated telemetry events were aggregated. [Count={0}] [Template={1}] [LastMessage={2}]".format(str(count), template, last_message), event_level, task_name))
+        if len(aggregated_events) > Constants.TELEMETRY_AGGREGATION_MAX_SUMMARIES_PER_WINDOW:
+            remaining_count = sum(aggregated_event[0] for key, aggregated_event in aggregated_events[Constants.TELEMETRY_AGGREGATION_MAX_SUMMARIES_PER_WINDOW:])
+            summaries.append(("Repeated telemetry events were aggregated. [Count={0}] [TemplateCount={1}]".format(str(remaining_count), str(len(aggregated_events) - Constants.TELEMETRY_AGGREGATION_MAX_SUMMARIES_PER_WINDOW)), Constants.TelemetryEventLevel.Verbose, Constants.TelemetryTaskName.UNKNOWN))
+
+        self.__window_start_time = time.time()
+        self.__admitted_counts_by_template = {}
+        self.__admitted_counts_by_level = {}
+        self.__aggregated_events = collections.OrderedDict()
+        return summaries
+
+    @staticmethod
+    def get_event_template(message):
+        """ Returns the message with its variable tokens masked, so repetitions of the same log line share a template, while the rest of the line tells them apart.
+        Eg: ' - Inapplicable line: kernel.x86_64 3.10.0-514.el7' and 'Logging progress [Package: bash; Status: Installed]' become ' - Inapplicable line: * *' and 'Logging progress [Package: *; Status: *]' """
+        template = re.sub(r"\[([^\[\]=]+)=[^\[\]]*\]", r"[\1=*]", message)    # [Key=value] -> [Key=*]
+        template = re.sub(r"\[[^\[\]]*\]", lambda match: re.sub(r": [^;|,\[\]]*?(?=\s*[;|,\]])", ": *", match.group(0)), template)    # [Key: value; Key: value] -> [Key: *; Key: *]
+        template = re.sub(r"[^\s\[\]]*[0-9][^\s\[\]]*", "*", template)      # tokens with digits, such as versions, sizes and times -> *
+        return template[:Constants.TELEMETRY_AGGREGATION_TEMPLATE_MAX_LENGTH_IN_CHARS]
@@ -13,6 +13,7 @@
 # limitations under the License.
 #
 # Requires Python 2.7+
+import collections
 import datetime
 import errno
 import json
@@ -20,9 +21,11 @@ import os
 import re
 import shutil
 import tempfile
+import threading
 import time
 
 from core.src.bootstrap.Constants import Constants
+from core.src.service_interfaces.TelemetryEventAggregator import TelemetryEventAggregator
 
 
 class TelemetryWriter(object):
@@ -38,7 +41,27 @@ class TelemetryWriter(object):
         self.events_folder_path = None
         self.__telemetry_event_counter = 1  # will be added at the end of each event sent to telemetry to assist in tracing and identifying event/message loss in telemetry
         self.start_time_for_event_count_throttle_check = datetime.datetime.utcnow()
-        self.event_count = 1
+        self.event_count = 1    # event files written in the current throttle time window
+
+        # Events are queued, already serialized, and written to new event files in batches by a background writer thread, so throttling never holds up the caller.
+        # Sizes are tracked in memory to avoid re-reading the events folder.
+        self.__event_queue_condition = threading.Condition()
+        self.__event_queue = collections.deque()                 # (sequence, event json), in write order
+        self.__event_queue_sequences_by_level = {}              # event level -> sequences of queued events, oldest first, to pick what to drop on overflow
+        self.__pending_event_sizes = {}                         # sequence -> size, for events still to be written (not written or dropped)
+        self.__event_queue_size = 0
+        self.__event_queue_oldest_event_time = None
+        self.__event_sequence = 0
+        self.__dropped_event_counts = {}                        # event level -> events dropped on overflow, reported with the next event file
+        self.__is_flush_requested = False
+        self.__is_event_writer_busy = False
+        self.__event_writer_error = None
+        self.__event_writer_thread = None
+        self.__events_dir_size = None   # measured on first use, then maintained as event files are written
+        self.__last_event_file_timestamp = 0
+
+        # Repetitive verbose and informational events beyond their budgets are counted into summaries instead of being queued one by one
+        self.__event_aggregator = TelemetryEventAggregator()
 
         if self.__get_events_folder_path_exists(events_folder_path):
             self.events_folder_path = events_folder_path
@@ -159,33 +182,196 @@ class TelemetryWriter(object):
             raise
 
     def write_event(self, message, event_level=Constants.TelemetryEventLevel.Informational, task_name=Constants.TelemetryTaskName.UNKNOWN, is_event_file_throttling_needed=True):
-        """ Creates and writes event to event file after validating none of the telemetry size restrictions are breached
+        """ Creates an event after validating none of the telemetry size restrictions are breached, and queues it to be written to an event file in a batch by the background writer.
+        The queue is flushed once it reaches TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS or its oldest event is TELEMETRY_EVENT_QUEUE_MAX_AGE_IN_SECS old, and on flush().
+        Before that, repetitive verbose and informational events are aggregated into counted summaries (see TelemetryEventAggregator), which are queued when their window is over.
+        If the queue exceeds TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS, the oldest events of the least important level are dropped: verbose first, errors last.
         NOTE: is_event_file_throttling_needed is used to determine if event file throttling is required and as such should always be True.
-        The only scenario where this is False is when throttling is taking place and we write to telemetry about it. i.e. only from within __throttle_telemetry_writes_if_required()"""
+        The only scenario where this is False is when throttling is taking place and we write to telemetry about it. i.e. only from within __throttle_telemetry_writes_if_required(). The event is then queued ahead of the batch being throttled."""
         try:
             if not self.is_telemetry_supported() or not Constants.TELEMETRY_ENABLED_AT_EXTENSION:
                 return
 
-            # ensure file throttle limit is reached
-            self.__throttle_telemetry_writes_if_required(is_event_file_throttling_needed)
+            with self.__event_queue_condition:
+                for summary_message, summary_event_level, summary_task_name in self.__event_aggregator.pop_summaries():
+                    self.__queue_new_event(summary_message, summary_event_level, summary_task_name)
 
-            self.__delete_older_events_if_dir_size_limit_not_met()
+                if not is_event_file_throttling_needed or self.__event_aggregator.try_admit(message, event_level, task_name):
+                    self.__queue_new_event(message, event_level, task_name, at_front=not is_event_file_throttling_needed)
 
-            event = self.__new_event_json(event_level, message, task_name)
-            if len(json.dumps(event)) > Constants.TELEMETRY_EVENT_SIZE_LIMIT_IN_CHARS:
-                self.composite_logger.log_telemetry_module_error("Cannot send data to telemetry as it exceeded the acceptable data size. [Data not sent={0}]".format(json.dumps(message)))
-            else:
-                file_path, all_events = self.__get_file_and_content_to_write(self.events_folder_path, event)
-                self.__write_event_using_temp_file(file_path, all_events)
+                if self.__is_event_queue_flush_due():
+                    self.__event_queue_condition.notify_all()
 
         except Exception as e:
             self.composite_logger.log_telemetry_module_error("Error occurred while writing telemetry events. [Error={0}]".format(repr(e)))
             raise Exception("Internal reporting error. Execution could not complete.")
 
+    def flush(self, wait=True, timeout_in_secs=None):
+        """ Requests all queued events to be written to event files. Called at operation boundaries (without waiting) and before a reboot.
+        When waiting, it's for at most timeout_in_secs (by default, long enough to wait out event file throttling). """
+        timeout_in_secs = Constants.TELEMETRY_FLUSH_TIMEOUT_IN_SECS if timeout_in_secs is None else timeout_in_secs
+        try:
+            if not self.is_telemetry_supported() or not Constants.TELEMETRY_ENABLED_AT_EXTENSION:
+                return
+
+            with self.__event_queue_condition:
+                for summary_message, summary_event_level, summary_task_name in self.__event_aggregator.pop_summaries(force=True):
+                    self.__queue_new_event(summary_message, summary_event_level, summary_task_name)
+
+                if len(self.__pending_event_sizes) > 0:
+                    self.__is_flush_requested = True
+                    self.__event_queue_condition.notify_all()
+
+                flush_deadline = time.time() + timeout_in_secs
+                while wait and (len(self.__pending_event_sizes) > 0 or self.__is_event_writer_busy):
+                    time_remaining_in_secs = flush_deadline - time.time()
+                    if time_remaining_in_secs <= 0:
+                        self.composite_logger.log_telemetry_module("Telemetry events are still queued after waiting for them to be written. [QueuedEventCount={0}] [TimeoutInSecs={1}]".format(str(len(self.__pending_event_sizes)), str(timeout_in_secs)))
+                        break
+                    self.__event_queue_condition.wait(time_remaining_in_secs)
+
+                event_writer_error, self.__event_writer_error = self.__event_writer_error, None
+
+            if event_writer_error is not None:
+                raise event_writer_error
+
+        except Exception as e:
+            self.composite_logger.log_telemetry_module_error("Error occurred while flushing telemetry events. [Error={0}]".format(repr(e)))
+            raise Exception("Internal reporting error. Execution could not complete.")
+
+    def close(self, timeout_in_secs=None):
+        """ Writes all queued events, and stops the background writer. Called at exit - events written later start a new background writer. """
+        timeout_in_secs = Constants.TELEMETRY_FLUSH_TIMEOUT_IN_SECS if timeout_in_secs is None else timeout_in_secs
+        try:
+            self.flush(wait=True, timeout_in_secs=timeout_in_secs)
+        finally:
+            with self.__event_queue_condition:
+                event_writer_thread, self.__event_writer_thread = self.__event_writer_thread, None
+                self.__event_queue_condition.notify_all()
+            if event_writer_thread is not None:
+                event_writer_thread.join(timeout_in_secs)
+
+    # region Event queue (callers hold __event_queue_condition)
+    def __queue_new_event(self, message, event_level, task_name, at_front=False):
+        event_json = json.dumps(self.__new_event_json(event_level, message, task_name))
+        if len(event_json) > Constants.TELEMETRY_EVENT_SIZE_LIMIT_IN_CHARS:
+            self.composite_logger.log_telemetry_module_error("Cannot send data to telemetry as it exceeded the acceptable data size. [Data not sent={0}]".format(json.dumps(message)))
+        else:
+            self.__enqueue_event(event_json, event_level, at_front)
+
+    def __enqueue_event(self, event_json, event_level, at_front=False):
+        if len(self.__pending_event_sizes) == 0:
+            self.__event_queue_oldest_event_time = time.time()
+        self.__event_sequence += 1
+        if at_front:
+            self.__event_queue.appendleft((self.__event_sequence, event_json))
+        else:
+            self.__event_queue.append((self.__event_sequence, event_json))
+        self.__event_queue_sequences_by_level.setdefault(event_level, collections.deque()).append(self.__event_sequence)
+        self.__pending_event_sizes[self.__event_sequence] = len(event_json)
+        self.__event_queue_size += len(event_json)
+        self.__telemetry_event_counter += 1
+
+        while self.__event_queue_size > Constants.TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS and len(self.__pending_event_sizes) > 1:
+            self.__drop_least_important_event()
+
+        self.__start_event_writer_if_required()
+
+    def __drop_least_important_event(self):
+        """ Drops the oldest queued event of the least important level present. Dropped events are skipped when dequeued. """
+        for event_level in [Constants.TelemetryEventLevel.Verbose, Constants.TelemetryEventLevel.Informational, Constants.TelemetryEventLevel.Warning, Constants.TelemetryEventLevel.Error, Constants.TelemetryEventLevel.Critical]:
+            sequences = self.__event_queue_sequences_by_level.get(event_level, None)
+            while sequences and sequences[0] not in self.__pending_event_sizes:
+                sequences.popleft()     # already written
+            if sequences:
+                self.__event_queue_size -= self.__pending_event_sizes.pop(sequences.popleft())
+                self.__dropped_event_counts[event_level] = self.__dropped_event_counts.get(event_level, 0) + 1
+                return
+
+    def __is_event_queue_flush_due(self):
+        return len(self.__pending_event_sizes) > 0 and (self.__is_flush_requested or self.__event_queue_size >= Constants.TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS
+                                                        or time.time() - self.__event_queue_oldest_event_time >= Constants.TELEMETRY_EVENT_QUEUE_MAX_AGE_IN_SECS)
+
+    def __dequeue_event_file_batch(self):
+        """ Dequeues the oldest events that fit in one event file (at least one event), led by a summary of any events dropped on overflow """
+        if len(self.__dropped_event_counts) > 0:
+            dropped_event_counts = "".join("[{0}={1}]".format(str(event_level), str(count)) for event_level, count in sorted(self.__dropped_event_counts.items()))
+            self.__dropped_event_counts = {}
+            self.__enqueue_event(json.dumps(self.__new_event_json(Constants.TelemetryEventLevel.Warning, "Telemetry events were dropped as the telemetry queue was full. " + dropped_event_counts, self.__task_name)), Constants.TelemetryEventLevel.Warning, at_front=True)
+
+        event_jsons = []
+        batch_size = 2
+        while len(self.__event_queue) > 0:
+            sequence, event_json = self.__event_queue[0]
+            if sequence not in self.__pending_event_sizes:
+                self.__event_queue.popleft()    # dropped
+                continue
+            if len(event_jsons) > 0 and batch_size + len(event_json) + 2 > Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS:
+                break
+            self.__event_queue.popleft()
+            self.__event_queue_size -= self.__pending_event_sizes.pop(sequence)
+            batch_size += len(event_json) + 2
+            event_jsons.append(event_json)
+
+        self.__event_queue_oldest_event_time = time.time() if len(self.__pending_event_sizes) > 0 else None
+        if len(self.__pending_event_sizes) == 0:
+            self.__is_flush_requested = False
+        return event_jsons
+    # endregion
+
+    # region Background event writer
+    def __start_event_writer_if_required(self):
+        if self.__event_writer_thread is None:
+            self.__event_writer_thread = threading.Thread(target=self.__run_event_writer, name="TelemetryEventWriter")
+            self.__event_writer_thread.daemon = True
+            self.__event_writer_thread.start()
+
+    def __run_event_writer(self):
+        """ Writes queued events to event files whenever a flush is due, until the writer is closed """
+        while True:
+            with self.__event_queue_condition:
+                while not self.__is_event_queue_flush_due() and self.__event_writer_thread is threading.current_thread():
+                    self.__event_queue_condition.wait(self.__get_time_until_event_queue_flush_due())
+                if self.__event_writer_thread is not threading.current_thread():
+                    return
+                self.__is_event_writer_busy = True
+
+            try:
+                # ensure file throttle limit is reached (one event file per batch). Any wait here is only on this thread.
+                self.__throttle_telemetry_writes_if_required()
+
+                self.__delete_older_events_if_dir_size_limit_not_met()
+
+                with self.__event_queue_condition:
+                    event_jsons = self.__dequeue_event_file_batch()
+                self.__write_event_using_temp_file(self.__get_event_file_path(self.events_folder_path), '[{0}]'.format(', '.join(event_jsons)))
+
+            except Exception as e:
+                self.composite_logger.log_telemetry_module_error("Error occurred while writing telemetry events in the background. [Error={0}]".format(repr(e)))
+                with self.__event_queue_condition:
+                    self.__event_writer_error = e
+
+            finally:
+                with self.__event_queue_condition:
+                    self.__is_event_writer_busy = False
+                    self.__event_queue_condition.notify_all()
+
+    def __get_time_until_event_queue_flush_due(self):
+        """ Returns how long the background writer can wait before the oldest queued event is due, or None (until notified) if there are none """
+        if len(self.__pending_event_sizes) == 0:
+            return None
+        return max(0.1, self.__event_queue_oldest_event_time + Constants.TELEMETRY_EVENT_QUEUE_MAX_AGE_IN_SECS - time.time())
+    # endregion
+
     def __delete_older_events_if_dir_size_limit_not_met(self):
         """ Delete older events until the at least one new event file can be added as per the size restrictions """
         try:
-            if self.__get_events_dir_size() < Constants.TELEMETRY_DIR_SIZE_LIMIT_IN_CHARS - Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS:
+            # The in-memory size is an upper bound, as the Guest Agent removes event files as it consumes them. It's refreshed from disk only when it's nearing the limit.
+            if self.__events_dir_size is not None and self.__events_dir_size < Constants.TELEMETRY_DIR_SIZE_LIMIT_IN_CHARS - Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS:
+                return
+
+            self.__events_dir_size = self.__get_events_dir_size()
+            if self.__events_dir_size < Constants.TELEMETRY_DIR_SIZE_LIMIT_IN_CHARS - Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS:
                 # Not deleting any existing event files as the event directory does not exceed max limit. At least one new event file can be added. Not printing this statement as it will add repetitive logs
                 return
 
@@ -205,7 +391,8 @@ class TelemetryWriter(object):
                 except Exception as e:
                     self.composite_logger.log_telemetry_module_error("Error deleting event file. [File={0}] [Exception={1}]".format(repr(event_file), repr(e)))
 
-            if self.__get_events_dir_size() >= Constants.TELEMETRY_DIR_SIZE_LIMIT_IN_CHARS:
+            self.__events_dir_size = self.__get_events_dir_size()
+            if self.__events_dir_size >= Constants.TELEMETRY_DIR_SIZE_LIMIT_IN_CHARS:
                 self.composite_logger.log_telemetry_module_error("Older event files were not deleted. Current event will not be sent to telemetry as events directory size exceeds maximum limit")
                 raise
 
@@ -213,25 +400,6 @@ class TelemetryWriter(object):
             self.composite_logger.log_telemetry_module_error("Error occurred while deleting older telemetry events. [Error={0}]".format(repr(e)))
             raise
 
-    def __get_file_and_content_to_write(self, folder_path, data):
-        """ Identifies the file where the event is to be written. Can be an existing event file or a new one depending upon the size restrictions. If event is to be written to an existing file, fetches retains it's content """
-        try:
-            file_path = self.__get_event_file_path(folder_path)
-            all_events = []
-            if os.path.exists(file_path):
-                file_size = self.get_file_size(file_path)
-                # if file_size exceeds max limit, sleep for 1 second, so the event can be written to a new file since the event file name is a timestamp
-                if file_size >= Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS:
-                    time.sleep(1)
-                    file_path = self.__get_event_file_path(folder_path)
-                else:
-                    all_events = self.__fetch_events_from_previous_file(file_path)  # fetches existing content within the file
-            all_events.append(data)
-            return file_path, all_events
-        except Exception as e:
-            self.composite_logger.log_telemetry_module_error("Error occurred while fetching event file to write the event to. [Error={0}]")
-            raise
-
     def __throttle_telemetry_writes_if_required(self, is_event_file_throttling_needed=True):
         """ Ensures the # of event files that can be written per time unit restriction is met. Returns False if the any updates are required after the restriction enforcement. For eg: file_name is a timestamp and should be modified if a wait is added here.
         NOTE: is_event_file_throttling_needed is used to determine if event file throttling is required and as such should always be True.
@@ -264,14 +432,14 @@ class TelemetryWriter(object):
             self.composite_logger.log_telemetry_module_error("Error occurred while throttling telemetry events. [Error={0}]".format(repr(e)))
             raise
 
-    def __write_event_using_temp_file(self, file_path, all_events, mode='w'):
+    def __write_event_using_temp_file(self, file_path, content, mode='w'):
         """ Writes to a temp file in a single operation and then moves/overrides the original file with the temp """
         try:
             with tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(file_path), delete=False) as tf:
-                json.dump(all_events, tf, default=all_events.__str__())
+                tf.write(content)
                 tempname = tf.name
             shutil.move(tempname, file_path)
-            self.__telemetry_event_counter += 1
+            self.__events_dir_size += len(content)
             self.event_count += 1
         except Exception as error:
             self.composite_logger.log_telemetry_module_error("Unable to write to telemetry. [Event File={0}] [Error={1}].".format(str(file_path), repr(error)))
@@ -293,28 +461,14 @@ class TelemetryWriter(object):
                     raise
         return total_dir_size
 
-    @staticmethod
-    def __get_event_file_path(folder_path):
-        """ Returns the filename, generated from current timestamp in seconds, to be used to write an event. Eg: 1614111606855.json"""
-        return os.path.join(folder_path, str(int(round(time.time() * 1000))) + ".json")
-
-    @staticmethod
-    def get_file_size(file_path):
-        """ Returns the size of a file. Extracted out for mocking in unit test """
-        return os.path.getsize(file_path)
-
-    def __fetch_events_from_previous_file(self, file_path):
-        """ Fetch contents from the file, return empty if file doesn't exist """
-        try:
-            with open(file_path, 'r') as file_handle:
-                file_contents = file_handle.read()
-                return json.loads(file_contents)
-        except OSError as error:
-            if error.errno == errno.ENOENT:
-                return []
-            else:
-                self.composite_logger.log_telemetry_module_error("Error occurred while fetching contents from existing event file. [File={0}] [Error={1}].".format(repr(file_path), repr(error)))
-                raise
+    def __get_event_file_path(self, folder_path):
+        """ Returns the filename, generated from current timestamp in milliseconds, to be used to write a new event file. Eg: 1614111606855.json
+        Each batch goes to a new file, so the timestamp is moved past the last one used (and any existing file) if needed."""
+        event_file_timestamp = max(int(round(time.time() * 1000)), self.__last_event_file_timestamp + 1)
+        while os.path.exists(os.path.join(folder_path, str(event_file_timestamp) + ".json")):
+            event_file_timestamp += 1
+        self.__last_event_file_timestamp = event_file_timestamp
+        return os.path.join(folder_path, str(event_file_timestamp) + ".json")
 
     def set_operation_id(self, operation_id):
         self.__operation_id = operation_id
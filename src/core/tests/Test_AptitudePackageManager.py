@@ -80,6 +80,104 @@ class TestAptitudePackageManager(unittest.TestCase):
         self.assertEqual(package_versions[1], '4.3-14ubuntu1.2')
         self.assertEqual(package_versions[2], '4.3-14ubuntu1')
 
+    def test_classified_updates_snapshot(self):
+        """Unit test for classified update discovery being done once per repo refresh generation"""
+        package_manager = self.container.get('package_manager')
+        simulation_commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_tracked(cmd, no_output=False, chk_err=True):
+            if 'dist-upgrade' in cmd:
+                simulation_commands.append(cmd)
+            return backup_run_command_output(cmd, no_output, chk_err)
+        self.runtime.env_layer.run_command_output = run_command_output_tracked
+
+        # all + security discovered once, everything else served from the snapshot
+        all_packages, all_package_versions = package_manager.get_classified_updates()
+        security_packages, security_package_versions = package_manager.get_classified_updates(Constants.PackageClassification.SECURITY)
+        other_packages, other_package_versions = package_manager.get_other_updates()
+        self.assertEqual(len(simulation_commands), 2)
+        self.assertEqual(len(all_packages), 3)
+        self.assertEqual(len(security_packages) + len(other_packages), len(all_packages))
+        self.assertEqual(len(other_packages), len(other_package_versions))
+
+        # callers receive copies and can't corrupt the snapshot
+        all_packages.pop()
+        self.assertEqual(len(package_manager.get_classified_updates()[0]), 3)
+        self.assertEqual(len(simulation_commands), 2)
+
+        # a repo refresh starts a new generation
+        package_manager.refresh_repo()
+        package_manager.get_classified_updates()
+        self.assertEqual(len(simulation_commands), 4)
+
+        # so does an actual install (but not a simulated one)
+        package_manager.install_update_and_dependencies('python-samba', '2:4.4.5+dfsg-2ubuntu5.4', simulate=True)
+        package_manager.get_classified_updates()
+        self.assertEqual(len(simulation_commands), 4)
+        package_manager.install_update_and_dependencies('python-samba', '2:4.4.5+dfsg-2ubuntu5.4', simulate=False)
+        package_manager.get_classified_updates()
+        self.assertEqual(len(simulation_commands), 6)
+
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+    def test_extract_packages_and_versions_streamed(self):
+        """Unit test for upgrade simulation output being parsed line by line as the command runs"""
+        package_manager = self.container.get('package_manager')
+        output = "Inst bash [4.3-14ubuntu1.2] (4.3-14ubuntu1.3 Ubuntu:16.04/xenial-updates [amd64])\n" \
+                 "Inst sudo [1.8.16-0ubuntu1.5] (1.8.16-0ubuntu1.6 Ubuntu:16.04/xenial-security [amd64])\n" \
+                 "The following packages could receive security updates with UA Infra: ESM service enabled:\n" \
+                 "  libgcab-1.0-0 libgsf-1-114\n" \
+                 "Learn more about UA Infra: ESM service at https://ubuntu.com/esm\n"
+        packages, package_versions = package_manager.extract_packages_and_versions(output)
+        self.assertEqual(packages, ['bash', 'sudo', 'libgcab-1.0-0', 'libgsf-1-114'])
+        self.assertEqual(package_versions, ['4.3-14ubuntu1.3', '1.8.16-0ubuntu1.6', Constants.UA_ESM_REQUIRED, Constants.UA_ESM_REQUIRED])
+
+        # the line after the marker is not an ESM package list if it's the last line
+        packages, package_versions = package_manager.extract_packages_and_versions(output.rsplit("Learn more", 1)[0] + "\n\n")
+        self.assertEqual(packages, ['bash', 'sudo'])
+
+        # streamed output is only kept as a bounded excerpt
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+        self.runtime.env_layer.run_command_output = lambda cmd, no_output=False, chk_err=True: (0, output * 1000)
+        parser = package_manager.UpgradeSimulationParser(package_manager.ESM_MARKER)
+        out, code = package_manager.invoke_package_manager_advanced("sudo apt-get -s dist-upgrade", line_handlers=[parser.parse_line])
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+        self.assertEqual(len(parser.get_packages_and_versions()[0]), 2000 + 2)
+        self.assertTrue(len(out) < len(output) * 1000)
+        self.assertTrue("...[OmittedLines=" in out)
+
+    def test_get_all_available_versions_of_packages(self):
+        """Unit test for batched available version lookups"""
+        package_manager = self.container.get('package_manager')
+        commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_madison(cmd, no_output=False, chk_err=True):
+            commands.append(cmd)
+            if cmd == 'apt-cache madison bash samba-libs':
+                return 0, "      bash | 4.3-14ubuntu1.3 | http://us.archive.ubuntu.com/ubuntu xenial-updates/main amd64 Packages\n" \
+                          "      bash | 4.3-14ubuntu1 | http://us.archive.ubuntu.com/ubuntu xenial/main amd64 Packages\n" \
+                          "samba-libs | 2:4.4.5+dfsg-2ubuntu5.4 | http://us.archive.ubuntu.com/ubuntu xenial-updates/main amd64 Packages\n"
+            return 0, ""
+        self.runtime.env_layer.run_command_output = run_command_output_madison
+
+        versions_by_package = package_manager.get_all_available_versions_of_packages(['bash', 'samba-libs'])
+        self.assertEqual(commands, ['apt-cache madison bash samba-libs'])
+        self.assertEqual(versions_by_package['bash'], ['4.3-14ubuntu1.3', '4.3-14ubuntu1'])
+        self.assertEqual(versions_by_package['samba-libs'], ['2:4.4.5+dfsg-2ubuntu5.4'])
+
+        # packages not attributable in the batch output are looked up on their own (the identical lookup is served from memory)
+        versions_by_package = package_manager.get_all_available_versions_of_packages(['not-available'])
+        self.assertEqual(versions_by_package['not-available'], [])
+        self.assertEqual(commands[1:], ['apt-cache madison not-available'])
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+        # batches stay under the length limit
+        batches = package_manager.get_package_name_batches(['package' + str(i) for i in range(0, 10)], max_batch_length_in_chars=30)
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+        self.assertEqual(sum(batches, []), ['package' + str(i) for i in range(0, 10)])
+
     def test_install_package_success(self):
         self.runtime.set_legacy_test_type('SuccessInstallPath')
 
@@ -99,6 +197,38 @@ class TestAptitudePackageManager(unittest.TestCase):
         self.assertEqual(package_manager.is_package_version_installed('mysql-server', '5.7.25-0ubuntu0.16.04.2'), True)
         self.assertEqual(package_manager.is_package_version_installed('mysql-client', '5.7.25-0ubuntu0.16.04.2'), False)
 
+    def test_is_installed_check_with_dpkg_status_index(self):
+        package_manager = self.container.get('package_manager')
+        package_manager.dpkg_status_file_path = os.path.join(self.runtime.execution_config.temp_folder, "dpkg-status")
+        dpkg_status = "Package: mysql-server\nStatus: install ok installed\nPriority: optional\nArchitecture: all\nVersion: 5.7.25-0ubuntu0.16.04.2\n" \
+                      "Description: MySQL database server\n mysql-server: 5.7.25\n\n" \
+                      "Package: mysql-client\nStatus: deinstall ok config-files\nArchitecture: amd64\nVersion: 5.7.25-0ubuntu0.16.04.2\n\n" \
+                      "Package: libc6\nStatus: install ok installed\nArchitecture: i386\nVersion: 2.23-0ubuntu11\n"
+        self.runtime.write_to_file(package_manager.dpkg_status_file_path, dpkg_status)
+
+        # no process is invoked when the index is available
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+        self.runtime.env_layer.run_command_output = None
+        self.assertTrue(package_manager.is_package_version_installed('mysql-server', '5.7.25-0ubuntu0.16.04.2'))
+        self.assertFalse(package_manager.is_package_version_installed('mysql-server', '5.7.24-0ubuntu0.16.04.1'))
+        self.assertFalse(package_manager.is_package_version_installed('mysql-client', '5.7.25-0ubuntu0.16.04.2'))
+        self.assertFalse(package_manager.is_package_version_installed('bash', '4.3-14ubuntu1.3'))
+        self.assertTrue(package_manager.is_package_version_installed('libc6:i386', '2.23-0ubuntu11'))
+
+        # reloaded only when the status file changes
+        index = package_manager.dpkg_status_index
+        self.assertTrue(package_manager.refresh_dpkg_status_index_if_changed())
+        self.assertTrue(package_manager.dpkg_status_index is index)
+        self.runtime.write_to_file(package_manager.dpkg_status_file_path, dpkg_status + "\nPackage: bash\nStatus: install ok installed\nVersion: 4.3-14ubuntu1.3\n")
+        self.assertTrue(package_manager.is_package_version_installed('bash', '4.3-14ubuntu1.3'))
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+        # falls back to dpkg and apt when the status file is unavailable
+        os.remove(package_manager.dpkg_status_file_path)
+        self.runtime.set_legacy_test_type('SuccessInstallPath')
+        self.assertTrue(package_manager.is_package_version_installed('mysql-server', '5.7.25-0ubuntu0.16.04.2'))
+        self.assertIsNone(package_manager.dpkg_status_index)
+
     def test_install_package_failure(self):
         self.runtime.set_legacy_test_type('FailInstallPath')
 
@@ -122,6 +252,39 @@ class TestAptitudePackageManager(unittest.TestCase):
         self.assertTrue(error_msg in str(json.loads(substatus_file_data["formattedMessage"]["message"])["errors"]["details"]))
         self.assertEqual(substatus_file_data["name"], Constants.PATCH_INSTALLATION_SUMMARY)
 
+    def test_install_package_deadline_exceeded(self):
+        package_manager = self.container.get('package_manager')
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+        timeouts_in_secs = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_timed_out(cmd, no_output=False, chk_err=True, timeout_in_secs=None, is_kill_allowed=True):
+            timeouts_in_secs.append((timeout_in_secs, is_kill_allowed))
+            if 'bash=4.3-14ubuntu1.3' not in cmd:
+                return backup_run_command_output(cmd, no_output, chk_err)
+            return Constants.COMMAND_TIMED_OUT_RETURN_CODE, "Unpacking bash (4.3-14ubuntu1.3) over (4.3-14ubuntu1.2) ..."
+        self.runtime.env_layer.run_command_output = run_command_output_timed_out
+
+        class MockMaintenanceWindow(object):
+            def get_remaining_time_in_minutes(self):
+                return Constants.REBOOT_BUFFER_IN_MINUTES + 10
+        package_manager.set_maintenance_window(MockMaintenanceWindow())
+
+        # simulations have to leave the reboot buffer
+        self.assertEqual(package_manager.install_update_and_dependencies('bash', '4.3-14ubuntu1.3', simulate=True), Constants.FAILED)
+        self.assertEqual(timeouts_in_secs[0], (600, True))
+
+        # installs get the full remaining window, and are never killed
+        self.assertEqual(package_manager.install_update_and_dependencies('bash', '4.3-14ubuntu1.3'), Constants.FAILED)
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+        self.assertTrue(((Constants.REBOOT_BUFFER_IN_MINUTES + 10) * 60, False) in timeouts_in_secs)
+        self.assertFalse(package_manager.is_install_transaction_in_progress)
+
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+        error_details = json.loads(substatus_file_data["formattedMessage"]["message"])["errors"]["details"]
+        self.assertTrue(Constants.PatchOperationErrorCodes.COMMAND_DEADLINE_EXCEEDED in [error_detail["code"] for error_detail in error_details])
+
     def test_install_package_only_upgrades(self):
         self.runtime.set_legacy_test_type('FailInstallPath')
 
@@ -349,6 +512,100 @@ class TestAptitudePackageManager(unittest.TestCase):
         self.runtime.env_layer.file_system.write_with_retry = self.mock_write_with_retry_raise_exception
         self.assertRaises(Exception, package_manager.update_os_patch_configuration_sub_setting)
 
+    def test_refresh_repo_skipped_when_recent(self):
+        """Unit test for repo refresh freshness tracking across runs"""
+        package_manager = self.container.get('package_manager')
+        sources_list_path = os.path.join(self.runtime.execution_config.temp_folder, "sources.list")
+        package_manager.repo_source_paths = [sources_list_path]
+        refresh_commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_refresh(cmd, no_output=False, chk_err=True):
+            if cmd == package_manager.repo_refresh:
+                refresh_commands.append(cmd)
+            return backup_run_command_output(cmd, no_output, chk_err)
+        self.runtime.env_layer.run_command_output = run_command_output_refresh
+
+        package_manager.refresh_repo()
+        package_manager.refresh_repo()
+        self.assertEqual(len(refresh_commands), 1)
+        self.assertTrue(os.path.isfile(os.path.join(self.runtime.execution_config.config_folder, Constants.REPO_REFRESH_RECORD_FILE)))
+
+        # forced refreshes always happen
+        package_manager.refresh_repo(force=True)
+        self.assertEqual(len(refresh_commands), 2)
+
+        # as do refreshes after sources change
+        with open(sources_list_path, 'w') as sources_list:
+            sources_list.write("deb http://azure.archive.ubuntu.com/ubuntu/ focal-security main")
+        package_manager.refresh_repo()
+        package_manager.refresh_repo()
+        self.assertEqual(len(refresh_commands), 3)
+
+        # or after the TTL
+        backup_repo_refresh_ttl = Constants.REPO_REFRESH_TTL_IN_SECS
+        Constants.REPO_REFRESH_TTL_IN_SECS = 0
+        try:
+            package_manager.refresh_repo()
+            self.assertEqual(len(refresh_commands), 4)
+        finally:
+            Constants.REPO_REFRESH_TTL_IN_SECS = backup_repo_refresh_ttl
+
+        # unreadable records are ignored
+        with open(package_manager.repo_refresh_record.record_file_path, 'w') as record_file:
+            record_file.write("{corrupt")
+        package_manager.refresh_repo()
+        self.assertEqual(len(refresh_commands), 5)
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+    def test_dependency_resolution_errors_are_raised_on_lookup_without_resolving_again(self):
+        package_manager = self.container.get('package_manager')
+        resolved_packages = []
+
+        def get_dependent_list_failing(package_name):
+            resolved_packages.append(package_name)
+            raise Exception("Simulation failed", "[{0}]".format(Constants.ERROR_ADDED_TO_STATUS))
+        package_manager.get_dependent_list = get_dependent_list_failing
+
+        package_manager.build_dependency_graph(["git", "bash"])
+        package_manager.build_dependency_graph(["git"])
+        self.assertFalse(package_manager.is_in_dependency_graph("git"))
+        self.assertRaises(Exception, package_manager.get_dependencies_from_graph, "git")
+        self.assertEqual(resolved_packages, ["git", "bash"])
+
+    def test_install_update_batch_package_manager_issues(self):
+        self.runtime.set_legacy_test_type('FailInstallPath')
+        package_manager = self.container.get('package_manager')
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+        package_manager.is_package_version_installed = lambda package_name, package_version: False
+
+        # batches are invoked like any other install, so an unhealthy package manager is detected and reported
+        self.assertEqual(package_manager.install_update_batch(['force-dpkg-failure'], ['1.0'], ['force-dpkg-failure'], ['1.0']), [])
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+        self.assertTrue('sudo dpkg --configure -a' in str(json.loads(substatus_file_data["formattedMessage"]["message"])["errors"]["details"]))
+
+    def test_get_package_size_in_batch(self):
+        package_manager = self.container.get('package_manager')
+        output = "Need to get 1,443 kB of archives.\n" + \
+                 "Get:1 http://azure.archive.ubuntu.com/ubuntu bionic-updates/main amd64 git-man all 1:2.17.1-1ubuntu0.16 [804 kB]\n" + \
+                 "Get:2 http://azure.archive.ubuntu.com/ubuntu bionic-updates/main amd64 git amd64 1:2.17.1-1ubuntu0.16 [639 kB]\n"
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "git"), "639 kB")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "git-man"), "804 kB")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "bash"), Constants.UNKNOWN_PACKAGE_SIZE)
+
+    def test_parse_package_journal_line(self):
+        package_manager = self.container.get('package_manager')
+        entry = package_manager.parse_package_journal_line("2023-06-20 10:15:52 status installed git-man:all 1:2.17.1-1ubuntu0.16")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.INSTALLED, "git-man", "1:2.17.1-1ubuntu0.16"))
+        entry = package_manager.parse_package_journal_line("2023-06-20 10:16:03 status not-installed libfoo1:amd64 <none>")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.REMOVED, "libfoo1", None))
+
+        # only final package states are entries
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20 10:15:50 upgrade bash:amd64 5.0-6ubuntu1.1 5.0-6ubuntu1.2"), None)
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20 10:15:51 status half-configured bash:amd64 5.0-6ubuntu1.2"), None)
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20 10:15:49 startup packages configure"), None)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import unittest
+
+from core.src.bootstrap.Constants import Constants
+from core.src.local_loggers.CompositeLogger import CompositeLogger
+
+
+class MockFileLogger(object):
+    def __init__(self):
+        self.messages = []
+
+    def write(self, message, fail_silently=True):
+        self.messages.append(message)
+
+
+class TestCompositeLogger(unittest.TestCase):
+    def setUp(self):
+        self.evaluation_count = 0
+
+    def tearDown(self):
+        pass
+
+    def __get_expensive_message(self):
+        self.evaluation_count += 1
+        return "Output from package manager: \n|\t" + "\n|\t".join(["line1", "line2"])
+
+    def test_deferred_messages_are_formatted_for_accepting_sinks(self):
+        file_logger = MockFileLogger()
+        composite_logger = CompositeLogger(file_logger=file_logger, current_env=Constants.PROD)
+
+        composite_logger.log_debug("Package filtered out. [Package={0}][Version={1}]", "bash", "4.3-14")
+        composite_logger.log_verbose(self.__get_expensive_message)
+        composite_logger.log_debug("Braces are left alone without args. {0}")
+
+        self.assertEqual(self.evaluation_count, 1)
+        self.assertEqual(file_logger.messages[0], "\n\tDEBUG: Package filtered out. [Package=bash][Version=4.3-14]")
+        self.assertEqual(file_logger.messages[1], "\n\tVERBOSE: Output from package manager: \n\t|\tline1\n\t|\tline2")
+        self.assertEqual(file_logger.messages[2], "\n\tDEBUG: Braces are left alone without args. {0}")
+
+    def test_deferred_messages_are_not_evaluated_without_accepting_sinks(self):
+        composite_logger = CompositeLogger(file_logger=None, current_env=Constants.PROD)
+
+        composite_logger.log_debug(self.__get_expensive_message)
+        composite_logger.log_verbose(self.__get_expensive_message)
+        composite_logger.log(self.__get_expensive_message)
+        composite_logger.log_debug("Inapplicable line: {0}", "not evaluated")
+
+        self.assertEqual(self.evaluation_count, 0)
+
+    def test_deferred_messages_are_not_evaluated_for_sinks_not_taking_their_level(self):
+        file_logger = MockFileLogger()
+        composite_logger = CompositeLogger(file_logger=file_logger, current_env=Constants.PROD)
+
+        backup_log_file_debug_enabled = Constants.LOG_FILE_DEBUG_ENABLED
+        Constants.LOG_FILE_DEBUG_ENABLED = False
+        try:
+            composite_logger.log_debug(self.__get_expensive_message)
+            composite_logger.log_verbose(self.__get_expensive_message)
+            composite_logger.log_debug("Inapplicable line: {0}", "not evaluated")
+        finally:
+            Constants.LOG_FILE_DEBUG_ENABLED = backup_log_file_debug_enabled
+
+        self.assertEqual(self.evaluation_count, 0)
+        self.assertEqual(file_logger.messages, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.bootstrap.EnvLayer import EnvLayer
+
+
+class TestEnvLayer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.env_layer = EnvLayer(real_record_path=os.path.join(self.temp_dir, "test.core.rec"))
+        self.handled_pids = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_run_command_output(self):
+        self.assertEqual(self.env_layer.run_command_output("printf 'line1\\nline2\\n'", False, False), (0, "line1\nline2\n"))
+        self.assertEqual(self.env_layer.run_command_output("echo failed 1>&2; exit 3", False, False), (3, "failed\n"))
+        self.assertEqual(self.env_layer.run_command_output("exit 0", True, False), (0, None))
+
+    def test_run_command_output_streaming(self):
+        handled_lines = []
+        output_stream = self.env_layer.run_command_output_streaming("printf 'line1\\nline2\\nline3'; exit 2", line_handlers=[handled_lines.append])
+        self.assertEqual(output_stream.return_code, None)    # nothing runs until the stream is consumed
+
+        self.assertEqual(list(output_stream), ["line1", "line2", "line3"])
+        self.assertEqual(handled_lines, ["line1", "line2", "line3"])
+        self.assertEqual(output_stream.return_code, 2)
+        self.assertFalse(output_stream.is_truncated)
+
+    def test_run_command_output_streaming_output_size_cap(self):
+        handled_lines = []
+        output_stream = self.env_layer.run_command_output_streaming("seq 1 1000", line_handlers=[handled_lines.append], max_output_size_in_chars=10)
+
+        self.assertEqual(output_stream.consume(), 0)
+        self.assertEqual(handled_lines, ["1", "2", "3", "4", "5"])
+        self.assertTrue(output_stream.is_truncated)
+        self.assertEqual(output_stream.output_size, len("\n".join(str(i) for i in range(1, 1001))) + 1)
+
+    def test_run_command_output_timeout(self):
+        backup_grace_period = Constants.COMMAND_TERMINATION_GRACE_PERIOD_IN_SECS
+        Constants.COMMAND_TERMINATION_GRACE_PERIOD_IN_SECS = 0.2
+        try:
+            start_time = time.time()
+            self.assertEqual(self.env_layer.run_command_output("echo started; sleep 30", False, False, timeout_in_secs=0.2), (Constants.COMMAND_TIMED_OUT_RETURN_CODE, "started\n"))
+
+            # commands ignoring termination are killed after the grace period, along with their children
+            self.assertEqual(self.env_layer.run_command_output("trap '' TERM; sleep 30; echo done", False, False, timeout_in_secs=0.2)[0], Constants.COMMAND_TIMED_OUT_RETURN_CODE)
+
+            output_stream = self.env_layer.run_command_output_streaming("echo started; sleep 30", timeout_in_secs=0.2)
+            self.assertEqual(list(output_stream), ["started"])
+            self.assertEqual(output_stream.return_code, Constants.COMMAND_TIMED_OUT_RETURN_CODE)
+            self.assertTrue(time.time() - start_time < 10)
+
+            # commands that mustn't be killed are only asked to terminate
+            self.assertEqual(self.env_layer.run_command_output("trap 'echo terminated; exit 1' TERM; sleep 30 & wait", False, False, timeout_in_secs=0.2, is_kill_allowed=False), (Constants.COMMAND_TIMED_OUT_RETURN_CODE, "terminated\n"))
+
+            # commands completing in time are unaffected
+            self.assertEqual(self.env_layer.run_command_output("exit 3", False, False, timeout_in_secs=5), (3, ""))
+        finally:
+            Constants.COMMAND_TERMINATION_GRACE_PERIOD_IN_SECS = backup_grace_period
+
+    def test_run_command_output_streaming_abandoned(self):
+        def fail_on_line(line):
+            raise Exception("Line handler failure")
+
+        # a command whose output is abandoned is killed and reaped, instead of being left running
+        start_time = time.time()
+        output_stream = self.env_layer.run_command_output_streaming("echo $$; sleep 30", line_handlers=[self.handled_pids.append, fail_on_line])
+        self.assertRaises(Exception, output_stream.consume)
+        self.assertRaises(OSError, os.kill, int(self.handled_pids[0]), 0)
+
+        output_stream = self.env_layer.run_command_output_streaming("echo $$; sleep 30", line_handlers=[self.handled_pids.append])
+        for line in output_stream:
+            break
+        self.assertRaises(OSError, os.kill, int(self.handled_pids[1]), 0)
+        self.assertTrue(time.time() - start_time < 10)
+
+    def test_command_output_stream_from_output(self):
+        output_stream = EnvLayer.CommandOutputStream.from_output(100, "Inst bash [4.3-14] (4.3-15 Ubuntu:16.04/xenial-updates [amd64])\nConf bash")
+        self.assertEqual(list(output_stream), ["Inst bash [4.3-14] (4.3-15 Ubuntu:16.04/xenial-updates [amd64])", "Conf bash"])
+        self.assertEqual(output_stream.return_code, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import os
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.local_loggers.FileLogger import FileLogger
+from core.tests.library.ArgumentComposer import ArgumentComposer
+from core.tests.library.RuntimeCompositor import RuntimeCompositor
+
+
+class TestFileLogger(unittest.TestCase):
+    def setUp(self):
+        self.runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True)
+        self.log_file_path = os.path.join(self.runtime.execution_config.temp_folder, "buffered.core.log")
+        self.file_logger = FileLogger(self.runtime.env_layer, self.log_file_path, buffered=True)
+        self.fsync_count = 0
+        self.backup_os_fsync = os.fsync
+
+    def tearDown(self):
+        os.fsync = self.backup_os_fsync
+        self.file_logger.close(message_at_close=None)
+        self.runtime.stop()
+
+    def mock_os_fsync(self, fd):
+        self.fsync_count += 1
+
+    def read_log_file(self):
+        with open(self.log_file_path, 'r') as log_file:
+            return log_file.read()
+
+    def test_buffered_writes_are_flushed_in_order_without_fsync(self):
+        os.fsync = self.mock_os_fsync
+        for i in range(0, 100):
+            self.file_logger.write("\nLine " + str(i))
+        self.file_logger.flush()
+
+        self.assertEqual(self.read_log_file(), "".join("\nLine " + str(i) for i in range(0, 100)))
+        self.assertEqual(self.fsync_count, 0)
+
+        self.file_logger.flush(durable=True)
+        self.assertEqual(self.fsync_count, 1)
+
+    def test_buffered_writes_are_not_lost_on_close(self):
+        os.fsync = self.mock_os_fsync
+        self.file_logger.write("\nBefore close")
+        self.file_logger.close(message_at_close="\n<End of output>")
+
+        self.assertEqual(self.read_log_file(), "\nBefore close\n<End of output>")
+        self.assertEqual(self.fsync_count, 1)
+
+        self.file_logger.write("\nAfter close")     # no-op, same as unbuffered mode
+        self.assertEqual(self.read_log_file(), "\nBefore close\n<End of output>")
+
+    def test_buffered_writes_beyond_capacity_are_written_by_caller(self):
+        backup_capacity = Constants.FILE_LOGGER_BUFFER_CAPACITY_IN_CHARS
+        Constants.FILE_LOGGER_BUFFER_CAPACITY_IN_CHARS = 50
+        try:
+            for i in range(0, 10):
+                self.file_logger.write("\nLine " + str(i))
+
+            self.assertTrue(self.read_log_file().startswith("\nLine 0\nLine 1\nLine 2\nLine 3\nLine 4\nLine 5\nLine 6"))
+        finally:
+            Constants.FILE_LOGGER_BUFFER_CAPACITY_IN_CHARS = backup_capacity
+
+
+if __name__ == '__main__':
+    unittest.main()
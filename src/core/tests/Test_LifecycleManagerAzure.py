@@ -33,13 +33,19 @@ class TestLifecycleManagerAzure(unittest.TestCase):
         # No change in Extension sequence number
         self.lifecycle_manager.lifecycle_status_check()
 
-        # Extension sequence number changed
+        # Extension sequence number changed - queued telemetry is persisted before exiting
+        telemetry_writer_close_calls = []
+        backup_telemetry_writer_close = self.lifecycle_manager.telemetry_writer.close
+        self.lifecycle_manager.telemetry_writer.close = lambda *args, **kwargs: telemetry_writer_close_calls.append(True) or backup_telemetry_writer_close(*args, **kwargs)
+
         old_core_sequence_json = self.lifecycle_manager.read_core_sequence()
         self.runtime.execution_config.sequence_number = 2
         with self.assertRaises(SystemExit):
             self.lifecycle_manager.lifecycle_status_check()
         new_core_sequence_json = self.lifecycle_manager.read_core_sequence()
         self.assertNotEqual(old_core_sequence_json["completed"], new_core_sequence_json["completed"])
+        self.assertEqual(len(telemetry_writer_close_calls), 1)
+        self.lifecycle_manager.telemetry_writer.close = backup_telemetry_writer_close
 
     def test_read_extension_sequence_fail(self):
         old_ext_state_file_path = self.lifecycle_manager.ext_state_file_path
@@ -16,6 +16,8 @@
 
 import datetime
 import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.core_logic.InstallDurationHistory import InstallDurationHistory
 from core.tests.library.ArgumentComposer import ArgumentComposer
 from core.tests.library.RuntimeCompositor import RuntimeCompositor
 
@@ -107,5 +109,54 @@ class TestMaintenanceWindow(unittest.TestCase):
         self.assertRaises(Exception, runtime.maintenance_window.get_percentage_maintenance_window_used)
         runtime.stop()
 
+    def test_install_duration_history_predicts_install_time(self):
+        runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True)
+        maintenance_window = runtime.maintenance_window
+
+        # without history, the fixed maximum applies to every package, and estimates are defaults
+        self.assertEqual(maintenance_window.get_expected_max_install_time_in_minutes(["bash"]), Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES)
+        self.assertEqual(maintenance_window.get_expected_install_duration_in_secs(["bash", "linux-image-azure"]), Constants.PACKAGE_INSTALL_DEFAULT_EXPECTED_TIME_IN_SECS + Constants.PACKAGE_INSTALL_LONG_EXPECTED_TIME_IN_SECS)
+
+        # estimates are from the durations recorded at the latest package size
+        maintenance_window.record_package_install_duration("bash", "1,000 kB", 100)
+        maintenance_window.record_package_install_duration("bash", "2,000 kB", 60)
+        maintenance_window.record_package_install_duration("bash", "2,000 kB", 80)
+        self.assertEqual(maintenance_window.get_expected_package_install_duration_in_secs("bash"), 70)
+        self.assertEqual(maintenance_window.get_expected_max_install_time_in_minutes(["bash"]), 70 * Constants.PACKAGE_INSTALL_DURATION_SAFETY_FACTOR / 60)
+        self.assertEqual(maintenance_window.get_expected_max_install_time_in_minutes(["bash", "git"]), Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES)
+
+        # a package with short installs fits where the fixed maximum wouldn't
+        remaining_time_in_minutes = Constants.REBOOT_BUFFER_IN_MINUTES + 2
+        self.assertTrue(maintenance_window.is_package_install_time_available(remaining_time_in_minutes, ["bash"]))
+        self.assertFalse(maintenance_window.is_package_install_time_available(remaining_time_in_minutes, ["git"]))
+
+        # history persists across runs, and unreadable lines are skipped
+        runtime.env_layer.file_system.write_with_retry(maintenance_window.install_duration_history.history_file_path, "{\"name\": \"bash\", \"si", mode='a+')
+        install_duration_history = InstallDurationHistory(runtime.env_layer, runtime.composite_logger, maintenance_window.install_duration_history.history_file_path)
+        self.assertEqual(install_duration_history.get_expected_install_duration_in_secs("bash"), 70)
+        runtime.stop()
+
+    def test_install_duration_history_compaction(self):
+        runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True)
+        history_file_path = runtime.maintenance_window.install_duration_history.history_file_path
+        backup_max_entry_count = Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT
+        Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT = 30
+        try:
+            install_duration_history = InstallDurationHistory(runtime.env_layer, runtime.composite_logger, history_file_path)
+            for i in range(0, 25):
+                install_duration_history.record("bash", "1,000 kB", i)
+            for i in range(0, 6):
+                install_duration_history.record("package" + str(i), "10 kB", 10)
+
+            # only the most recent entries per package and size are kept
+            with open(history_file_path, 'r') as file_handle:
+                self.assertEqual(len(file_handle.readlines()), Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT_PER_PACKAGE + 6)
+            self.assertEqual(InstallDurationHistory(runtime.env_layer, runtime.composite_logger, history_file_path).get_expected_install_duration_in_secs("bash"), 22)
+            self.assertEqual(install_duration_history.get_expected_install_duration_in_secs("bash"), 22)
+        finally:
+            Constants.INSTALL_DURATION_HISTORY_MAX_ENTRY_COUNT = backup_max_entry_count
+        runtime.stop()
+
+
 if __name__ == '__main__':
     unittest.main()
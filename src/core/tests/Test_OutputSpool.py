@@ -0,0 +1,72 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import glob
+import os
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.OutputSpool import OutputSpool
+from core.tests.library.ArgumentComposer import ArgumentComposer
+from core.tests.library.RuntimeCompositor import RuntimeCompositor
+
+
+class TestOutputSpool(unittest.TestCase):
+    def setUp(self):
+        self.runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True, Constants.APT)
+        self.spool_folder = self.runtime.execution_config.temp_folder
+        self.output_spool = OutputSpool(self.runtime.env_layer, self.runtime.composite_logger, self.spool_folder)
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def get_spool_files(self):
+        return sorted(glob.glob(os.path.join(self.spool_folder, "*." + Constants.OUTPUT_SPOOL_FILE_EXTENSION)))
+
+    def test_small_output_is_not_spooled(self):
+        spooled_output = self.output_spool.spool("Reading package lists... Done", "sudo apt-get -s dist-upgrade")
+        self.assertFalse(spooled_output.is_spooled())
+        self.assertEqual(spooled_output.excerpt, "Reading package lists... Done")
+        self.assertEqual(len(self.get_spool_files()), 0)
+
+    def test_large_output_is_spooled_once_with_excerpt(self):
+        output = "\n".join("Inst package{0} [1.0] (1.1 Ubuntu:20.04/focal-updates [amd64])".format(str(i)) for i in range(0, 2000))
+        spooled_output = self.output_spool.spool(output, "sudo apt-get -s dist-upgrade")
+
+        self.assertTrue(spooled_output.is_spooled())
+        self.assertEqual(spooled_output.length, len(output))
+        self.assertTrue(spooled_output.excerpt.startswith(output[:Constants.OUTPUT_SPOOL_EXCERPT_HEAD_IN_CHARS]))
+        self.assertTrue(spooled_output.excerpt.endswith(output[-Constants.OUTPUT_SPOOL_EXCERPT_TAIL_IN_CHARS:]))
+        self.assertTrue(spooled_output.spool_file_path in spooled_output.excerpt)
+        self.assertTrue(len(spooled_output.excerpt) < len(output))
+        with open(spooled_output.spool_file_path, 'r') as spool_file:
+            self.assertEqual(spool_file.read(), "Command: sudo apt-get -s dist-upgrade\n\n" + output)
+
+        # the same output is referenced, not spooled again
+        self.assertTrue(self.output_spool.spool(output) is spooled_output)
+        self.assertEqual(len(self.get_spool_files()), 1)
+
+    def test_old_spool_files_are_removed(self):
+        backup_max_file_count = Constants.OUTPUT_SPOOL_MAX_FILE_COUNT
+        Constants.OUTPUT_SPOOL_MAX_FILE_COUNT = 2
+        try:
+            spooled_outputs = [self.output_spool.spool(str(i) * (Constants.OUTPUT_SPOOL_THRESHOLD_IN_CHARS + 1)) for i in range(0, 4)]
+            self.assertEqual(self.get_spool_files(), [spooled_output.spool_file_path for spooled_output in spooled_outputs[2:]])
+        finally:
+            Constants.OUTPUT_SPOOL_MAX_FILE_COUNT = backup_max_file_count
+
+
+if __name__ == '__main__':
+    unittest.main()
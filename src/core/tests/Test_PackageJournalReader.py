@@ -0,0 +1,98 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import os
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.PackageJournalReader import PackageJournalReader
+from core.src.package_managers.UpdateSet import UpdateSet
+from core.tests.library.ArgumentComposer import ArgumentComposer
+from core.tests.library.RuntimeCompositor import RuntimeCompositor
+
+
+class TestPackageJournalReader(unittest.TestCase):
+    def setUp(self):
+        self.runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True, Constants.APT)
+        self.journal_path = os.path.join(self.runtime.execution_config.temp_folder, "dpkg.log")
+        self.offset_file_path = os.path.join(self.runtime.execution_config.config_folder, Constants.PACKAGE_JOURNAL_OFFSET_FILE)
+        self.append_to_journal("2023-06-19 08:00:00 status installed vim:amd64 2:8.0.1453-1ubuntu1.4\n")     # from before the operation
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def append_to_journal(self, content, journal_path=None):
+        with open(journal_path if journal_path is not None else self.journal_path, 'a') as journal:
+            journal.write(content)
+
+    def get_reader(self, activity_id="activity-1"):
+        return PackageJournalReader(self.runtime.env_layer, self.runtime.composite_logger, self.journal_path, self.runtime.package_manager.parse_package_journal_line, self.offset_file_path, activity_id)
+
+    def test_entries_are_read_incrementally_from_the_end_of_the_journal(self):
+        package_journal_reader = self.get_reader()
+        self.assertTrue(package_journal_reader.start())
+        self.assertEqual(package_journal_reader.read_new_entries(), [])
+
+        # a partial line is left for the next read
+        self.append_to_journal("2023-06-20 10:15:50 upgrade bash:amd64 5.0-6ubuntu1.1 5.0-6ubuntu1.2\n2023-06-20 10:15:52 status installed bash:amd64 5.0-6ubuntu1.2\n2023-06-20 10:15:53 status inst")
+        self.assertEqual([(entry.name, entry.version) for entry in package_journal_reader.read_new_entries()], [("bash", "5.0-6ubuntu1.2")])
+        self.append_to_journal("alled git-man:all 1:2.17.1-1ubuntu0.16\n")
+        self.assertEqual([(entry.name, entry.version) for entry in package_journal_reader.read_new_entries()], [("git-man", "1:2.17.1-1ubuntu0.16")])
+        self.assertEqual(package_journal_reader.read_new_entries(), [])
+
+        # a journal rotated since the last read is read to its end before the new one
+        self.append_to_journal("2023-06-20 10:16:00 status installed git:amd64 1:2.17.1-1ubuntu0.16\n")
+        os.rename(self.journal_path, self.journal_path + ".1")
+        self.append_to_journal("2023-06-20 10:16:03 status not-installed libfoo1:amd64 <none>\n")
+        self.assertEqual([(entry.action, entry.name) for entry in package_journal_reader.read_new_entries()], [(Constants.PackageJournalActions.INSTALLED, "git"), (Constants.PackageJournalActions.REMOVED, "libfoo1")])
+
+    def test_offset_is_resumed_only_by_the_same_operation(self):
+        package_journal_reader = self.get_reader()
+        package_journal_reader.start()
+        self.append_to_journal("2023-06-20 10:15:52 status installed bash:amd64 5.0-6ubuntu1.2\n")
+
+        # e.g. after a reboot, the operation continues from where it left off
+        package_journal_reader = self.get_reader()
+        package_journal_reader.start()
+        self.assertEqual([entry.name for entry in package_journal_reader.read_new_entries()], ["bash"])
+
+        # other operations only read their own transactions
+        self.append_to_journal("2023-06-20 10:16:00 status installed git:amd64 1:2.17.1-1ubuntu0.16\n")
+        package_journal_reader = self.get_reader("activity-2")
+        package_journal_reader.start()
+        self.assertEqual(package_journal_reader.read_new_entries(), [])
+
+        # without a journal, there's no reader
+        os.remove(self.journal_path)
+        self.assertFalse(self.get_reader().start())
+
+    def test_patch_installer_attributes_installs_from_journal(self):
+        self.runtime.package_manager.package_journal_paths = [os.path.join(self.runtime.execution_config.temp_folder, "not-present"), self.journal_path]
+        patch_installer = self.runtime.patch_installer
+        package_journal_reader = patch_installer.get_package_journal_reader(self.runtime.package_manager)
+        self.assertEqual(package_journal_reader.journal_path, self.journal_path)
+
+        patch_installer.last_still_needed_updates = UpdateSet.from_lists(["git", "git-man", "bash"], ["1:2.17.1-1ubuntu0.16", "1:2.17.1-1ubuntu0.16", "5.0-6ubuntu1.2"])
+        self.append_to_journal("2023-06-20 10:16:00 status installed git-man:all 1:2.17.1-1ubuntu0.16\n2023-06-20 10:16:01 status installed git:amd64 1:2.17.1-1ubuntu0.15\n" +
+                               "2023-06-20 10:16:02 status not-installed libfoo1:amd64 <none>\n2023-06-20 10:16:03 status installed vim:amd64 2:8.0.1453-1ubuntu1.4\n")
+
+        # only still needed updates, installed at their version, are attributed
+        self.assertEqual(patch_installer.attribute_package_journal_entries(self.runtime.package_manager, package_journal_reader), 1)
+        self.assertEqual(patch_installer.last_still_needed_updates.get_packages(), ["git", "bash"])
+        self.assertEqual(patch_installer.attribute_package_journal_entries(self.runtime.package_manager, package_journal_reader), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
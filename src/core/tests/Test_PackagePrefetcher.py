@@ -0,0 +1,103 @@
+# Copyright 2020 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import threading
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.PackagePrefetcher import PackagePrefetcher
+from core.tests.library.ArgumentComposer import ArgumentComposer
+from core.tests.library.RuntimeCompositor import RuntimeCompositor
+
+
+class TestPackagePrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True, Constants.APT)
+        self.commands = []
+        self.last_download_done = threading.Event()
+        self.remaining_time_in_minutes = 120
+        self.backup_run_command_output = self.runtime.env_layer.run_command_output
+        self.backup_get_remaining_time_in_minutes = self.runtime.maintenance_window.get_remaining_time_in_minutes
+        self.runtime.env_layer.run_command_output = self.mock_run_command_output
+        self.runtime.maintenance_window.get_remaining_time_in_minutes = self.mock_get_remaining_time_in_minutes
+        self.install_units = [("git-man", "1:2.17.1-1ubuntu0.16", ["git-man"], ["1:2.17.1-1ubuntu0.16"]),
+                              ("git", "1:2.17.1-1ubuntu0.16", ["git", "git-man"], ["1:2.17.1-1ubuntu0.16", "1:2.17.1-1ubuntu0.16"]),
+                              ("bash", "4.4.18-2ubuntu1.3", ["bash"], ["4.4.18-2ubuntu1.3"])]
+
+    def tearDown(self):
+        self.runtime.env_layer.run_command_output = self.backup_run_command_output
+        self.runtime.maintenance_window.get_remaining_time_in_minutes = self.backup_get_remaining_time_in_minutes
+        self.runtime.stop()
+
+    def mock_run_command_output(self, cmd, no_output=False, chk_err=True, timeout_in_secs=None, is_kill_allowed=True):
+        if "--download-only" in cmd:
+            self.commands.append((cmd, timeout_in_secs))
+            if "bash" in cmd:
+                self.last_download_done.set()
+                return 100, "E: Failed to fetch bash"
+            return 0, ""
+        return self.backup_run_command_output(cmd, no_output, chk_err)
+
+    def mock_get_remaining_time_in_minutes(self, current_time=None, log_to_stdout=False):
+        return self.remaining_time_in_minutes
+
+    def test_packages_are_downloaded_in_install_order_in_batches(self):
+        backup_batch_size = Constants.PACKAGE_PREFETCH_BATCH_SIZE
+        Constants.PACKAGE_PREFETCH_BATCH_SIZE = 2
+        try:
+            package_prefetcher = PackagePrefetcher(self.runtime.composite_logger, self.runtime.package_manager, self.runtime.maintenance_window)
+            package_prefetcher.start(self.install_units)
+            self.assertTrue(self.last_download_done.wait(10))
+            package_prefetcher.stop()
+        finally:
+            Constants.PACKAGE_PREFETCH_BATCH_SIZE = backup_batch_size
+
+        download_cmd = self.runtime.package_manager.single_package_download_cmd
+        self.assertEqual(self.commands, [(download_cmd + "git-man=1:2.17.1-1ubuntu0.16 git=1:2.17.1-1ubuntu0.16", Constants.PACKAGE_PREFETCH_COMMAND_MAX_TIME_IN_SECS),
+                                         (download_cmd + "bash=4.4.18-2ubuntu1.3", Constants.PACKAGE_PREFETCH_COMMAND_MAX_TIME_IN_SECS)])
+        self.assertEqual(package_prefetcher.prefetched_package_count, 2)    # failed downloads are left to the installs
+
+    def test_downloads_stop_at_maintenance_window_install_cutoff(self):
+        cutoff_time_in_minutes = Constants.REBOOT_BUFFER_IN_MINUTES + Constants.PACKAGE_INSTALL_EXPECTED_MAX_TIME_IN_MINUTES
+        package_prefetcher = PackagePrefetcher(self.runtime.composite_logger, self.runtime.package_manager, self.runtime.maintenance_window)
+
+        # downloads are short, and bounded by the time left until the cutoff
+        self.remaining_time_in_minutes = cutoff_time_in_minutes + 60
+        self.assertEqual(package_prefetcher.get_download_time_available_in_secs(), Constants.PACKAGE_PREFETCH_COMMAND_MAX_TIME_IN_SECS)
+        self.remaining_time_in_minutes = cutoff_time_in_minutes + 0.5
+        self.assertEqual(package_prefetcher.get_download_time_available_in_secs(), 30)
+
+        self.remaining_time_in_minutes = cutoff_time_in_minutes
+        package_prefetcher.start(self.install_units)
+        package_prefetcher.stop()
+        self.assertEqual(self.commands, [])
+        self.assertEqual(package_prefetcher.prefetched_package_count, 0)
+
+    def test_download_cut_short_by_its_own_limit_is_not_reported(self):
+        reported_errors = []
+        backup_add_error_to_status = self.runtime.package_manager.status_handler.add_error_to_status
+        self.runtime.package_manager.status_handler.add_error_to_status = lambda message, error_code=None, *args, **kwargs: reported_errors.append(error_code)
+        self.runtime.env_layer.run_command_output = lambda cmd, no_output=False, chk_err=True, timeout_in_secs=None, is_kill_allowed=True: self.commands.append((cmd, timeout_in_secs)) or (Constants.COMMAND_TIMED_OUT_RETURN_CODE, "")
+        try:
+            self.assertFalse(self.runtime.package_manager.download_packages(["bash"], ["4.4.18-2ubuntu1.3"], 30))
+        finally:
+            self.runtime.package_manager.status_handler.add_error_to_status = backup_add_error_to_status
+
+        self.assertEqual(self.commands, [(self.runtime.package_manager.single_package_download_cmd + "bash=4.4.18-2ubuntu1.3", 30)])
+        self.assertEqual(reported_errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import os
+import unittest
+from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.PackageQueryCache import PackageQueryCache
+from core.tests.library.ArgumentComposer import ArgumentComposer
+from core.tests.library.RuntimeCompositor import RuntimeCompositor
+
+
+class TestPackageQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.runtime = RuntimeCompositor(ArgumentComposer().get_composed_arguments(), True, Constants.APT)
+        self.container = self.runtime.container
+        self.fingerprint = 1
+        self.query_count = 0
+        self.package_query_cache = PackageQueryCache(self.runtime.composite_logger, lambda: self.fingerprint)
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def run_query(self):
+        self.query_count += 1
+        return 0, "Output " + str(self.query_count)
+
+    def test_queries_are_memoized_within_a_generation(self):
+        self.assertEqual(self.package_query_cache.get_or_run("apt-cache madison bash", self.run_query), (0, "Output 1"))
+        self.assertEqual(self.package_query_cache.get_or_run("apt-cache madison bash", self.run_query), (0, "Output 1"))
+        self.assertEqual(self.package_query_cache.get_or_run("apt-cache madison sudo", self.run_query), (0, "Output 2"))
+        self.assertEqual((self.package_query_cache.hit_count, self.package_query_cache.miss_count), (1, 2))
+
+        # a changed fingerprint (package database or repo lists) starts a new generation
+        self.fingerprint = 2
+        self.assertEqual(self.package_query_cache.get_or_run("apt-cache madison bash", self.run_query), (0, "Output 3"))
+
+        # as does an explicit invalidation, for state changes the fingerprint can't tell
+        self.package_query_cache.invalidate()
+        self.assertEqual(self.package_query_cache.get_or_run("apt-cache madison bash", self.run_query), (0, "Output 4"))
+
+    def test_uncacheable_results_are_not_memoized(self):
+        is_cacheable = lambda result: result[0] != Constants.COMMAND_TIMED_OUT_RETURN_CODE
+        self.assertEqual(self.package_query_cache.get_or_run("sudo dpkg -s bash", lambda: (Constants.COMMAND_TIMED_OUT_RETURN_CODE, ""), is_cacheable), (Constants.COMMAND_TIMED_OUT_RETURN_CODE, ""))
+        self.assertEqual(self.package_query_cache.get_or_run("sudo dpkg -s bash", self.run_query, is_cacheable), (0, "Output 1"))
+        self.assertEqual(self.package_query_cache.get_or_run("sudo dpkg -s bash", self.run_query, is_cacheable), (0, "Output 1"))
+
+    def test_paths_fingerprint(self):
+        lists_folder = os.path.join(self.runtime.execution_config.temp_folder, "lists")
+        os.mkdir(lists_folder)
+        fingerprint = PackageQueryCache.get_paths_fingerprint([lists_folder, os.path.join(lists_folder, "missing")])
+        self.assertEqual(PackageQueryCache.get_paths_fingerprint([lists_folder]), fingerprint)
+
+        with open(os.path.join(lists_folder, "archive.ubuntu.com_ubuntu_dists_focal_InRelease"), 'w') as list_file:
+            list_file.write("Origin: Ubuntu")
+        self.assertNotEqual(PackageQueryCache.get_paths_fingerprint([lists_folder]), fingerprint)
+
+    def test_dependency_queries_are_invalidated_by_install(self):
+        package_manager = self.container.get('package_manager')
+        package_manager.package_state_paths = []
+        commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_recording(cmd, no_output=False, chk_err=True):
+            commands.append(cmd)
+            return backup_run_command_output(cmd, no_output, chk_err)
+        self.runtime.env_layer.run_command_output = run_command_output_recording
+
+        dependency_cmd = package_manager.single_package_dependency_resolution_template.replace('<PACKAGE-NAME>', 'sudo')
+        package_manager.get_dependent_list('sudo')
+        package_manager.get_dependent_list('sudo')
+        self.assertEqual(commands.count(dependency_cmd), 1)
+
+        package_manager.install_update_and_dependencies('sudo', '1.8.16-0ubuntu1.5')
+        package_manager.get_dependent_list('sudo')
+        self.assertEqual(commands.count(dependency_cmd), 2)
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+
+if __name__ == '__main__':
+    unittest.main()
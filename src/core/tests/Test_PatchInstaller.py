@@ -16,6 +16,7 @@
 
 import datetime
 import json
+import threading
 import unittest
 from core.src.bootstrap.Constants import Constants
 from core.tests.library.ArgumentComposer import ArgumentComposer
@@ -157,6 +158,132 @@ class TestPatchInstaller(unittest.TestCase):
         self.assertFalse(maintenance_window_exceeded)
         runtime.stop()
 
+    def test_apt_install_resolves_dependencies_once_per_package(self):
+        current_time = datetime.datetime.utcnow()
+        td = datetime.timedelta(hours=0, minutes=20)
+        job_start_time = (current_time - td).strftime("%Y-%m-%dT%H:%M:%S.9999Z")
+        argument_composer = ArgumentComposer()
+        argument_composer.maximum_duration = 'PT1H'
+        argument_composer.start_time = job_start_time
+        argument_composer.patches_to_exclude = ["ssh*"]     # exclusion evaluation needs dependencies too
+        runtime = RuntimeCompositor(argument_composer.get_composed_arguments(), True, Constants.APT)
+        # Path change
+        runtime.set_legacy_test_type('SuccessInstallPath')
+
+        resolved_packages = []
+        backup_get_dependent_list = runtime.package_manager.get_dependent_list
+
+        def get_dependent_list_tracked(package_name):
+            resolved_packages.append(package_name)
+            return backup_get_dependent_list(package_name)
+        runtime.package_manager.get_dependent_list = get_dependent_list_tracked
+
+        installed_update_count, update_run_successful, maintenance_window_exceeded = runtime.patch_installer.install_updates(runtime.maintenance_window, runtime.package_manager, simulate=True)
+        self.assertEqual(3, installed_update_count)
+        self.assertTrue(update_run_successful)
+        self.assertEqual(3, len(resolved_packages))
+        self.assertEqual(len(resolved_packages), len(set(resolved_packages)))
+        self.assertEqual(len(runtime.package_manager.dependency_graph), 3)
+
+        # a repo refresh resets the graph
+        runtime.package_manager.refresh_repo(force=True)
+        self.assertEqual(len(runtime.package_manager.dependency_graph), 0)
+        runtime.stop()
+
+    def test_package_prefetcher_stopped_on_install_error(self):
+        argument_composer = ArgumentComposer()
+        argument_composer.maximum_duration = 'PT4H'
+        runtime = RuntimeCompositor(argument_composer.get_composed_arguments(), True, Constants.APT)
+        runtime.set_legacy_test_type('SuccessInstallPath')
+
+        def mock_install(*args, **kwargs):
+            raise Exception("Install failure")
+        runtime.package_manager.install_update_batch = mock_install
+        runtime.package_manager.install_update_and_dependencies = mock_install
+        runtime.package_manager.download_packages = lambda packages, package_versions, timeout_in_secs: True
+
+        self.assertRaises(Exception, runtime.patch_installer.install_updates, runtime.maintenance_window, runtime.package_manager, simulate=False)
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == "PackagePrefetcher"], [])
+        runtime.stop()
+
+    def test_install_updates_in_batches_isolates_failures(self):
+        argument_composer = ArgumentComposer()
+        argument_composer.maximum_duration = 'PT4H'
+        runtime = RuntimeCompositor(argument_composer.get_composed_arguments(), True, Constants.APT)
+        batches = []
+
+        def mock_install_update_batch(parent_packages, parent_package_versions, packages, package_versions, simulate=False):
+            batches.append(parent_packages)
+            return [] if 'bad' in parent_packages else parent_packages  # a failed transaction installs nothing
+        runtime.package_manager.install_update_batch = mock_install_update_batch
+
+        install_units = [(name, '1.0', (name,), ('1.0',)) for name in ['p1', 'p2', 'p3', 'bad', 'p5', 'p6']]
+        installed_packages = runtime.patch_installer.install_updates_in_batches(runtime.maintenance_window, runtime.package_manager, install_units)
+
+        # the failed batch is split in half until the failure is isolated - single packages are left for individual installation
+        self.assertEqual(installed_packages, set(['p1', 'p2', 'p3']))
+        self.assertEqual(batches, [['p1', 'p2', 'p3', 'bad', 'p5', 'p6'], ['p1', 'p2', 'p3'], ['bad', 'p5', 'p6'], ['bad', 'p5']])
+
+        # a package that can't share a batch is still installed in its place in the install order
+        del batches[:]
+        install_units = [('sec', '1.0', ('sec', 'lib'), ('1.0', '1.0')), ('p2', '1.0', ('p2', 'lib'), ('1.0', '1.0')), ('p3', '1.0', ('p3',), ('1.0',))]
+        installed_packages = runtime.patch_installer.install_updates_in_batches(runtime.maintenance_window, runtime.package_manager, install_units)
+        self.assertEqual(installed_packages, set(['sec', 'p2', 'p3']))
+        self.assertEqual(batches, [['sec'], ['p2', 'p3']])
+
+        # batches only group packages sharing no packages (e.g. a common dependency)
+        install_units = [('p1', '1.0', ('p1', 'lib'), ('1.0', '1.0')), ('p2', '1.0', ('p2',), ('1.0',)), ('p3', '1.0', ('p3', 'lib'), ('1.0', '1.0'))]
+        self.assertEqual([[unit[0] for unit in batch] for batch in runtime.patch_installer.get_independent_install_batches(install_units, 10)], [['p1', 'p2'], ['p3']])
+        self.assertEqual([[unit[0] for unit in batch] for batch in runtime.patch_installer.get_independent_install_batches(install_units[:2], 1)], [['p1'], ['p2']])
+        runtime.stop()
+
+    def test_install_updates_in_batches_sized_by_expected_install_time(self):
+        argument_composer = ArgumentComposer()
+        argument_composer.maximum_duration = 'PT4H'
+        runtime = RuntimeCompositor(argument_composer.get_composed_arguments(), True, Constants.APT)
+        batches = []
+
+        def mock_install_update_batch(parent_packages, parent_package_versions, packages, package_versions, simulate=False):
+            batches.append(parent_packages)
+            return parent_packages
+        runtime.package_manager.install_update_batch = mock_install_update_batch
+
+        # with 12 minutes left for installs, the fixed maximum per package (5 minutes) would only allow batches of 2 - install duration history allows all 4
+        expected_max_install_time_in_minutes = {'p1': 2, 'p2': 2, 'p3': 3, 'p4': 3}
+        runtime.maintenance_window.get_expected_max_install_time_in_minutes = lambda packages=None: sum(expected_max_install_time_in_minutes[package] for package in packages)
+        runtime.maintenance_window.get_remaining_time_in_minutes = lambda current_time=None, log_to_stdout=False: Constants.REBOOT_BUFFER_IN_MINUTES + 12
+
+        install_units = [(name, '1.0', (name,), ('1.0',)) for name in ['p1', 'p2', 'p3', 'p4']]
+        self.assertEqual(runtime.patch_installer.install_updates_in_batches(runtime.maintenance_window, runtime.package_manager, install_units), set(['p1', 'p2', 'p3', 'p4']))
+        self.assertEqual(batches, [['p1', 'p2', 'p3', 'p4']])
+
+        # batches that don't fit are split
+        del batches[:]
+        expected_max_install_time_in_minutes['p4'] = 6
+        runtime.patch_installer.install_updates_in_batches(runtime.maintenance_window, runtime.package_manager, install_units)
+        self.assertEqual(batches, [['p1', 'p2'], ['p3', 'p4']])
+        runtime.stop()
+
+    def test_get_install_schedule(self):
+        argument_composer = ArgumentComposer()
+        argument_composer.maximum_duration = 'PT4H'
+        runtime = RuntimeCompositor(argument_composer.get_composed_arguments(), True, Constants.APT)
+        runtime.package_manager.dependency_graph = {'linux-image-azure': [], 'curl': ['libcurl4'], 'libcurl4': [], 'openssl': []}     # bash is unresolved
+
+        packages = ['linux-image-azure', 'curl', 'libcurl4', 'openssl', 'bash']
+        package_versions = ['5.4.0.1040.20', '7.58.0-2ubuntu3.16', '7.58.0-2ubuntu3.16', '1.1.1-1ubuntu2.1~18.04.13', '4.4.18-2ubuntu1.3']
+        scheduled_packages, scheduled_package_versions = runtime.patch_installer.get_install_schedule(runtime.maintenance_window, runtime.package_manager, packages, package_versions, ['openssl', 'linux-image-azure'])
+
+        # security first, shorter installs first (kernels take longer), and dependent packages together
+        self.assertEqual(scheduled_packages, ['openssl', 'linux-image-azure', 'bash', 'curl', 'libcurl4'])
+        self.assertEqual(scheduled_package_versions, ['1.1.1-1ubuntu2.1~18.04.13', '5.4.0.1040.20', '4.4.18-2ubuntu1.3', '7.58.0-2ubuntu3.16', '7.58.0-2ubuntu3.16'])
+
+        # install duration history is of whole transactions, so dependencies aren't counted again on top of it
+        runtime.maintenance_window.record_package_install_duration('curl', '159 kB', Constants.PACKAGE_INSTALL_DEFAULT_EXPECTED_TIME_IN_SECS - 10)
+        scheduled_packages, scheduled_package_versions = runtime.patch_installer.get_install_schedule(runtime.maintenance_window, runtime.package_manager, packages, package_versions, ['openssl', 'linux-image-azure'])
+        self.assertEqual(scheduled_packages, ['openssl', 'linux-image-azure', 'curl', 'libcurl4', 'bash'])
+        runtime.stop()
+
     def test_healthstore_writes(self):
         self.healthstore_writes_helper("HealthStoreId", None, expected_patch_version="HealthStoreId")
         self.healthstore_writes_helper("HealthStoreId", "MaintenanceRunId", expected_patch_version="HealthStoreId")
@@ -17,6 +17,7 @@ import datetime
 import json
 import unittest
 from core.src.bootstrap.Constants import Constants
+from core.src.service_interfaces.PatchStore import PatchStore
 from core.src.service_interfaces.StatusHandler import StatusHandler
 from core.tests.library.ArgumentComposer import ArgumentComposer
 from core.tests.library.RuntimeCompositor import RuntimeCompositor
@@ -358,6 +359,119 @@ class TestStatusHandler(unittest.TestCase):
         self.assertRaises(Exception,
                           lambda: self.runtime.status_handler.set_current_operation(Constants.INSTALLATION))
 
+    def test_status_file_write_behind(self):
+        def get_installation_patches_in_status_file():
+            with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+                substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+            return substatus_file_data["status"], json.loads(substatus_file_data["formattedMessage"]["message"])["patches"]
+
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+        self.runtime.status_handler.status_file_write_interval_in_secs = 60
+        self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.PENDING)  # first write goes through
+
+        # in-progress updates within the interval are deferred
+        self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.INSTALLED)
+        self.runtime.status_handler.set_package_install_status("samba-common-bin", "2:4.4.5+dfsg-2ubuntu5.4", Constants.PENDING)
+        status, patches = get_installation_patches_in_status_file()
+        self.assertEqual(len(patches), 1)
+        self.assertEqual(patches[0]["patchInstallationState"], Constants.PENDING)
+
+        # and coalesced into one write on flush
+        self.runtime.status_handler.flush_status_file()
+        status, patches = get_installation_patches_in_status_file()
+        self.assertEqual(len(patches), 2)
+        self.assertEqual(patches[0]["patchInstallationState"], Constants.INSTALLED)
+
+        # substatus transitions out of transitioning are written right away
+        self.runtime.status_handler.set_package_install_status("samba-common-bin", "2:4.4.5+dfsg-2ubuntu5.4", Constants.FAILED)
+        self.runtime.status_handler.set_installation_substatus_json(status=Constants.STATUS_ERROR)
+        status, patches = get_installation_patches_in_status_file()
+        self.assertEqual(status, Constants.STATUS_ERROR.lower())
+        self.assertEqual(patches[0]["patchInstallationState"], Constants.FAILED)
+
+        # and so is reboot start
+        self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.INSTALLED)
+        self.runtime.status_handler.set_installation_reboot_status(Constants.RebootStatus.STARTED)
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+        self.assertEqual(json.loads(substatus_file_data["formattedMessage"]["message"])["rebootStatus"], Constants.RebootStatus.STARTED)
+
+    def test_status_file_write_behind_serializes_summary_once(self):
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+        self.runtime.status_handler.status_file_write_interval_in_secs = 60
+        self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.PENDING)  # first write goes through
+
+        # deferred updates only rebuild the installation summary, which is serialized once by the flush that writes it
+        serialized_summary_count = [0]
+        backup_json_dumps = json.dumps
+
+        def mock_json_dumps(obj, *args, **kwargs):
+            if isinstance(obj, dict) and "installationActivityId" in obj:
+                serialized_summary_count[0] += 1
+            return backup_json_dumps(obj, *args, **kwargs)
+
+        json.dumps = mock_json_dumps
+        try:
+            self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.INSTALLED)
+            self.runtime.status_handler.set_package_install_status("samba-common-bin", "2:4.4.5+dfsg-2ubuntu5.4", Constants.PENDING)
+            self.runtime.status_handler.set_package_install_status("samba-common-bin", "2:4.4.5+dfsg-2ubuntu5.4", Constants.INSTALLED)
+            self.assertEqual(serialized_summary_count[0], 0)
+            self.runtime.status_handler.flush_status_file()
+        finally:
+            json.dumps = backup_json_dumps
+        self.assertEqual(serialized_summary_count[0], 1)
+
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+        summary = json.loads(substatus_file_data["formattedMessage"]["message"])
+        self.assertEqual(summary["installedPatchCount"], 2)
+        self.assertEqual(len(summary["patches"]), 2)
+
+    def test_status_file_substatus_serialization_cache(self):
+        self.runtime.status_handler.set_current_operation(Constants.ASSESSMENT)
+        packages, package_versions = self.runtime.package_manager.get_all_updates()
+        self.runtime.status_handler.set_package_assessment_status(packages, package_versions)
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+
+        # an installation update doesn't re-encode the unchanged assessment substatus
+        encoded_substatus_names = []
+        backup_json_dumps = json.dumps
+
+        def mock_json_dumps(obj, *args, **kwargs):
+            if isinstance(obj, dict) and obj.get("name", None) in [Constants.PATCH_ASSESSMENT_SUMMARY, Constants.PATCH_INSTALLATION_SUMMARY]:
+                encoded_substatus_names.append(obj["name"])
+            return backup_json_dumps(obj, *args, **kwargs)
+
+        json.dumps = mock_json_dumps
+        try:
+            self.runtime.status_handler.set_package_install_status(packages[0], package_versions[0], Constants.INSTALLED)
+        finally:
+            json.dumps = backup_json_dumps
+        self.assertEqual(encoded_substatus_names, [Constants.PATCH_INSTALLATION_SUMMARY])
+
+        # a repeated write with no substatus changes re-encodes neither
+        encoded_substatus_names = []
+        json.dumps = mock_json_dumps
+        try:
+            self.runtime.status_handler._StatusHandler__write_status_file(force=True)
+            self.runtime.status_handler._StatusHandler__write_status_file(force=True)
+        finally:
+            json.dumps = backup_json_dumps
+        self.assertEqual(encoded_substatus_names, [])
+
+        # the status file assembled from cached fragments is still well-formed
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            status_file_data = json.load(file_handle)[0]
+        self.assertEqual(status_file_data["status"]["operation"], str(self.runtime.execution_config.operation))
+        self.assertEqual(status_file_data["status"]["status"], "success")
+        self.assertTrue("timestampUTC" in status_file_data)
+        substatus_file_data = status_file_data["status"]["substatus"]
+        self.assertEqual(len(substatus_file_data), 2)
+        self.assertEqual(substatus_file_data[0]["name"], Constants.PATCH_ASSESSMENT_SUMMARY)
+        self.assertEqual(len(json.loads(substatus_file_data[0]["formattedMessage"]["message"])["patches"]), len(packages))
+        self.assertEqual(substatus_file_data[1]["name"], Constants.PATCH_INSTALLATION_SUMMARY)
+        self.assertEqual(json.loads(substatus_file_data[1]["formattedMessage"]["message"])["patches"][0]["patchInstallationState"], Constants.INSTALLED)
+
     def test_sort_packages_by_classification_and_state(self):
         with self.runtime.env_layer.file_system.open("../../extension/tests/helpers/PatchOrderAssessmentSummary.json", 'r') as file_handle:
             assessment_patches = json.load(file_handle)["patches"]
@@ -392,6 +506,61 @@ class TestStatusHandler(unittest.TestCase):
             self.assertEqual(installation_patches_sorted[12]["name"], "test-package-2")  # | Other              | Excluded    |
             self.assertEqual(installation_patches_sorted[13]["name"], "test-package-1")  # | Other              | NotSelected |
 
+    def test_patch_store_ordering(self):
+        with self.runtime.env_layer.file_system.open("../../extension/tests/helpers/PatchOrderInstallationSummary.json", 'r') as file_handle:
+            installation_patches = json.load(file_handle)["patches"]
+            for patch in installation_patches:
+                patch["patchId"] = patch["name"] + "_" + patch["version"]   # test data shares one patchId across patches
+            expected_names = [patch["name"] for patch in self.runtime.status_handler.sort_packages_by_classification_and_state(installation_patches)]
+            patch_store = PatchStore(installation_patches)
+            self.assertEqual(len(patch_store), len(installation_patches))
+            self.assertEqual([patch["name"] for patch in patch_store.get_packages()], expected_names)
+
+            # an update moves only the record that changed, to where a stable re-sort of the previous order would put it
+            previous_order = patch_store.get_packages()
+            patch_id = previous_order[-1]["patchId"]    # test-package-1 | Other | NotSelected
+            self.assertTrue(patch_store.update(patch_id, classification=Constants.PackageClassification.SECURITY, patch_state=Constants.FAILED))
+            self.assertEqual(patch_store.get_packages()[0]["name"], "test-package-6")
+            self.assertEqual(patch_store.get_packages()[2]["name"], "test-package-1")
+            self.assertEqual(patch_store.get_packages()[-1]["name"], "test-package-2")
+            self.assertEqual([patch["name"] for patch in patch_store.get_packages()], [patch["name"] for patch in self.runtime.status_handler.sort_packages_by_classification_and_state(previous_order)])
+            self.assertFalse(patch_store.update("not-a-patch-id", patch_state=Constants.FAILED))
+
+    def test_patch_store_bulk_move_keeps_relative_order(self):
+        def make_patch(name, patch_state):
+            return {"patchId": name + "_1.0", "name": name, "version": "1.0", "classifications": [Constants.PackageClassification.OTHER], "patchInstallationState": patch_state}
+
+        patches = [make_patch("package-a", Constants.PENDING), make_patch("package-b", Constants.PENDING), make_patch("package-c", Constants.EXCLUDED),
+                   make_patch("package-d", Constants.NOT_SELECTED), make_patch("package-e", Constants.NOT_SELECTED)]
+        patch_store = PatchStore(patches)
+
+        # moving down together into a non-empty group: the movers keep their order, ahead of the group's existing records
+        previous_order = patch_store.get_packages()
+        self.assertEqual(patch_store.update_many([("package-a_1.0", None, Constants.EXCLUDED), ("package-b_1.0", None, Constants.EXCLUDED)]), 2)
+        self.assertEqual([patch["name"] for patch in patch_store.get_packages()], ["package-a", "package-b", "package-c", "package-d", "package-e"])
+        self.assertEqual([patch["name"] for patch in patch_store.get_packages()], [patch["name"] for patch in self.runtime.status_handler.sort_packages_by_classification_and_state(previous_order)])
+
+        # moving up together into a non-empty group: the movers keep their order, behind the group's existing records
+        previous_order = patch_store.get_packages()
+        self.assertEqual(patch_store.update_many([("package-e_1.0", None, Constants.EXCLUDED), ("package-d_1.0", None, Constants.EXCLUDED), ("not-a-patch-id", None, Constants.EXCLUDED)]), 2)
+        self.assertEqual([patch["name"] for patch in patch_store.get_packages()], ["package-a", "package-b", "package-c", "package-d", "package-e"])
+        self.assertEqual([patch["name"] for patch in patch_store.get_packages()], [patch["name"] for patch in self.runtime.status_handler.sort_packages_by_classification_and_state(previous_order)])
+
+    def test_set_package_install_status_repositions_updated_packages(self):
+        self.runtime.status_handler.set_current_operation(Constants.INSTALLATION)
+        self.runtime.status_handler.set_package_install_status(["python-samba", "samba-common-bin"], ["2:4.4.5+dfsg-2ubuntu5.4", "2:4.4.5+dfsg-2ubuntu5.4"], Constants.PENDING, Constants.PackageClassification.OTHER)
+        self.runtime.status_handler.set_package_install_status("samba-common-bin", "2:4.4.5+dfsg-2ubuntu5.4", Constants.INSTALLED)
+        self.runtime.status_handler.set_package_install_status("python-samba", "2:4.4.5+dfsg-2ubuntu5.4", Constants.FAILED)
+
+        with self.runtime.env_layer.file_system.open(self.runtime.execution_config.status_file_path, 'r') as file_handle:
+            substatus_file_data = json.load(file_handle)[0]["status"]["substatus"][0]
+        patches = json.loads(substatus_file_data["formattedMessage"]["message"])["patches"]
+        self.assertEqual(len(patches), 2)
+        self.assertEqual(patches[0]["name"], "python-samba")
+        self.assertEqual(patches[0]["patchInstallationState"], Constants.FAILED)
+        self.assertEqual(patches[1]["name"], "samba-common-bin")
+        self.assertEqual(patches[1]["patchInstallationState"], Constants.INSTALLED)
+
 
 if __name__ == '__main__':
     unittest.main()
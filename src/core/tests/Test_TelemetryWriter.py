@@ -17,9 +17,12 @@ import datetime
 import json
 import os
 import re
+import string
+import threading
 import time
 import unittest
 from core.src.bootstrap.Constants import Constants
+from core.src.service_interfaces.TelemetryEventAggregator import TelemetryEventAggregator
 from core.tests.library.ArgumentComposer import ArgumentComposer
 from core.tests.library.RuntimeCompositor import RuntimeCompositor
 
@@ -48,7 +51,8 @@ class TestTelemetryWriter(unittest.TestCase):
 
     def test_write_event(self):
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
-        latest_event_file = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)][-1]
+        self.runtime.telemetry_writer.flush()
+        latest_event_file = sorted([pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)])[-1]
         telemetry_event_counter_in_first_test_event = None
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, latest_event_file), 'r+') as f:
             events = json.load(f)
@@ -59,7 +63,8 @@ class TestTelemetryWriter(unittest.TestCase):
             f.close()
 
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task2")
-        latest_event_file = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)][-1]
+        self.runtime.telemetry_writer.flush()
+        latest_event_file = sorted([pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)])[-1]
         telemetry_event_counter_in_second_test_event = None
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, latest_event_file), 'r+') as f:
             events = json.load(f)
@@ -78,6 +83,7 @@ class TestTelemetryWriter(unittest.TestCase):
         time.time = self.mock_time
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task2")
+        self.runtime.telemetry_writer.flush()   # queued events are written to one event file in a batch
         latest_event_file = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^' + str(self.mock_time()) + '0+.json$', pos_json)][-1]
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, latest_event_file), 'r+') as f:
             events = json.load(f)
@@ -91,7 +97,8 @@ class TestTelemetryWriter(unittest.TestCase):
         # Assuming 1 char is 1 byte
         message = "a"*3074
         self.runtime.telemetry_writer.write_event(message, Constants.TelemetryEventLevel.Error, "Test Task")
-        latest_event_file = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)][-1]
+        self.runtime.telemetry_writer.flush()
+        latest_event_file = sorted([pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)])[-1]
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, latest_event_file), 'r+') as f:
             events = json.load(f)
             self.assertTrue(events is not None)
@@ -180,9 +187,12 @@ class TestTelemetryWriter(unittest.TestCase):
         self.runtime.telemetry_writer.start_time_for_event_count_throttle_check = datetime.datetime.utcnow()
 
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
+        self.runtime.telemetry_writer.flush()
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task2")
+        self.runtime.telemetry_writer.flush()
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task3")
-        event_file_task3 = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)][-1]
+        self.runtime.telemetry_writer.flush()
+        event_file_task3 = sorted([pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)])[-1]
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file_task3), 'r+') as f:
             events = json.load(f)
             self.assertTrue(events is not None)
@@ -190,7 +200,8 @@ class TestTelemetryWriter(unittest.TestCase):
             f.close()
 
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task4")
-        event_file_task4 = [pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)][-1]
+        self.runtime.telemetry_writer.flush()
+        event_file_task4 = sorted([pos_json for pos_json in os.listdir(self.runtime.telemetry_writer.events_folder_path) if re.search('^[0-9]+.json$', pos_json)])[-1]
         with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file_task4), 'r+') as f:
             events = json.load(f)
             self.assertTrue(events is not None)
@@ -199,20 +210,169 @@ class TestTelemetryWriter(unittest.TestCase):
         self.assertTrue(self.runtime.telemetry_writer.event_count == 2)
 
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task5")
+        self.runtime.telemetry_writer.flush()
         self.assertTrue(self.runtime.telemetry_writer.event_count == 3)
 
         max_time_for_event_count_throttle_backup = Constants.TELEMETRY_MAX_TIME_IN_SECONDS_FOR_EVENT_COUNT_THROTTLE
         Constants.TELEMETRY_MAX_TIME_IN_SECONDS_FOR_EVENT_COUNT_THROTTLE = 0
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task6")
+        self.runtime.telemetry_writer.flush()
         self.assertTrue(self.runtime.telemetry_writer.event_count == 2)
         Constants.TELEMETRY_MAX_TIME_IN_SECONDS_FOR_EVENT_COUNT_THROTTLE = max_time_for_event_count_throttle_backup
 
         Constants.TELEMETRY_MAX_EVENT_COUNT_THROTTLE = event_count_max_throttle_backup
 
+    def test_write_event_batches(self):
+        self.runtime.telemetry_writer.flush()
+        old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+
+        # events are queued until flushed, then written to one new event file
+        for i in range(0, 10):
+            self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task" + str(i))
+        self.assertEqual(os.listdir(self.runtime.telemetry_writer.events_folder_path), old_event_files)
+        self.runtime.telemetry_writer.flush()
+        new_event_files = [event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files]
+        self.assertEqual(len(new_event_files), 1)
+        with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, new_event_files[0]), 'r') as f:
+            events = json.load(f)
+        self.assertEqual([event["TaskName"] for event in events], ["Test Task" + str(i) for i in range(0, 10)])
+
+        # a flush writes into as many files as the event file size limit requires
+        event_queue_max_size_backup = Constants.TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS
+        event_file_size_limit_backup = Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS
+        Constants.TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS = 1500
+        Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS = 1000
+        try:
+            old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+            for i in range(0, 10):
+                self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task" + str(i))
+            self.runtime.telemetry_writer.flush()
+            new_event_files = sorted([event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files])
+            self.assertTrue(len(new_event_files) > 1)
+            task_names = []
+            for event_file in new_event_files:
+                self.assertTrue(os.path.getsize(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file)) <= Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS)
+                with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file), 'r') as f:
+                    task_names += [event["TaskName"] for event in json.load(f)]
+            self.assertEqual(task_names, ["Test Task" + str(i) for i in range(0, 10)])
+        finally:
+            Constants.TELEMETRY_EVENT_QUEUE_MAX_SIZE_IN_CHARS = event_queue_max_size_backup
+            Constants.TELEMETRY_EVENT_FILE_SIZE_LIMIT_IN_CHARS = event_file_size_limit_backup
+
+    def test_write_event_queue_overflow(self):
+        self.runtime.telemetry_writer.flush()
+        old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+
+        # verbose events are dropped first, errors are kept
+        event_queue_capacity_backup = Constants.TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS
+        Constants.TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS = 2000
+        try:
+            self.runtime.telemetry_writer.write_event("testing telemetry error", Constants.TelemetryEventLevel.Error, "Error Task")
+            for i in range(0, 20):
+                self.runtime.telemetry_writer.write_event("testing telemetry write to file " + string.ascii_letters[i], Constants.TelemetryEventLevel.Verbose, "Test Task" + str(i))  # distinct events, not aggregated
+            self.runtime.telemetry_writer.flush()
+        finally:
+            Constants.TELEMETRY_EVENT_QUEUE_CAPACITY_IN_CHARS = event_queue_capacity_backup
+
+        events = []
+        for event_file in sorted([event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files]):
+            with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file), 'r') as f:
+                events += json.load(f)
+        self.assertTrue("Telemetry events were dropped as the telemetry queue was full. [Verbose=" in events[0]["Message"])
+        self.assertEqual(events[0]["EventLevel"], Constants.TelemetryEventLevel.Warning)
+        self.assertEqual(events[1]["TaskName"], "Error Task")
+        self.assertTrue(1 < len(events) - 2 < 20)
+        self.assertEqual(events[-1]["TaskName"], "Test Task19")   # the oldest verbose events were dropped
+
+    def test_write_event_aggregation(self):
+        self.runtime.telemetry_writer.flush()
+        old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+
+        # repetitive verbose events beyond the per-template budget are summarized, errors and warnings pass through
+        for i in range(0, 50):
+            self.runtime.telemetry_writer.write_event(" - Inapplicable line: kernel-{0}.x86_64 3.10.0-514.el7".format(str(i)), Constants.TelemetryEventLevel.Verbose, "Test Task")
+            self.runtime.telemetry_writer.write_event("testing telemetry error {0}".format(str(i)), Constants.TelemetryEventLevel.Error, "Test Task")
+        self.runtime.telemetry_writer.write_event("testing telemetry warning", Constants.TelemetryEventLevel.Warning, "Test Task")
+        self.runtime.telemetry_writer.flush()
+
+        events = []
+        for event_file in sorted([event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files]):
+            with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, event_file), 'r') as f:
+                events += json.load(f)
+        verbose_events = [event for event in events if event["EventLevel"] == Constants.TelemetryEventLevel.Verbose]
+        self.assertEqual(len(verbose_events), Constants.TELEMETRY_AGGREGATION_PASS_THROUGH_COUNT_PER_TEMPLATE + 1)
+        self.assertTrue("Repeated telemetry events were aggregated. [Count={0}] [Template= - Inapplicable line: * *]".format(str(50 - Constants.TELEMETRY_AGGREGATION_PASS_THROUGH_COUNT_PER_TEMPLATE)) in verbose_events[-1]["Message"])
+        self.assertTrue("kernel-49.x86_64" in verbose_events[-1]["Message"])
+        self.assertEqual(len([event for event in events if event["EventLevel"] == Constants.TelemetryEventLevel.Error]), 50)
+        self.assertEqual(len([event for event in events if event["EventLevel"] == Constants.TelemetryEventLevel.Warning]), 1)
+
+        # variable parts of messages are masked in templates
+        self.assertEqual(TelemetryEventAggregator.get_event_template("Logging progress [Package: bash; Status: Installed]"), "Logging progress [Package: *; Status: *]")
+        self.assertEqual(TelemetryEventAggregator.get_event_template("[Time available: 3:55:00 | A: 12, S: 3, F: 0 | D: 1]\t Installing package: bash"),
+                         "[Time available: * | A: *, S: *, F: * | D: *]\t Installing package: bash")    # unrelated progress lines don't share a template
+        self.assertNotEqual(TelemetryEventAggregator.get_event_template("[Time available: 3:55:00 | A: 12, S: 3, F: 0 | D: 1]\t Installing package: bash"),
+                            TelemetryEventAggregator.get_event_template("[Time available: 3:50:00 | A: 12, S: 4, F: 0 | D: 1]\t Package install succeeded: bash"))
+        self.assertEqual(TelemetryEventAggregator.get_event_template("Setting package installation status in bulk. [Count=123]"), "Setting package installation status in bulk. [Count=*]")
+
+        # unicode text is aggregated like any other text
+        aggregator = TelemetryEventAggregator()
+        admitted = [aggregator.try_admit(u"Repeated unicode event {0}".format(str(i)), Constants.TelemetryEventLevel.Verbose, "Test Task") for i in range(0, Constants.TELEMETRY_AGGREGATION_PASS_THROUGH_COUNT_PER_TEMPLATE + 1)]
+        self.assertEqual(admitted[-1], False)
+
+        # structured payloads, such as package information, are never aggregated
+        self.assertTrue(TelemetryEventAggregator().try_admit({'package_name': 'bash'}, Constants.TelemetryEventLevel.Informational, "Test Task"))
+
+    def test_write_event_not_blocked_by_throttling(self):
+        self.runtime.telemetry_writer.flush()
+        old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+
+        # the next event file write has to wait out the throttle time window, on the background writer
+        throttle_wait_released = threading.Event()
+        backup_time_sleep = time.sleep
+        time.sleep = lambda seconds: throttle_wait_released.wait(10)
+        event_count_max_throttle_backup = Constants.TELEMETRY_MAX_EVENT_COUNT_THROTTLE
+        Constants.TELEMETRY_MAX_EVENT_COUNT_THROTTLE = 2
+        self.runtime.telemetry_writer.start_time_for_event_count_throttle_check = datetime.datetime.utcnow()
+        try:
+            self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
+            self.runtime.telemetry_writer.flush(wait=False)
+            self.assertEqual(os.listdir(self.runtime.telemetry_writer.events_folder_path), old_event_files)
+
+            throttle_wait_released.set()
+            self.runtime.telemetry_writer.flush()
+        finally:
+            throttle_wait_released.set()
+            time.sleep = backup_time_sleep
+            Constants.TELEMETRY_MAX_EVENT_COUNT_THROTTLE = event_count_max_throttle_backup
+
+        new_event_files = [event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files]
+        self.assertEqual(len(new_event_files), 1)
+        with open(os.path.join(self.runtime.telemetry_writer.events_folder_path, new_event_files[0]), 'r') as f:
+            events = json.load(f)
+        self.assertTrue("Max telemetry event file limit reached" in events[0]["Message"])
+        self.assertEqual(events[-1]["TaskName"], "Test Task")
+
+    def test_close_writes_queued_events_and_stops_writer(self):
+        self.runtime.bootstrapper_telemetry_writer.close()
+        self.runtime.telemetry_writer.flush()
+        old_event_files = os.listdir(self.runtime.telemetry_writer.events_folder_path)
+        self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
+        self.runtime.telemetry_writer.close()
+
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == "TelemetryEventWriter"], [])
+        new_event_files = [event_file for event_file in os.listdir(self.runtime.telemetry_writer.events_folder_path) if event_file not in old_event_files]
+        self.assertEqual(len(new_event_files), 1)
+
+        # events written after a close are still written, by a new writer
+        self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task2")
+        self.runtime.telemetry_writer.close()
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == "TelemetryEventWriter"], [])
+
     def test_events_deleted_outside_of_extension_while_extension_is_running(self):
         backup_os_listdir = os.listdir
         os.listdir = self.mock_os_listdir
         self.runtime.telemetry_writer.write_event("testing telemetry write to file", Constants.TelemetryEventLevel.Error, "Test Task")
+        self.runtime.telemetry_writer.flush()
         os.listdir = backup_os_listdir
 
 
@@ -0,0 +1,67 @@
+# Copyright 2023 Microsoft Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Requires Python 2.7+
+
+import unittest
+
+from core.src.bootstrap.Constants import Constants
+from core.src.package_managers.UpdateSet import UpdateSet, UpdateRecord
+
+
+class TestUpdateSet(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_list_adapters_and_dedupe(self):
+        update_set = UpdateSet.from_lists(['bash', 'kernel', 'bash', 'sudo'], ['4.3-14', '3.10.0-862', '4.3-15', '1.8.23'], Constants.PackageClassification.SECURITY)
+        packages, package_versions = update_set.to_lists()
+        self.assertEqual(packages, ['bash', 'kernel', 'sudo'])
+        self.assertEqual(package_versions, ['4.3-14', '3.10.0-862', '1.8.23'])     # first version wins
+        self.assertEqual(len(update_set), 3)
+        self.assertEqual(update_set.get('kernel').classification, Constants.PackageClassification.SECURITY)
+
+    def test_lookup_and_remove(self):
+        update_set = UpdateSet.from_lists(['bash', 'kernel'], ['4.3-14', '3.10.0-862'])
+        self.assertTrue('bash' in update_set)
+        self.assertFalse('sudo' in update_set)
+        self.assertEqual(update_set.get_version('kernel'), '3.10.0-862')
+        self.assertEqual(update_set.get_version('sudo', Constants.DEFAULT_UNSPECIFIED_VALUE), Constants.DEFAULT_UNSPECIFIED_VALUE)
+
+        self.assertEqual(update_set.remove('bash').version, '4.3-14')
+        self.assertTrue(update_set.remove('bash') is None)
+        self.assertEqual(update_set.get_packages(), ['kernel'])
+
+        # removal while iterating is allowed
+        self.assertTrue(update_set.add('sudo', '1.8.23', arch='x86_64'))
+        self.assertFalse(update_set.add('sudo', '1.8.24'))
+        for record in update_set:
+            update_set.remove(record.name)
+        self.assertEqual(len(update_set), 0)
+
+    def test_copy_and_records(self):
+        update_set = UpdateSet([UpdateRecord('bash', '4.3-14', 'x86_64', Constants.PackageClassification.OTHER)])
+        update_set_copy = update_set.copy()
+        update_set_copy.get('bash').version = '4.3-15'
+        update_set_copy.remove('bash')
+        self.assertEqual(update_set.get_version('bash'), '4.3-14')
+        self.assertEqual(update_set.get('bash').arch, 'x86_64')
+        self.assertRaises(AttributeError, setattr, update_set.get('bash'), 'size', 100)   # slotted
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -149,6 +149,7 @@ class TestYumPackageManager(unittest.TestCase):
 
         package_manager = self.container.get('package_manager')
         self.assertIsNotNone(package_manager)
+        package_manager.refresh_repo()  # new refresh generation - discards the classified update snapshot from the happy path
         package_filter = self.container.get('package_filter')
         self.assertIsNotNone(package_filter)
 
@@ -182,6 +183,45 @@ class TestYumPackageManager(unittest.TestCase):
         # test for successfully installing a package
         self.assertEqual(package_manager.install_update_and_dependencies('selinux-policy.noarch', '3.13.1-102.el7_3.16', simulate=True), Constants.INSTALLED)
 
+    def test_is_installed_check_with_rpm_database_index(self):
+        """Unit test for installed version checks served from the rpm database index"""
+        package_manager = self.container.get('package_manager')
+        rpm_database_index = package_manager.rpm_database_index
+        rpmdb_path = os.path.join(self.runtime.execution_config.temp_folder, "rpmdb")
+        os.mkdir(rpmdb_path)
+        self.runtime.write_to_file(os.path.join(rpmdb_path, "Packages"), "rpmdb")
+        rpm_database_index.rpmdb_paths = [rpmdb_path]
+
+        rpm_queries = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_rpm(cmd, no_output=False, chk_err=True):
+            if cmd == rpm_database_index.rpm_query_installed_cmd:
+                rpm_queries.append(cmd)
+                return 0, "kernel x86_64 (none) 3.10.0-514.el7\nselinux-policy noarch (none) 3.13.1-102.el7_3.16\nNetworkManager x86_64 1 1.10.2-13.el7\n"
+            raise Exception("Unexpected command: " + cmd)
+        self.runtime.env_layer.run_command_output = run_command_output_rpm
+
+        self.assertTrue(package_manager.is_package_version_installed('selinux-policy.noarch', '3.13.1-102.el7_3.16'))
+        self.assertTrue(package_manager.is_package_version_installed('kernel.x86_64', '3.10.0-514.el7'))
+        self.assertTrue(package_manager.is_package_version_installed('NetworkManager.x86_64', '1:1.10.2-13.el7'))
+        self.assertFalse(package_manager.is_package_version_installed('kernel.x86_64', '3.10.0-862.el7'))
+        self.assertFalse(package_manager.is_package_version_installed('kernel.i686', '3.10.0-514.el7'))
+        self.assertFalse(package_manager.is_package_version_installed('bash.x86_64', '4.2.46-30.el7'))
+        self.assertEqual(len(rpm_queries), 1)
+
+        # regenerated only when the rpm database changes
+        self.runtime.write_to_file(os.path.join(rpmdb_path, "Packages"), "rpmdb changed")
+        self.assertTrue(package_manager.is_package_version_installed('kernel.x86_64', '3.10.0-514.el7'))
+        self.assertEqual(len(rpm_queries), 2)
+
+        # falls back to yum when there is no rpm database
+        rpm_database_index.rpmdb_paths = [os.path.join(rpmdb_path, "not-present")]
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+        self.runtime.set_legacy_test_type('HappyPath')
+        self.assertTrue(package_manager.is_package_version_installed('selinux-policy.noarch', '3.13.1-102.el7_3.16'))
+        self.assertIsNone(rpm_database_index.index)
+
     def test_install_package_failure(self):
         """Unit test for install package failure"""
         self.runtime.set_legacy_test_type('FailInstallPath')
@@ -583,6 +623,66 @@ class TestYumPackageManager(unittest.TestCase):
         self.runtime.env_layer.file_system.write_with_retry = self.mock_write_with_retry_raise_exception
         self.assertRaises(Exception, package_manager.update_os_patch_configuration_sub_setting)
 
+    def test_read_queries_are_cache_only_once_metadata_is_current(self):
+        """Unit test for cache-only read queries, with fallback to normal queries without a cache"""
+        self.runtime.set_legacy_test_type('HappyPath')
+        package_manager = self.container.get('package_manager')
+        commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_without_cache(cmd, no_output=False, chk_err=True):
+            commands.append(cmd)
+            if cmd.endswith(' -C'):
+                return 1, "Caching enabled but no local cache of /var/cache/yum/x86_64/7/base/repomd.xml from base"
+            return backup_run_command_output(cmd, no_output, chk_err)
+        self.runtime.env_layer.run_command_output = run_command_output_without_cache
+
+        # the first query loads metadata normally
+        self.assertEqual(package_manager.get_read_query_command(package_manager.yum_check), package_manager.yum_check)
+        package_manager.get_all_updates()
+        self.assertTrue(package_manager.repo_metadata_current)
+        self.assertEqual(package_manager.get_read_query_command(package_manager.yum_check), 'sudo yum -q check-update -C')
+
+        # later ones are cache-only, and run again normally if there's no cache
+        versions = package_manager.get_all_available_versions_of_package('kernel')
+        self.assertTrue(len(versions) > 0)
+        self.assertEqual(commands[-2:], ['sudo yum list available kernel --showduplicates -C', 'sudo yum list available kernel --showduplicates'])
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+        # a new refresh generation needs metadata loaded again
+        package_manager.refresh_repo()
+        self.assertFalse(package_manager.repo_metadata_current)
+
+    def test_get_package_size_in_batch(self):
+        package_manager = self.container.get('package_manager')
+        output = " Package     Arch     Version              Repository                      Size\n" + \
+                 "================================================================================\n" + \
+                 "Installing:\n" + \
+                 " kernel      x86_64   3.10.0-862.9.1.el7   rhui-rhel-7-server-rhui-rpms    46 M\n" + \
+                 "Updating:\n" + \
+                 " kmod-kvdo   x86_64   6.1.0.171-17.el7_5   rhui-rhel-7-server-rhui-rpms   348 k\n" + \
+                 " selinux-policy-targeted\n" + \
+                 "             noarch   3.13.1-102.el7_3.16  rhui-rhel-7-server-rhui-rpms   6.6 M\n"
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "kmod-kvdo.x86_64"), "348 k")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "kernel"), "46 M")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "selinux-policy-targeted.noarch"), "6.6 M")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "kernel.i686"), Constants.UNKNOWN_PACKAGE_SIZE)
+
+    def test_parse_package_journal_line(self):
+        package_manager = self.container.get('package_manager')
+        entry = package_manager.parse_package_journal_line("Jun 20 10:15:52 Updated: 1:openssl-libs-1.0.2k-26.el7_9.x86_64")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.UPGRADED, "openssl-libs.x86_64", "1:1.0.2k-26.el7_9"))
+        entry = package_manager.parse_package_journal_line("Jun 20 10:15:53 Installed: selinux-policy-3.13.1-268.el7_9.2.noarch")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.INSTALLED, "selinux-policy.noarch", "3.13.1-268.el7_9.2"))
+        entry = package_manager.parse_package_journal_line("Jun 20 10:16:03 Erased: libfoo")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.REMOVED, "libfoo", None))
+
+        # dnf.rpm.log, where the outgoing versions of upgrades aren't entries
+        entry = package_manager.parse_package_journal_line("2023-06-20T10:15:52+0000 SUBDEBUG Upgrade: bash-5.1.8-6.el9_1.x86_64")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.UPGRADED, "bash.x86_64", "5.1.8-6.el9_1"))
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20T10:15:53+0000 SUBDEBUG Upgraded: bash-5.1.8-4.el9.x86_64"), None)
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20T10:15:50+0000 INFO --- logging initialized ---"), None)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -635,6 +635,55 @@ class TestZypperPackageManager(unittest.TestCase):
         package_manager.invoke_package_manager(cmd)
         self.assertTrue(package_manager.get_package_manager_setting(Constants.PACKAGE_MGR_SETTING_REPEAT_PATCH_OPERATION, False))
 
+    def test_read_queries_skip_refresh_once_metadata_is_current(self):
+        """Unit test for no-refresh read queries, with fallback to normal queries without a cache"""
+        self.runtime.set_legacy_test_type('HappyPath')
+        package_manager = self.container.get('package_manager')
+        commands = []
+        backup_run_command_output = self.runtime.env_layer.run_command_output
+
+        def run_command_output_without_cache(cmd, no_output=False, chk_err=True):
+            commands.append(cmd)
+            if cmd.find('--no-refresh') > -1:
+                return 106, "Repository 'SLES12-SP5-Updates' is invalid.\nSkipping repository 'SLES12-SP5-Updates' because of the above error."
+            return backup_run_command_output(cmd, no_output, chk_err)
+        self.runtime.env_layer.run_command_output = run_command_output_without_cache
+
+        self.assertEqual(package_manager.get_read_query_command(package_manager.zypper_check), package_manager.zypper_check)
+        package_manager.refresh_repo()
+        self.assertTrue(package_manager.repo_metadata_current)
+        self.assertEqual(package_manager.get_read_query_command(package_manager.zypper_check), 'sudo LANG=en_US.UTF8 zypper --no-refresh list-updates')
+
+        # no-refresh queries are run again normally if there's no usable cache
+        packages, package_versions = package_manager.get_all_updates()
+        self.assertTrue(len(packages) > 0)
+        self.assertEqual(commands[-2:], ['sudo LANG=en_US.UTF8 zypper --no-refresh list-updates', 'sudo LANG=en_US.UTF8 zypper list-updates'])
+
+        # running the query again doesn't use up a retry
+        package_manager.package_manager_max_retries = 1
+        out, code = package_manager.invoke_package_manager_advanced(package_manager.get_read_query_command(package_manager.zypper_check))
+        self.assertEqual(code, 0)
+        self.assertEqual(commands[-2:], ['sudo LANG=en_US.UTF8 zypper --no-refresh list-updates', 'sudo LANG=en_US.UTF8 zypper list-updates'])
+        self.runtime.env_layer.run_command_output = backup_run_command_output
+
+    def test_get_package_size_in_batch(self):
+        package_manager = self.container.get('package_manager')
+        output = "Retrieving package samba-libs-python3-4.15.4+git.331.61fc89677dd-3.60.1.x86_64               (2/3), 367.5 KiB (290.3 KiB unpacked)\n" + \
+                 "Retrieving package samba-libs-4.15.4+git.331.61fc89677dd-3.60.1.x86_64                       (3/3), 441.7 KiB (544.9 KiB unpacked)\n"
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "samba-libs"), "441.7 KiB")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "samba-libs-python3"), "367.5 KiB")
+        self.assertEqual(package_manager.get_package_size_in_batch(output, "samba-client"), Constants.UNKNOWN_PACKAGE_SIZE)
+
+    def test_parse_package_journal_line(self):
+        package_manager = self.container.get('package_manager')
+        entry = package_manager.parse_package_journal_line("2023-06-20 10:15:52|install|bash|4.4-150400.27.3.2|x86_64||repo-sle-update|9d6a4a1c|")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.INSTALLED, "bash", "4.4-150400.27.3.2"))
+        entry = package_manager.parse_package_journal_line("2023-06-20 10:16:03|remove |libfoo1|1.0-1.1|x86_64|root@host|")
+        self.assertEqual((entry.action, entry.name, entry.version), (Constants.PackageJournalActions.REMOVED, "libfoo1", "1.0-1.1"))
+
+        self.assertEqual(package_manager.parse_package_journal_line("# 2023-06-20 10:15:50 bash-4.4-150400.27.3.2.x86_64.rpm installed ok"), None)
+        self.assertEqual(package_manager.parse_package_journal_line("2023-06-20 10:15:40|command|root@host|'zypper' 'update'|"), None)
+
 
 if __name__ == '__main__':
     unittest.main()
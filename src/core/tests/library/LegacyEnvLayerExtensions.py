@@ -55,13 +55,17 @@ class LegacyEnvLayerExtensions():
             return sys.version_info[0]  # python 2.6 doesn't have attributes like 'major' within sys.version_info
 
     # To be deprecated over time
-    def run_command_output(self, cmd, no_output=False, chk_err=True):
+    def run_command_output(self, cmd, no_output=False, chk_err=True, timeout_in_secs=None, is_kill_allowed=True):
         if no_output:
             return 0, None
         else:
             output = ''
             code = 0
 
+            # cache-only read queries are emulated the same as their regular counterparts
+            cmd = cmd.replace('zypper --no-refresh ', 'zypper ')
+            cmd = cmd[:-len(' -C')] if cmd.endswith(' -C') else cmd
+
             if self.legacy_test_type == 'HappyPath':
                 if cmd.find("cat /proc/cpuinfo | grep name") > -1:
                     code = 0
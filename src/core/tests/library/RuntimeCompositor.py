@@ -27,6 +27,7 @@ from core.tests.library.ArgumentComposer import ArgumentComposer
 from core.tests.library.LegacyEnvLayerExtensions import LegacyEnvLayerExtensions
 from core.src.bootstrap.Bootstrapper import Bootstrapper
 from core.src.bootstrap.Constants import Constants
+from core.src.bootstrap.EnvLayer import EnvLayer
 
 # Todo: find a different way to import these
 try:
@@ -81,6 +82,7 @@ class RuntimeCompositor(object):
         self.composite_logger = bootstrapper.composite_logger
 
         # re-initializing telemetry_writer, outside of Bootstrapper, to correctly set the env_layer configured for tests
+        self.bootstrapper_telemetry_writer = bootstrapper.telemetry_writer     # still referenced by components built above
         self.telemetry_writer = TelemetryWriter(self.env_layer, self.composite_logger, bootstrapper.telemetry_writer.events_folder_path, bootstrapper.telemetry_supported)
         bootstrapper.telemetry_writer = self.telemetry_writer
         bootstrapper.composite_logger.telemetry_writer = self.telemetry_writer
@@ -91,6 +93,12 @@ class RuntimeCompositor(object):
         self.execution_config = self.container.get('execution_config')
         self.legacy_env_layer_extensions.set_temp_folder_path(self.execution_config.temp_folder)
         self.package_manager = self.container.get('package_manager')
+        if legacy_mode and package_manager_name == Constants.APT:
+            self.package_manager.dpkg_status_file_path = os.path.join(self.execution_config.temp_folder, "dpkg-status-not-present")  # legacy tests emulate dpkg commands, not the host's dpkg database
+        elif legacy_mode and package_manager_name in [Constants.YUM, Constants.ZYPPER]:
+            self.package_manager.rpm_database_index.rpmdb_paths = [os.path.join(self.execution_config.temp_folder, "rpmdb-not-present")]  # likewise for the rpm database
+        if legacy_mode:
+            self.package_manager.package_journal_paths = [os.path.join(self.execution_config.temp_folder, "package-journal-not-present")]  # and for the package manager's transaction journal
         self.backup_get_current_auto_os_patch_state = None
         self.reconfigure_package_manager()
         self.configure_patching_processor = self.container.get('configure_patching_processor')
@@ -118,6 +126,8 @@ class RuntimeCompositor(object):
         self.configure_patching_processor.auto_assess_timer_manager.remove_timer = self.mock_remove_timer
 
     def stop(self):
+        self.telemetry_writer.close()
+        self.bootstrapper_telemetry_writer.close()
         self.file_logger.close(message_at_close="<Runtime stopped>")
         self.container.reset()
 
@@ -141,6 +151,12 @@ class RuntimeCompositor(object):
         self.env_layer.platform = self.legacy_env_layer_extensions.LegacyPlatform()
         self.env_layer.set_legacy_test_mode()
         self.env_layer.run_command_output = self.legacy_env_layer_extensions.run_command_output
+        self.env_layer.run_command_output_streaming = self.run_command_output_streaming
+
+    def run_command_output_streaming(self, cmd, line_handlers=None, max_output_size_in_chars=Constants.STREAMING_COMMAND_MAX_OUTPUT_SIZE_IN_CHARS, timeout_in_secs=None, is_kill_allowed=True):
+        """ Streams the output of the (mocked) run_command_output, so tests that mock it cover streamed commands too """
+        code, output = self.env_layer.run_command_output(cmd, False, False)
+        return EnvLayer.CommandOutputStream.from_output(code, output, line_handlers, max_output_size_in_chars)
 
     def reconfigure_reboot_manager(self):
         self.reboot_manager.start_reboot = self.start_reboot